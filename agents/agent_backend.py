@@ -0,0 +1,251 @@
+#!/bin/python
+""" agent_backend.py
+The interface of the LLM agents used by the AI-agent players.
+"""
+import os
+import time
+import logging
+import asyncio
+from dotenv import load_dotenv
+
+from agents.context_window import ContextWindow, extractive_summary, estimate_tokens
+from agents.response_cache import ResponseCache
+from agents.request_scheduler import RequestScheduler, VOTE, CHATTER, COMPLETION_TOKENS
+from service.metrics import metrics
+from service.tracing import span
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+llm_call_seconds = metrics.histogram("werewolves_llm_call_seconds",
+    "Duration of the LLM calls (streamed: until the answer is complete)")
+llm_errors = metrics.counter("werewolves_llm_errors_total", "Failed or timed out LLM calls")
+
+
+class AgentBackend:
+    """Base class of the agents, keeps track of the context.
+    The implementations provide complete() and complete_async(), and may provide
+    complete_stream() to yield the answer in chunks and complete_choice() to
+    constrain the answer to a list of options."""
+    # the errors of a failed call, which the callers should handle
+    ERRORS :tuple = (asyncio.TimeoutError,)
+
+    def __init__(self, timeout :float = None, cache :ResponseCache = None) ->None:
+        self.model_name = ""
+        # per-call timeout in seconds for ask_async()
+        self.timeout = timeout if not timeout is None else float(os.getenv('OPENAI_TIMEOUT', "60"))
+        # the messages sent per call are cut to this number of (estimated) tokens
+        self.context = ContextWindow(int(os.getenv('OPENAI_TOKEN_BUDGET', "3000")))
+        self.prompt_tokens = 0   # prompt tokens of the last call
+        self.cache = cache
+        # the calls wait for the scheduler (if set), owner is the game they are accounted to
+        self.scheduler :RequestScheduler = None
+        self.owner = ""
+        # seconds of the last ask_stream() until the first chunk and until the complete answer
+        self.first_chunk_time = 0.0
+        self.total_time = 0.0
+
+        self.result :str = None
+        self.__compaction_task__ :asyncio.Task = None
+        self.__generation__ = 0     # counts the resets of the context
+
+
+    ##### Abstract LLM calls
+    def complete(self, messages :list[dict]) ->str:
+        """Returns the answer of the LLM to the messages"""
+        raise NotImplementedError
+
+    async def complete_async(self, messages :list[dict]) ->str:
+        """Returns the answer of the LLM to the messages, without blocking the event loop"""
+        raise NotImplementedError
+
+    async def complete_stream(self, messages :list[dict]):
+        """Yields the answer of the LLM in chunks, by default all at once"""
+        yield await self.complete_async(messages)
+
+    async def complete_choice(self, messages :list[dict], options :list[str]) ->str:
+        """Returns the option the LLM chose, by default its free-text answer
+        (which the caller has to resolve to an option)"""
+        _ = options
+        return await self.complete_async(messages)
+
+
+    @property
+    def messages(self) ->list[dict]:
+        """All messages of the context"""
+        return self.context.messages
+
+
+    def system(self, content :str):
+        """Starts with a new context (a reset), and provides the chat-systems general behavior"""
+        logger.info("Set %s system context:%s", type(self).__name__, content)
+        self.context.reset(content)
+        self.__generation__ += 1
+
+    def advice(self, question :str, answer :str, pinned :bool = False) ->None:
+        """Provides the LLM with a predefined question-answer pair,
+        a pinned question is never dropped from the context (e.g. the player's card)"""
+        logger.info("Advice %s Question:'%s', Answer:'%s'",
+                    type(self).__name__, question, answer)
+        if not question is None:
+            self.context.append("user", question, pinned)
+        if not answer is None:
+            self.context.append("assistant", answer)
+
+    def ask(self, prompt :str, use_cache :bool = True) ->str:
+        """Sends a prompt to the LLM, will track the result in the context"""
+        self.result = None
+        logger.info("Ask %s '%s'", type(self).__name__, prompt)
+        messages = self.context.build(prompt)
+        cache_key = self.__cache_key__(messages, use_cache)
+        result = None if cache_key is None else self.cache.get(cache_key)
+        if result is None:
+            result = self.complete(messages)
+            if not cache_key is None:
+                self.cache.put(cache_key, result)
+        return self.__track_result__(prompt, result)
+
+    async def ask_async(self, prompt :str, timeout :float = None, use_cache :bool = True,
+                        priority :int = CHATTER) ->str:
+        """Sends a prompt to the LLM without blocking, tracks the result in the context.
+        Raises asyncio.TimeoutError if no answer arrived within timeout seconds
+        (the time waiting for the scheduler not included);
+        a cancelled or timed out call leaves the context unchanged.
+        Use use_cache=False for creative prompts which should not get a cached answer."""
+        logger.info("Ask %s async '%s'", type(self).__name__, prompt)
+        messages = self.context.build(prompt)
+        return await self.__complete__(prompt, messages, self.__cache_key__(messages, use_cache),
+                                       priority, timeout, lambda: self.complete_async(messages))
+
+    async def ask_choice_async(self, prompt :str, options :list[str], timeout :float = None,
+                               use_cache :bool = True, priority :int = VOTE) ->str:
+        """Like ask_async(), but the LLM has to answer with one of the options
+        (structured output where the backend supports it, otherwise free text)"""
+        logger.info("Ask %s choice '%s' of %s", type(self).__name__, prompt, options)
+        messages = self.context.build(prompt)
+        cache_key = self.__cache_key__(messages + [{"role": "options", "content": options}],
+                                       use_cache)
+        return await self.__complete__(prompt, messages, cache_key, priority, timeout,
+                                       lambda: self.complete_choice(messages, options))
+
+    async def ask_stream(self, prompt :str, timeout :float = None, use_cache :bool = True,
+                         priority :int = CHATTER):
+        """Like ask_async(), but yields the answer in chunks as they arrive.
+        Raises asyncio.TimeoutError if no chunk arrived within timeout seconds;
+        the answer is tracked in the context when complete,
+        an aborted stream leaves the context unchanged."""
+        logger.info("Ask %s stream '%s'", type(self).__name__, prompt)
+        messages = self.context.build(prompt)
+        cache_key = self.__cache_key__(messages, use_cache)
+        result = None if cache_key is None else self.cache.get(cache_key)
+        started = time.perf_counter()
+        if result is None:
+            await self.__schedule__(messages, priority)
+            started = time.perf_counter()
+            chunks = []
+            stream = self.complete_stream(messages)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(stream),
+                            timeout if not timeout is None else self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    if len(chunks) == 0:
+                        self.first_chunk_time = time.perf_counter() - started
+                    chunks.append(chunk)
+                    yield chunk
+            except self.ERRORS:
+                llm_errors.inc(backend=type(self).__name__)
+                raise
+            finally:
+                await stream.aclose()
+            result = "".join(chunks)
+            if not cache_key is None:
+                self.cache.put(cache_key, result)
+        else:
+            self.first_chunk_time = 0.0
+            yield result
+        self.total_time = time.perf_counter() - started
+        llm_call_seconds.observe(self.total_time, backend=type(self).__name__)
+        self.__track_result__(prompt, result)
+        self.__schedule_compaction__()
+
+    async def __complete__(self, prompt :str, messages :list[dict], cache_key :str,
+                           priority :int, timeout :float, complete) ->str:
+        """The cached answer, or calls complete() after the scheduler admitted it"""
+        result = None if cache_key is None else self.cache.get(cache_key)
+        if result is None:
+            await self.__schedule__(messages, priority)
+            try:
+                with llm_call_seconds.time(backend=type(self).__name__), span("llm.call"):
+                    result = await asyncio.wait_for(
+                        complete(),
+                        timeout if not timeout is None else self.timeout
+                    )
+            except self.ERRORS:
+                llm_errors.inc(backend=type(self).__name__)
+                raise
+            if not cache_key is None:
+                self.cache.put(cache_key, result)
+        self.__track_result__(prompt, result)
+        self.__schedule_compaction__()
+        return result
+
+    def __cache_key__(self, messages :list[dict], use_cache :bool) ->str:
+        if self.cache is None or not use_cache:
+            return None
+        return ResponseCache.key(self.model_name, messages)
+
+    async def __schedule__(self, messages :list[dict], priority :int) ->None:
+        if not self.scheduler is None:
+            tokens = sum(estimate_tokens(msg["content"]) for msg in messages) + COMPLETION_TOKENS
+            with span("llm.queue"):
+                await self.scheduler.acquire(self.owner, priority, tokens)
+
+    def __track_result__(self, prompt :str, result :str) ->str:
+        self.result = result
+        self.context.append("user", prompt)
+        self.context.append("assistant", result)
+        return result
+
+
+    def __schedule_compaction__(self) ->None:
+        """Folds old conversations into the summary in the background (off the hot path)"""
+        if not self.__compaction_task__ is None and not self.__compaction_task__.done():
+            return
+        if len(self.context.compactable()) > 0:
+            self.__compaction_task__ = asyncio.create_task(self.__compact__())
+
+    async def __compact__(self) ->None:
+        generation = self.__generation__
+        pairs = self.context.compactable()
+        conversations = "\n".join(answer["content"] for _, answer in pairs)
+        messages = [
+            {"role": "system", "content":
+                "Summarize the conversation of a werewolves game in a few short "
+                "sentences. Keep who accused or defended whom."},
+            {"role": "user", "content":
+                f"Summary so far:\n{self.context.summary}\n\n"
+                f"New conversation:\n{conversations}"}
+        ]
+        try:
+            await self.__schedule__(messages, CHATTER)
+            summary = await asyncio.wait_for(self.complete_async(messages), self.timeout)
+            summary = summary.strip()
+        except self.ERRORS as error:
+            logger.warning("%s summarization failed (%s), using an extract",
+                           type(self).__name__, error)
+            summary = extractive_summary(self.context.summary, pairs)
+        if generation != self.__generation__:
+            # the context was reset while summarizing (a new game), the summary is stale
+            logger.debug("%s dropped the summary of the reset context", type(self).__name__)
+            return
+        self.context.fold(pairs, summary)
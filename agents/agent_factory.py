@@ -0,0 +1,43 @@
+#!/bin/python
+""" agent_factory.py
+Creates the agent backend selected by the configuration.
+"""
+import os
+import logging
+from dotenv import load_dotenv
+
+from agents.agent_backend import AgentBackend
+from agents.response_cache import ResponseCache
+from agents.openai_agent import OpenAIAgent
+from agents.fake_agent import FakeAgent
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+def create_agent(cache :ResponseCache = None, backend :str = None) ->AgentBackend:
+    """Creates the agent backend configured by AGENT_BACKEND:
+    - openai: the OpenAI API (default)
+    - local:  an OpenAI-compatible server at LOCAL_LLM_URL, e.g. agents/stub_server.py
+    - fake:   in-process replies from FAKE_AGENT_REPLIES (separated by |)
+              after FAKE_AGENT_LATENCY seconds
+    """
+    if backend is None:
+        backend = os.getenv('AGENT_BACKEND', "openai")
+    if backend == "openai":
+        return OpenAIAgent(cache=cache)
+    if backend == "local":
+        return OpenAIAgent(base_url=os.getenv('LOCAL_LLM_URL', "http://127.0.0.1:8000/v1"),
+                           cache=cache)
+    if backend == "fake":
+        replies = os.getenv('FAKE_AGENT_REPLIES', "")
+        return FakeAgent(replies.split("|") if replies else None,
+                         float(os.getenv('FAKE_AGENT_LATENCY', "0")),
+                         cache=cache)
+    raise ValueError(f"Unknown AGENT_BACKEND '{backend}'")
@@ -0,0 +1,164 @@
+#!/bin/python
+""" context_window.py
+Token-budgeted context of a chat agent.
+Keeps the system prompt, the pinned messages (the moderator's DMs: the card,
+the seer's answers) and the recent turns verbatim, folds older
+"What did the other players say lately?" pairs into a rolling summary
+and cuts every request down to a configurable token budget.
+"""
+import logging
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+OTHER_PLAYERS_QUESTION = "What did the other players say lately?"
+
+# every message costs some tokens for role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text :str) ->int:
+    """Estimates the number of tokens of a message (~4 characters per token)"""
+    if text is None:
+        return MESSAGE_OVERHEAD_TOKENS
+    return len(text) // 4 + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def extractive_summary(summary :str, pairs :list, max_chars :int = 1200) ->str:
+    """Summarizes without an LLM: keeps the latest lines of the folded conversations"""
+    lines = [] if not summary else summary.split("\n")
+    for _, answer in pairs:
+        lines.extend(line for line in answer["content"].split("\n") if line.strip())
+    result = ""
+    for line in reversed(lines):
+        if len(result) + len(line) + 1 > max_chars:
+            break
+        result = line + "\n" + result
+    return result.strip()
+
+
+class ContextWindow:
+    """The messages of an agent, with token counts per message"""
+    def __init__(self, token_budget :int = 3000, keep_recent :int = 8) ->None:
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.system_message :dict = None
+        self.summary :str = ""
+        self.entries :list[dict] = []
+
+    def reset(self, system_content :str) ->None:
+        """Starts with a new context, containing only the system prompt"""
+        self.system_message = self.__entry__("system", system_content)
+        self.summary = ""
+        self.entries = []
+
+    def append(self, role :str, content :str, pinned :bool = False) ->None:
+        """Appends a message to the context, a pinned one is never dropped"""
+        self.entries.append(self.__entry__(role, content, pinned))
+
+    @property
+    def messages(self) ->list[dict]:
+        """All messages of the context (not cut to the budget)"""
+        return [{"role": entry["role"], "content": entry["content"]}
+                for entry in self.__head__() + self.entries]
+
+    @property
+    def tokens(self) ->int:
+        """The estimated number of tokens of all messages"""
+        return sum(entry["tokens"] for entry in self.__head__() + self.entries)
+
+    def build(self, prompt :str = None) ->list[dict]:
+        """Returns the messages for the next request, cut to the token budget.
+        The system prompt, the summary, the pinned messages and the prompt are always
+        sent, older turns are dropped first."""
+        head = self.__head__()
+        tail = [] if prompt is None else [self.__entry__("user", prompt)]
+        used = sum(entry["tokens"] for entry in head + tail + self.entries if entry["pinned"])
+        first = len(self.entries)
+        while first > 0 and (self.entries[first-1]["pinned"]
+                             or used + self.entries[first-1]["tokens"] <= self.token_budget):
+            first -= 1
+            if not self.entries[first]["pinned"]:
+                used += self.entries[first]["tokens"]
+        kept = [entry for entry in self.entries[:first] if entry["pinned"]]
+        if first > len(kept):
+            logger.debug("ContextWindow dropped %d old messages to stay within %d tokens",
+                         first - len(kept), self.token_budget)
+        return [{"role": entry["role"], "content": entry["content"]}
+                for entry in head + kept + self.entries[first:] + tail]
+
+    def compactable(self) ->list[tuple[dict, dict]]:
+        """Returns the other-players question/answer pairs older than the recent turns"""
+        pairs = []
+        older = self.entries[:max(0, len(self.entries) - self.keep_recent)]
+        for question, answer in zip(older, older[1:]):
+            if question["role"] == "user" and question["content"] == OTHER_PLAYERS_QUESTION \
+                    and answer["role"] == "assistant":
+                pairs.append((question, answer))
+        return pairs
+
+    def fold(self, pairs :list[tuple[dict, dict]], summary :str) ->None:
+        """Replaces the given pairs by the (new) rolling summary"""
+        folded = {id(entry) for pair in pairs for entry in pair}
+        self.entries = [entry for entry in self.entries if not id(entry) in folded]
+        self.summary = summary
+        logger.debug("ContextWindow folded %d conversations into the summary", len(pairs))
+
+    def snapshot(self) ->dict:
+        """Returns the context as plain data (for the game snapshots)"""
+        return {
+            "system": None if self.system_message is None else self.system_message["content"],
+            "summary": self.summary,
+            "entries": [[entry["role"], entry["content"], entry["pinned"]]
+                        for entry in self.entries],
+        }
+
+    def restore(self, data :dict) ->None:
+        """Restores the context from snapshot()"""
+        self.system_message = None if data["system"] is None \
+            else self.__entry__("system", data["system"])
+        self.summary = data["summary"]
+        # the snapshots before the pinned messages have no third field
+        self.entries = [self.__entry__(entry[0], entry[1], len(entry) > 2 and entry[2])
+                        for entry in data["entries"]]
+
+    def __head__(self) ->list[dict]:
+        head = [] if self.system_message is None else [self.system_message]
+        if self.summary:
+            head.append(self.__entry__("system",
+                "Summary of the earlier conversation:\n" + self.summary))
+        return head
+
+    def __entry__(self, role :str, content :str, pinned :bool = False) ->dict:
+        return {"role": role, "content": content, "tokens": estimate_tokens(content),
+                "pinned": pinned}
+
+
+
+# Usage
+if __name__ == "__main__":
+    # Prompt tokens per round over a simulated 20-round game
+    unlimited = ContextWindow(token_budget=10**9, keep_recent=10**9)
+    windowed = ContextWindow()
+    for context in (unlimited, windowed):
+        context.reset("You are a player of the famous card game 'Werwölfe vom Düsterwald'.")
+    print("round  unlimited  windowed")
+    for game_round in range(1, 21):
+        chat = "".join(f"Player{nr}: I think Player{(nr+game_round) % 8} is suspicious, "
+                       f"because of what happened in round {game_round}.\n" for nr in range(8))
+        sizes = []
+        for context in (unlimited, windowed):
+            context.append("user", OTHER_PLAYERS_QUESTION)
+            context.append("assistant", chat)
+            request = context.build("Take part of the recent conversation or give answer.")
+            sizes.append(sum(estimate_tokens(msg["content"]) for msg in request))
+            context.append("user", "Take part of the recent conversation or give answer.")
+            context.append("assistant", "I agree, let us vote carefully this time.")
+        # the compaction runs in the background in OpenAIAgent
+        old_pairs = windowed.compactable()
+        if old_pairs:
+            windowed.fold(old_pairs, extractive_summary(windowed.summary, old_pairs))
+        print(f"{game_round:5}  {sizes[0]:9}  {sizes[1]:8}")
@@ -0,0 +1,69 @@
+#!/bin/python
+""" fake_agent.py
+An in-process stand-in for the LLM agents, for load tests without network access.
+"""
+import re
+import random
+import asyncio
+import logging
+
+from agents.agent_backend import AgentBackend
+from agents.response_cache import ResponseCache
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class FakeAgent(AgentBackend):
+    """Answers with canned or scripted replies after a simulated latency"""
+    def __init__(self, replies :list[str] = None, latency :float = 0.0,
+                 timeout :float = None, cache :ResponseCache = None) ->None:
+        super().__init__(timeout, cache)
+        self.model_name = "fake"
+        self.replies = replies if replies else ["I am just a simple villager."]
+        self.latency = latency
+        self.calls = 0
+
+
+    def complete(self, messages :list[dict]) ->str:
+        """Returns the next scripted reply"""
+        reply = self.replies[self.calls % len(self.replies)]
+        self.calls += 1
+        self.prompt_tokens = sum(len(msg["content"] or "") // 4 + 4 for msg in messages)
+        return self.__fill_in__(reply, messages)
+
+    async def complete_async(self, messages :list[dict]) ->str:
+        """Returns the next scripted reply after the latency"""
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return self.complete(messages)
+
+    async def complete_stream(self, messages :list[dict]):
+        """Yields the next scripted reply word by word, the first after the latency"""
+        reply = await self.complete_async(messages)
+        for nr, word in enumerate(reply.split(" ")):
+            if nr > 0:
+                await asyncio.sleep(self.latency / 10)
+            yield word if nr == 0 else " " + word
+
+    async def complete_choice(self, messages :list[dict], options :list[str]) ->str:
+        """Like a function call restricted to the options: the option the scripted reply
+        mentions, a random one if none"""
+        reply = (await self.complete_async(messages)).casefold()
+        for option in options:
+            if option.casefold() in reply:
+                return option
+        return random.choice(options) if options else reply
+
+    def __fill_in__(self, reply :str, messages :list[dict]) ->str:
+        """Replaces {player} with a random player name mentioned in the conversation"""
+        if not "{player}" in reply:
+            return reply
+        names = set()
+        for message in messages:
+            names.update(re.findall(r"^\**([^\s:*]+)\**:", message["content"] or "", re.MULTILINE))
+        name = random.choice(sorted(names)) if names else "nobody"
+        return reply.replace("{player}", name)
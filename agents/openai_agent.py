@@ -3,12 +3,16 @@
 The OpenAI API Agent to access the API for ChatGPT.
 """
 import os
+import json
 import logging
 import asyncio
-import threading
 from dotenv import load_dotenv
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, APIError
+
+from agents.agent_backend import AgentBackend
+from agents.response_cache import ResponseCache
+from service.metrics import metrics
 
 
 # Set up logging
@@ -20,59 +24,115 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 
-class OpenAIAgent:
+llm_tokens = metrics.counter("werewolves_llm_tokens_total", "Tokens used by the OpenAI calls")
+
+CHOICE_FUNCTION = "choose"
+
+
+def choice_tool(options :list[str]) ->dict:
+    """The function the LLM has to call with one of the options"""
+    return {
+        "type": "function",
+        "function": {
+            "name": CHOICE_FUNCTION,
+            "description": "Submits your decision.",
+            "parameters": {
+                "type": "object",
+                "properties": {"name": {"type": "string", "enum": options}},
+                "required": ["name"],
+            },
+        },
+    }
+
+
+class OpenAIAgent(AgentBackend):
     """Accesses the OpenAI API, will keep track of the context"""
-    def __init__(self) ->None:
+    ERRORS = (asyncio.TimeoutError, APIError)
+
+    def __init__(self, base_url :str = None, timeout :float = None,
+                 cache :ResponseCache = None) ->None:
+        super().__init__(timeout, cache)
         #apikey = os.getenv('OPENAI_API_KEY')
         organization = os.getenv('OPENAI_ORGANIZATION')
 
         self.client = OpenAI(
             # defaults to os.environ.get("OPENAI_API_KEY")
-            organization= organization
+            organization= organization,
+            base_url= base_url
+        )
+        self.async_client = AsyncOpenAI(
+            organization= organization,
+            base_url= base_url
         )
-        self.messages = []
-        self.model_name = "gpt-3.5-turbo"
-
-        self.result :str = None
-
-
-    def system(self, content :str):
-        """Starts with a new context (a reset), and provides the chat-systems general behavior"""
-        logger.info("Set OpenAIAgent system context:%s", content)
-        self.messages = []
-        self.messages.append( {"role": "system", "content": content} )
-
-    def advice(self, question :str, answer :str) ->None:
-        """Provides ChatGPT with a predefined question-answer pair """
-        logger.info("Advice OpenAIAgent Question:'%s', Answer:'%s'", question, answer)
-        if not question is None:
-            self.messages.append( {"role": "user", "content": question})
-        if not answer is None:
-            self.messages.append( {"role": "assistant", "content": answer} )
-
-    def ask(self, prompt :str) ->str:
-        """Sends a prompt to ChatGPT, will track the result in the context"""
-        self.result = None
-        logger.info("Ask OpenAIAgent '%s'", prompt)
-        self.messages.append({"role": "user", "content": prompt})
+        self.model_name = os.getenv('OPENAI_MODEL', "gpt-3.5-turbo")
+        # the choices are made by function calling (turn off for servers without tools)
+        self.tools = os.getenv('LLM_TOOLS', "1") == "1"
+
+
+    def complete(self, messages :list[dict]) ->str:
+        """Sends the messages to ChatGPT"""
         chat_completion = self.client.chat.completions.create(
-            messages=self.messages,
+            messages=messages,
             model=self.model_name,
         )
+        return self.__result_of__(chat_completion)
+
+    async def complete_async(self, messages :list[dict]) ->str:
+        """Sends the messages to ChatGPT via the async client"""
+        chat_completion = await self.async_client.chat.completions.create(
+            messages=messages,
+            model=self.model_name,
+        )
+        return self.__result_of__(chat_completion)
+
+    async def complete_stream(self, messages :list[dict]):
+        """Yields the answer of ChatGPT in chunks as they arrive"""
+        stream = await self.async_client.chat.completions.create(
+            messages=messages,
+            model=self.model_name,
+            stream=True,
+        )
+        async for chunk in stream:
+            for choice in chunk.choices:
+                if choice.delta.content:
+                    yield choice.delta.content
+
+    async def complete_choice(self, messages :list[dict], options :list[str]) ->str:
+        """Lets ChatGPT call the choice function, its parameter is restricted to the options"""
+        if not self.tools:
+            return await super().complete_choice(messages, options)
+        chat_completion = await self.async_client.chat.completions.create(
+            messages=messages,
+            model=self.model_name,
+            tools=[choice_tool(options)],
+            tool_choice={"type": "function", "function": {"name": CHOICE_FUNCTION}},
+        )
+        self.__count_usage__(chat_completion)
+        for choice in chat_completion.choices:
+            for call in choice.message.tool_calls or []:
+                try:
+                    return str(json.loads(call.function.arguments)["name"])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("Invalid arguments of %s: %s",
+                                   call.function.name, call.function.arguments)
+            if choice.message.content:
+                return choice.message.content
+        return ""
+
+    def __result_of__(self, chat_completion) ->str:
         result = ""
         for choice in chat_completion.choices:
             result += choice.message.content + "\n"
-        self.result = result
-        self.messages.append({"role": "assistant", "content": result} )
+        self.__count_usage__(chat_completion)
         return result
 
-    async def ask_async(self, prompt :str ) ->str:
-        """Sends a prompt to ChatGPT via async, tracks the result in the context"""
-        thread = threading.Thread(target=self.ask, args=(prompt,))
-        thread.start()
-        while thread.is_alive and self.result is None:
-            await asyncio.sleep(1)
-        return self.result
+    def __count_usage__(self, chat_completion) ->None:
+        if not chat_completion.usage is None:
+            self.prompt_tokens = chat_completion.usage.prompt_tokens
+            llm_tokens.inc(chat_completion.usage.prompt_tokens,
+                           model=self.model_name, kind="prompt")
+            llm_tokens.inc(chat_completion.usage.completion_tokens,
+                           model=self.model_name, kind="completion")
 
 
 
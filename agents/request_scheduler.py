@@ -0,0 +1,219 @@
+#!/bin/python
+""" request_scheduler.py
+All LLM calls of the agents pass this scheduler before they go to the provider:
+- priority classes: vote decisions (they block the game) before replies to
+  the moderator before chatter
+- weighted fair queuing across the games within a class: each request is
+  stamped with a virtual finish time (its tokens / the game's weight), so a
+  busy game cannot starve the others
+- token buckets for the requests and tokens per minute of the provider
+- the time spent waiting in the queue is recorded per priority class
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import deque
+from dotenv import load_dotenv
+
+from service.ratelimit import TokenBucket
+from service.metrics import metrics
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+# the priority classes, the lower the earlier
+VOTE = 0
+REPLY = 1
+CHATTER = 2
+PRIORITY_NAMES = ("vote", "reply", "chatter")
+
+queue_wait_seconds = metrics.histogram("werewolves_llm_queue_wait_seconds",
+    "Time the LLM calls waited for the request scheduler")
+
+# the expected length of an answer (five sentences), added to the prompt tokens
+COMPLETION_TOKENS = 150
+
+
+
+class ScheduledRequest:
+    """A waiting LLM call"""
+    def __init__(self, game :str, priority :int, tokens :int) ->None:
+        self.game = game
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.future :asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class RequestScheduler:
+    """Priority, fairness and rate limits for the LLM calls of all games"""
+    def __init__(self, requests_per_minute :float = 0, tokens_per_minute :float = 0,
+                 burst :float = 60.0) ->None:
+        # 0 means no limit, burst is the number of seconds of the limits usable at once
+        self.requests = None if requests_per_minute <= 0 \
+            else TokenBucket(requests_per_minute, 60.0, requests_per_minute * burst / 60)
+        self.tokens = None if tokens_per_minute <= 0 \
+            else TokenBucket(tokens_per_minute, 60.0, tokens_per_minute * burst / 60)
+        self.weights :dict[str, float] = {}
+        self.waits = [deque(maxlen=1000) for _ in PRIORITY_NAMES]
+        self.counts = [0 for _ in PRIORITY_NAMES]
+
+        self.__queue__ :list[tuple[int, float, int, ScheduledRequest]] = []
+        self.__sequence__ = itertools.count()
+        self.__virtual_time__ = 0.0
+        self.__last_finish__ :dict[str, float] = {}
+        self.__arrived__ :asyncio.Event = None
+        self.__task__ :asyncio.Task = None
+
+
+    def set_weight(self, game :str, weight :float) ->None:
+        """The share of the game compared to the other games (default 1)"""
+        self.weights[game] = weight
+
+    def unregister(self, game :str) ->None:
+        """Forgets the weight and the virtual time of the game (when it is over)"""
+        self.weights.pop(game, None)
+        self.__last_finish__.pop(game, None)
+
+
+    async def acquire(self, game :str, priority :int, tokens :int) ->float:
+        """Waits until the call may be sent, returns the seconds waited"""
+        if len(self.__queue__) == 0 and self.__delay__(tokens) == 0:
+            # the fast path: nothing queued and within the limits
+            self.__admit__(game, priority, tokens, self.__finish__(game, tokens))
+            self.__record__(priority, 0.0)
+            return 0.0
+
+        request = ScheduledRequest(game, priority, tokens)
+        heapq.heappush(self.__queue__, (priority, self.__finish__(game, tokens),
+                                        next(self.__sequence__), request))
+        if self.__arrived__ is None:
+            self.__arrived__ = asyncio.Event()
+        self.__arrived__.set()
+        if self.__task__ is None or self.__task__.done():
+            self.__task__ = asyncio.create_task(self.__dispatch__())
+        return await request.future
+
+
+    def stats(self) ->dict:
+        """The queue depth and the waits per priority class"""
+        result = {"depth": len(self.__queue__)}
+        for priority, name in enumerate(PRIORITY_NAMES):
+            waits = sorted(self.waits[priority])
+            result[name] = {
+                "count": self.counts[priority],
+                "mean_wait": sum(waits) / len(waits) if len(waits) > 0 else 0.0,
+                "p95_wait": waits[int(len(waits) * 0.95)] if len(waits) > 0 else 0.0,
+                "max_wait": waits[-1] if len(waits) > 0 else 0.0,
+            }
+        return result
+
+
+    def __finish__(self, game :str, tokens :int) ->float:
+        """The virtual finish time of the game's next request"""
+        start = max(self.__virtual_time__, self.__last_finish__.get(game, 0.0))
+        finish = start + tokens / self.weights.get(game, 1.0)
+        self.__last_finish__[game] = finish
+        return finish
+
+    def __delay__(self, tokens :int) ->float:
+        delay = 0.0
+        if not self.requests is None:
+            delay = self.requests.delay(1)
+        if not self.tokens is None:
+            delay = max(delay, self.tokens.delay(tokens))
+        return delay
+
+    def __admit__(self, game :str, priority :int, tokens :int, finish :float) ->None:
+        if not self.requests is None:
+            self.requests.take(1)
+        if not self.tokens is None:
+            self.tokens.take(tokens)
+        self.__virtual_time__ = max(self.__virtual_time__, finish)
+        if self.__last_finish__.get(game, 0.0) <= self.__virtual_time__:
+            # nothing of the game queued anymore: starts at the virtual time anyway
+            self.__last_finish__.pop(game, None)
+        logger.debug("Admitted %s request of %s (%d tokens)",
+                     PRIORITY_NAMES[priority], game, tokens)
+
+    def __record__(self, priority :int, waited :float) ->None:
+        self.counts[priority] += 1
+        self.waits[priority].append(waited)
+        queue_wait_seconds.observe(waited, priority=PRIORITY_NAMES[priority])
+
+
+    async def __dispatch__(self) ->None:
+        while len(self.__queue__) > 0:
+            (priority, finish, _, request) = self.__queue__[0]
+            if request.future.done():
+                # the caller gave up (timeout, player stopped)
+                heapq.heappop(self.__queue__)
+                continue
+            delay = self.__delay__(request.tokens)
+            if delay > 0:
+                # a more urgent request may arrive while waiting for the limits
+                self.__arrived__.clear()
+                try:
+                    await asyncio.wait_for(self.__arrived__.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.__queue__)
+            self.__admit__(request.game, priority, request.tokens, finish)
+            waited = time.monotonic() - request.enqueued
+            self.__record__(priority, waited)
+            request.future.set_result(waited)
+
+
+
+__shared_scheduler__ :RequestScheduler = None
+
+def shared_request_scheduler() ->RequestScheduler:
+    """Returns the scheduler of all agents, limited by LLM_RPM and LLM_TPM (0 = no limit)"""
+    global __shared_scheduler__   # pylint: disable=global-statement
+    if __shared_scheduler__ is None:
+        __shared_scheduler__ = RequestScheduler(
+            float(os.getenv('LLM_RPM', "0")),
+            float(os.getenv('LLM_TPM', "0"))
+        )
+    return __shared_scheduler__
+
+
+
+# Usage
+async def simulate(scheduler :RequestScheduler, busy_chatter :int) ->dict:
+    """5 games vote while one busy game floods the scheduler with chatter"""
+    async def call(game :str, priority :int, delay :float) ->None:
+        await asyncio.sleep(delay)
+        await scheduler.acquire(game, priority, 500)
+
+    calls = [call("busy", CHATTER, 0.0) for _ in range(busy_chatter)]
+    for game in range(5):
+        for player in range(8):
+            calls.append(call(f"game{game}", VOTE, 0.01 * player))
+            calls.append(call(f"game{game}", CHATTER, 0.01 * player))
+    await asyncio.gather(*calls)
+    return scheduler.stats()
+
+
+async def main() ->None:
+    """The p95 wait of the votes stays flat however much chatter is queued"""
+    for busy_chatter in (0, 50, 200):
+        stats = await simulate(RequestScheduler(60*400, 60*400*500, burst=0.05), busy_chatter)
+        print(f"{busy_chatter:4d} chatter requests of a busy game: "
+              f"vote p95 wait {stats['vote']['p95_wait']*1000:6.1f}ms, "
+              f"chatter p95 wait {stats['chatter']['p95_wait']*1000:6.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
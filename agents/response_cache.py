@@ -0,0 +1,132 @@
+#!/bin/python
+""" response_cache.py
+Caches the answers of deterministic agent prompts, keyed on a hash of
+(model, messages). An in-memory LRU with TTL is backed by an optional
+sqlite file, which survives restarts of the bot.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+
+class ResponseCache:
+    """LRU + on-disk cache for agent responses"""
+    def __init__(self, max_entries :int = 1024, ttl :float = 3600, path :str = None) ->None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries__ :OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.__db__ :sqlite3.Connection = None
+        if not path is None:
+            self.__db__ = sqlite3.connect(path, check_same_thread=False)
+            self.__db__.execute("CREATE TABLE IF NOT EXISTS responses "
+                                "(key TEXT PRIMARY KEY, expires REAL, value TEXT)")
+            self.__db__.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+            self.__db__.commit()
+
+
+    @staticmethod
+    def key(model_name :str, messages :list[dict]) ->str:
+        """Returns the cache key of a request"""
+        request = json.dumps([model_name, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+    def get(self, key :str) ->str:
+        """Returns the cached response, or None"""
+        now = time.time()
+        entry = self.__entries__.get(key)
+        if not entry is None and entry[0] < now:
+            del self.__entries__[key]
+            self.evictions += 1
+            entry = None
+        if entry is None and not self.__db__ is None:
+            row = self.__db__.execute("SELECT expires, value FROM responses "
+                                      "WHERE key = ? AND expires >= ?", (key, now)).fetchone()
+            if not row is None:
+                entry = (row[0], row[1])
+                self.__remember__(key, entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.__entries__.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+
+    def put(self, key :str, value :str) ->None:
+        """Caches the response for ttl seconds"""
+        entry = (time.time() + self.ttl, value)
+        self.__remember__(key, entry)
+        if not self.__db__ is None:
+            self.__db__.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                                (key, entry[0], entry[1]))
+            self.__db__.commit()
+
+
+    def stats(self) ->dict[str, int]:
+        """Returns the hit, miss and eviction counters"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.__entries__)}
+
+
+    def close(self) ->None:
+        """Closes the disk tier"""
+        if not self.__db__ is None:
+            self.__db__.close()
+            self.__db__ = None
+
+
+    def __remember__(self, key :str, entry :tuple[float, str]) ->None:
+        self.__entries__[key] = entry
+        self.__entries__.move_to_end(key)
+        while len(self.__entries__) > self.max_entries:
+            self.__entries__.popitem(last=False)
+            self.evictions += 1
+
+
+
+__shared_cache__ :ResponseCache = None
+
+def shared_response_cache() ->ResponseCache:
+    """Returns the response cache configured by RESPONSE_CACHE, None if disabled.
+    RESPONSE_CACHE=memory keeps the responses in memory only,
+    any other value is the path of the sqlite file."""
+    global __shared_cache__   # pylint: disable=global-statement
+    location = os.getenv('RESPONSE_CACHE', "")
+    if __shared_cache__ is None and len(location) > 0:
+        __shared_cache__ = ResponseCache(
+            int(os.getenv('RESPONSE_CACHE_SIZE', "1024")),
+            float(os.getenv('RESPONSE_CACHE_TTL', "3600")),
+            None if location == "memory" else location
+        )
+        logger.info("Response cache enabled: %s", location)
+    return __shared_cache__
+
+
+
+# Usage
+if __name__ == "__main__":
+    cache = ResponseCache(max_entries=2, ttl=60)
+    prompt = [{"role": "user", "content": "Decide for a victim!"}]
+    print(cache.get(ResponseCache.key("gpt-3.5-turbo", prompt)))
+    cache.put(ResponseCache.key("gpt-3.5-turbo", prompt), "Alice")
+    print(cache.get(ResponseCache.key("gpt-3.5-turbo", prompt)))
+    print(cache.stats())
@@ -0,0 +1,182 @@
+#!/bin/python
+""" stub_server.py
+A local stand-in for the OpenAI chat-completions API.
+Answers every request with a canned or scripted reply after a configurable latency,
+so the agents can be benchmarked and load-tested without network access and paid calls.
+Requests with tools are answered with a call of the first tool.
+"""
+import re
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Handles POST /v1/chat/completions like the OpenAI API does"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Answers a chat-completion request"""
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.__send_json__(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        time.sleep(self.server.latency + random.uniform(0, self.server.jitter))
+        content = self.server.next_reply(request.get("messages", []))
+        prompt_tokens = sum(len(msg.get("content") or "") // 4 + 4
+                            for msg in request.get("messages", []))
+        completion_tokens = len(content) // 4 + 1
+        if request.get("stream", False):
+            self.__send_stream__(request.get("model", "stub"), content)
+            return
+        message = {"role": "assistant", "content": content}
+        if len(request.get("tools", [])) > 0:
+            message = self.__tool_call__(request["tools"][0]["function"], content)
+        self.__send_json__(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if "tool_calls" in message else "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def __tool_call__(self, function :dict, content :str) ->dict:
+        """Calls the function with the enum value the reply mentions (the first if none)"""
+        arguments = {}
+        for name, schema in function.get("parameters", {}).get("properties", {}).items():
+            values = schema.get("enum", [content])
+            mentioned = [value for value in values if value.casefold() in content.casefold()]
+            arguments[name] = mentioned[0] if len(mentioned) > 0 else values[0]
+        return {"role": "assistant", "content": None, "tool_calls": [{
+            "id": "call-stub",
+            "type": "function",
+            "function": {"name": function["name"], "arguments": json.dumps(arguments)},
+        }]}
+
+    def __send_json__(self, status :int, body :dict) ->None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def __send_stream__(self, model :str, content :str) ->None:
+        """Sends the content word by word as server-sent events (chunked encoding)"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = content.split(" ")
+        for nr, word in enumerate(words):
+            if nr > 0:
+                time.sleep(self.server.chunk_delay)
+            self.__send_event__({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if nr == 0 else " " + word},
+                    "finish_reason": "stop" if nr == len(words) - 1 else None,
+                }],
+            })
+        self.__send_event__("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def __send_event__(self, body) ->None:
+        data = b"data: " + (body if isinstance(body, str) else json.dumps(body)).encode("utf-8") \
+            + b"\n\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug(format, *args)
+
+
+class StubServer(ThreadingHTTPServer):
+    """OpenAI-compatible HTTP server, answering with a canned or scripted reply.
+    The script is a list of {"match": regex, "reply": text} rules, checked
+    against the last user message; the first matching rule answers."""
+    daemon_threads = True
+
+    def __init__(self, port :int = 0, latency :float = 0.1, reply :str = "Hello!",
+                 script :list[dict] = None, jitter :float = 0.0, chunk_delay :float = 0.02) ->None:
+        super().__init__(("127.0.0.1", port), StubRequestHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay  # seconds between the words of a streamed reply
+        self.reply = reply
+        self.script = [(re.compile(rule["match"], re.IGNORECASE), rule["reply"])
+                       for rule in (script or [])]
+        self.__thread__ :threading.Thread = None
+
+    def next_reply(self, messages :list[dict]) ->str:
+        """Returns the reply to the last user message"""
+        prompt = ""
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                prompt = message.get("content") or ""
+                break
+        for pattern, reply in self.script:
+            if pattern.search(prompt):
+                return reply
+        return self.reply
+
+    @property
+    def base_url(self) ->str:
+        """The base_url to pass to the OpenAI client"""
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) ->None:
+        """Serves in a background thread"""
+        self.__thread__ = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread__.start()
+        logger.info("StubServer listening on %s", self.base_url)
+
+    def stop(self) ->None:
+        """Stops serving and closes the socket"""
+        self.shutdown()
+        self.server_close()
+
+
+
+# Usage
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds")
+    parser.add_argument("--reply", default="Hello, I am a villager!")
+    parser.add_argument("--script", help="json file with a list of {match, reply} rules")
+    options = parser.parse_args()
+
+    rules = None
+    if not options.script is None:
+        with open(options.script, 'r', encoding="utf-8") as f:
+            rules = json.load(f)
+    server = StubServer(options.port, options.latency, options.reply, rules, options.jitter)
+    logger.info("StubServer listening on %s", server.base_url)
+    server.serve_forever()
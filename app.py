@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 
 from plaier_bot import PlaierBot
 from moderator_bot import bot
+from service.sharding import ShardGateway, BotTransport
 
 
 # Load configuration
@@ -18,6 +19,7 @@ DISCORD_GUILD = os.getenv('DISCORD_GUILD')
 DEV_USER_ID = os.getenv('DEV_USER_ID')
 MODERATOR_TOKEN = os.getenv('MODERATOR_TOKEN')
 PLAIER_TOKEN = os.getenv('PLAIER_TOKEN')
+GAME_WORKERS = int(os.getenv('GAME_WORKERS', "0"))
 
 
 # Application entry point
@@ -26,8 +28,15 @@ if __name__ == "__main__":
         os.makedirs('data')
 
     plaier = PlaierBot(DISCORD_GUILD, bot.games)
+    bot.plaier = plaier
 
     loop = asyncio.get_event_loop()
+    if GAME_WORKERS > 0:
+        # the games run in worker processes, the bots only route and send
+        gateway = ShardGateway(GAME_WORKERS, BotTransport(bot, plaier))
+        bot.gateway = gateway
+        plaier.gateway = gateway
+        loop.call_soon(gateway.start)
     loop.create_task( bot.start(MODERATOR_TOKEN))
     loop.create_task( plaier.start(PLAIER_TOKEN))
     loop.run_forever()
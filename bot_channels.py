@@ -0,0 +1,38 @@
+"""
+The general channel of the guild, shared by the discord bots
+"""
+from discord import TextChannel
+
+
+class GeneralChannelMixin:
+    """Caches the general channel (the first text channel) of self.guild,
+    it is looked up again when the channels are created, deleted or moved"""
+    __general_channel_id__ :int = None   # cached, guild.text_channels sorts every time
+
+    def general_channel(self) ->TextChannel:
+        """Returns the general channel"""
+        if self.__general_channel_id__ is None:
+            self.__general_channel_id__ = self.guild.text_channels[0].id
+        return self.guild.get_channel(self.__general_channel_id__)
+
+    def is_general_channel(self, channel :TextChannel) ->bool:
+        """Checks if the channel is the general-channel (which is not used for games)"""
+        if self.__general_channel_id__ is None:
+            self.__general_channel_id__ = self.guild.text_channels[0].id
+        return channel.id == self.__general_channel_id__
+
+
+    async def on_guild_channel_create(self, channel):
+        """The channel order may have changed, find the general channel again"""
+        if channel.guild == self.guild:
+            self.__general_channel_id__ = None
+
+    async def on_guild_channel_delete(self, channel):
+        """The channel order may have changed, find the general channel again"""
+        if channel.guild == self.guild:
+            self.__general_channel_id__ = None
+
+    async def on_guild_channel_update(self, before, after):
+        """The channel order may have changed, find the general channel again"""
+        if after.guild == self.guild and before.position != after.position:
+            self.__general_channel_id__ = None
@@ -0,0 +1,113 @@
+"""
+Fan-out of the channel messages of a game to its AI-agent players
+"""
+import time
+import asyncio
+import logging
+
+from logic.conversationlog import ConversationLog
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class Subscription:
+    """A subscriber's bounded view on the game's conversation log"""
+    def __init__(self, bus, callback, capacity :int) ->None:
+        self.bus = bus
+        self.callback = callback    # called (without arguments) when new messages arrived
+        self.capacity = capacity    # max. unread messages, older ones are dropped
+        self.position = len(bus.log)
+        self.delivered = 0
+        self.fetches = 0
+        self.dropped = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def fetch(self) ->tuple[int, int]:
+        """Returns the range [start, end) of the unread messages and marks them read"""
+        end = len(self.bus.log)
+        start = self.position
+        if end - start > self.capacity:
+            self.dropped += end - start - self.capacity
+            logger.warning("Subscriber fell behind, dropped %d messages", end-start-self.capacity)
+            start = end - self.capacity
+        if end > start:
+            # the lag of the oldest unread message
+            lag = time.monotonic() - self.bus.published_at[start]
+            self.fetches += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            self.delivered += end - start
+        self.position = end
+        return (start, end)
+
+    def close(self) ->None:
+        """Stops the subscription"""
+        self.bus.subscriptions.discard(self)
+
+
+class BroadcastBus:
+    """Publish/subscribe of the messages of one game.
+    Publishing is O(1): the message is appended to the shared log and a single
+    dispatcher task notifies the subscribers, outside of the publisher's handler."""
+    def __init__(self, log :ConversationLog, capacity :int = 256) ->None:
+        self.log = log
+        self.capacity = capacity
+        self.published_at :list[float] = []
+        self.subscriptions :set[Subscription] = set()
+        self.__wakeup__ :asyncio.Event = None
+        self.__task__ :asyncio.Task = None
+
+
+    def publish(self, channel_id :int, author_name :str, message :str) ->None:
+        """Appends the message to the log and wakes up the dispatcher"""
+        self.log.append(channel_id, author_name, message)
+        self.published_at.append(time.monotonic())
+        if self.__task__ is None or self.__task__.done():
+            self.__wakeup__ = asyncio.Event()
+            self.__task__ = asyncio.create_task(self.__dispatch__())
+        self.__wakeup__.set()
+
+
+    def subscribe(self, callback, capacity :int = None) ->Subscription:
+        """Subscribes to the messages published from now on"""
+        subscription = Subscription(self, callback, capacity if capacity else self.capacity)
+        self.subscriptions.add(subscription)
+        return subscription
+
+
+    def stats(self) ->dict:
+        """Returns the delivery statistics over all subscribers"""
+        return {
+            "published": len(self.log),
+            "subscribers": len(self.subscriptions),
+            "delivered": sum(sub.delivered for sub in self.subscriptions),
+            "dropped": sum(sub.dropped for sub in self.subscriptions),
+            "mean_lag": sum(sub.total_lag for sub in self.subscriptions)
+                        / max(1, sum(sub.fetches for sub in self.subscriptions)),
+            "max_lag": max((sub.max_lag for sub in self.subscriptions), default=0.0),
+        }
+
+
+    def close(self) ->None:
+        """Stops the dispatcher"""
+        if not self.__task__ is None:
+            self.__task__.cancel()
+            self.__task__ = None
+        self.subscriptions.clear()
+
+
+    async def __dispatch__(self) ->None:
+        while True:
+            await self.__wakeup__.wait()
+            self.__wakeup__.clear()
+            for subscription in list(self.subscriptions):
+                try:
+                    subscription.callback()
+                except Exception:   # pylint: disable=broad-exception-caught
+                    # one failing subscriber must not stop the delivery to the others
+                    logger.exception("Broadcast subscriber %s failed", subscription.callback)
@@ -1,11 +1,18 @@
 """
 Abstract State-Machine implementing the various states in the game play
 """
+import os
+import re
+import asyncio
+import difflib
 import logging
+from dotenv import load_dotenv
 
 from model.command import GameCommand
 from model.player import Player
-from model.card import WerewolfCard
+from model.card import Card, VILLAGERS, WEREWOLVES, load_card_table
+from logic.votetally import VoteTally
+from service.tracing import span
 
 
 # Set up logging
@@ -13,11 +20,48 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name
 logger = logging.getLogger(__name__)
 
 
+# Load configuration
+load_dotenv()
+
+
+def normalize_name(player_name :str) ->str:
+    """The key of a player name in the name index"""
+    return player_name.strip().casefold()
+
+
+def name_key(text :str) ->str:
+    """The words of a name or an answer, without case, punctuation and markup:
+    '**Alice!**' -> 'alice', 'Mister  X.' -> 'mister x'"""
+    return " ".join(re.findall(r"[^\W_]+", text.casefold()))
+
+
+def team_of(player :Player) ->str:
+    """The team of the player's card, players without a card count as villagers"""
+    return VILLAGERS if player.card is None else player.card.team
+
+
 class Context:
-    """The game that holds the state"""
+    """The game that holds the state.
+    The name index, the alive counters and the pending voters are maintained
+    incrementally, so the game logic must change players via add_player(),
+    remove_player(), assign_card(), kill_player(), start_voting() and record_vote()."""
     def __init__(self, name :str) ->None:
         self.players: dict[str, Player] = {}
         self.name = name
+        self.registry = None    # the GameRegistry routing to this game
+        self.snapshots = None   # the SnapshotStore keeping this game across restarts
+        self.journal = None     # the GameJournal recording the commands of this game
+        self.debug_invariants = os.getenv('DEBUG_INVARIANTS', "0") == "1"
+        self.phase_timeout = float(os.getenv('PHASE_TIMEOUT', "0"))
+        self.card_table = load_card_table(os.getenv('CARD_TABLE', ""))
+
+        # the players per normalized name and per name key (for resolve_player_name()),
+        # "Alice" and "alice" may both play, so a key can have several players
+        self.__by_name__ :dict[str, list[Player]] = {}
+        self.__by_key__ :dict[str, list[Player]] = {}
+        self.__alive_count__ = 0
+        self.__alive_per_team__ :dict[str, int] = {VILLAGERS: 0, WEREWOLVES: 0}
+        self.tally = VoteTally([])  # the votes of the current phase
 
 
     ##### Abstract State-Handling
@@ -37,22 +81,139 @@ class Context:
         """Next state is DayState"""
 
 
+    ##### Players
+    def add_player(self, player :Player) ->None:
+        """Adds the player to the game"""
+        self.remove_player(player.name)
+        self.players[player.name] = player
+        self.__by_name__.setdefault(normalize_name(player.name), []).append(player)
+        self.__by_key__.setdefault(name_key(player.name), []).append(player)
+        if not player.is_dead:
+            self.__count_alive__(player, +1)
+        if not self.registry is None:
+            self.registry.player_joined(self, player)
+
+
+    def remove_player(self, player_name :str) ->Player:
+        """Removes the player from the game, returns the removed player or None"""
+        player = self.players.pop(player_name, None)
+        if player is None:
+            return None
+        for (index, key) in ((self.__by_name__, normalize_name(player_name)),
+                             (self.__by_key__, name_key(player_name))):
+            index[key].remove(player)
+            if len(index[key]) == 0:
+                del index[key]
+        if not player.is_dead:
+            self.__count_alive__(player, -1)
+        self.tally.remove_voter(player)
+        if not self.registry is None:
+            self.registry.player_left(self, player)
+        return player
+
+
+    def assign_card(self, player :Player, card :Card) ->None:
+        """Gives the card to the player"""
+        if not player.is_dead:
+            self.__count_alive__(player, -1)
+        player.card = card
+        if not player.is_dead:
+            self.__count_alive__(player, +1)
+
+
+    def kill_player(self, player :Player) ->None:
+        """The player dies"""
+        if not player.is_dead:
+            player.is_dead = True
+            self.__count_alive__(player, -1)
+            self.tally.remove_voter(player)
+
+
+    def start_voting(self, voters) ->None:
+        """Clears all votes for the next phase, the voters still need to vote"""
+        for player in self.players.values():
+            player.clear_votes()
+        self.tally = VoteTally(voter for voter in voters if not voter.is_dead)
+
+
+    def record_vote(self, player :Player, victim :Player) ->None:
+        """The player voted (or changed the vote) for the victim"""
+        with span("VoteTally.vote"):
+            self.tally.vote(player, victim)
+
+
+    def __count_alive__(self, player :Player, delta :int) ->None:
+        self.__alive_count__ += delta
+        self.__alive_per_team__[team_of(player)] += delta
+
+
+    def check_invariants(self) ->None:
+        """Verifies the incrementally maintained indexes (DEBUG_INVARIANTS=1)"""
+        alive = [player for player in self.players.values() if not player.is_dead]
+        per_team = {VILLAGERS: 0, WEREWOLVES: 0}
+        for player in alive:
+            per_team[team_of(player)] += 1
+        (by_name, by_key) = ({}, {})
+        for player in self.players.values():
+            by_name.setdefault(normalize_name(player.name), []).append(player)
+            by_key.setdefault(name_key(player.name), []).append(player)
+        if self.__alive_count__ != len(alive) or self.__alive_per_team__ != per_team \
+                or any(name != player.name for name, player in self.players.items()) \
+                or (self.__by_name__, self.__by_key__) != (by_name, by_key) \
+                or any(voter.is_dead or not voter.name in self.players
+                       for voter in self.tally.electorate):
+            raise AssertionError(
+                f"Game {self.name}: alive={self.__alive_count__}/{len(alive)} "
+                f"teams={self.__alive_per_team__}/{per_team} "
+                f"names={sorted(self.__by_name__)}/{sorted(by_name)} "
+                f"electorate={[voter.name for voter in self.tally.electorate]}")
+
+
     ##### Game Logic Helpers
     def find_player_by_name(self, player_name: str) ->Player:
-        """Finds the player by player_name"""
-        for player in self.players.values():
-            if player.name == player_name:
-                return player
+        """Finds the player by player_name, ignoring case and surrounding blanks
+        only if that is unambiguous"""
+        player = self.players.get(player_name)
+        if player is None:
+            players = self.__by_name__.get(normalize_name(player_name), [])
+            player = players[0] if len(players) == 1 else None
+        return player
+
+
+    def resolve_player_name(self, answer :str, candidates :list[Player] = None) ->Player:
+        """Finds the player named by the free-text answer of an AI agent, trying
+        the name ignoring case, blanks, punctuation and markup, then the last name
+        mentioned in the answer, then the most similar name (typos);
+        only the candidates count (default: the alive players), returns None if none fits"""
+        if answer is None:
+            return None
+        if candidates is None:
+            candidates = [player for player in self.players.values() if not player.is_dead]
+        player = self.find_player_by_name(answer)
+        if player in candidates:
+            return player
+        key = name_key(answer)
+        players = [player for player in self.__by_key__.get(key, []) if player in candidates]
+        if len(players) == 1:
+            return players[0]
+        keys = {}   # the unambiguous keys of the candidates
+        for player in candidates:
+            keys[name_key(player.name)] = None if name_key(player.name) in keys else player
+        keys = {name: player for name, player in keys.items() if not player is None}
+        mentioned = [(f" {key} ".rfind(f" {name} "), name) for name in keys
+                     if f" {name} " in f" {key} "]
+        if len(mentioned) > 0:
+            return keys[max(mentioned)[1]]
+        for word in [key] + key.split(" "):
+            close = difflib.get_close_matches(word, keys, n=1, cutoff=0.8)
+            if len(close) > 0:
+                return keys[close[0]]
         return None
 
 
     def get_alive_players_count(self) ->int:
         """Counts the number of alive players"""
-        nr_alive = 0
-        for player in self.players.values():
-            if not player.is_dead:
-                nr_alive += 1
-        return nr_alive
+        return self.__alive_count__
 
     def get_alive_players_msg(self) ->str:
         """Returns a list of still alive players"""
@@ -68,20 +229,43 @@ class Context:
 
     def check_gameover(self) ->(int, int):
         """Counts the alive werewolves and villagers to check if the game is over."""
-        nr_werewolves = 0
-        nr_villagers = 0
-        for player in self.players.values():
-            if not player.is_dead:
-                if isinstance(player.card, WerewolfCard):
-                    nr_werewolves += 1
-                else:
-                    nr_villagers += 1
-        return nr_werewolves, nr_villagers
+        return self.__alive_per_team__[WEREWOLVES], self.__alive_per_team__[VILLAGERS]
 
 
     ##### Abstract UI functions
-    async def send_msg(self, msg :str) ->None:
-        """Sends a message in the channel of the game"""        
+    async def send_msg(self, msg :str, key :str = None) ->None:
+        """Sends a message in the channel of the game,
+        a newer message with the same key may replace it while not sent yet"""
+
+
+    async def send_werewolves(self, msg :str, key :str = None) ->None:
+        """Sends a message int the secret channel of the werewolves"""
+
+
+    async def create_werewolves_channel(self) ->None:
+        """Creates the secret channel of the werewolves (if not existing yet)"""
+
+
+    async def delete_werewolves_channel(self) ->None:
+        """Deletes the secret channel of the werewolves (if existing)"""
+
+
+    async def send_dms(self, messages :list[tuple[Player, str]]) ->list[Player]:
+        """Sends the direct messages to all players concurrently,
+        returns the players which could not be reached (e.g. their DMs are closed)"""
+        with span("send_dms"):
+            results = await asyncio.gather(*(player.send_dm(msg) for (player, msg) in messages),
+                                           return_exceptions=True)
+        failed = []
+        for (player, _), result in zip(messages, results):
+            if isinstance(result, Exception):
+                logger.warning("Sending DM to %s failed: %s", player.name, result)
+                failed.append(player)
+        if len(failed) > 0:
+            await self.send_msg("Could not send direct messages to "
+                + ", ".join(f"**{player.name}**" for player in failed)
+                + ", please allow direct messages from members of this server!")
+        return failed
 
 
     async def handle_game_over(self) ->bool:
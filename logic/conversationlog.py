@@ -0,0 +1,51 @@
+"""
+The conversation of a game, shared by all AI-agent players
+"""
+import sys
+import logging
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class ConversationLog:
+    """Append-only log of the channel messages of one game.
+    The AI-agent players only keep a position into the log and render the
+    text for their prompts lazily, so each message is stored once per game."""
+    RENDER_CACHE_SIZE = 16
+
+    def __init__(self) ->None:
+        self.entries :list[tuple[int, str, str]] = []
+        self.__rendered__ :dict[tuple[int, int], str] = {}
+
+
+    def __len__(self) ->int:
+        return len(self.entries)
+
+
+    def append(self, channel_id :int, author_name :str, message :str) ->int:
+        """Appends a message, returns its position in the log"""
+        self.entries.append( (channel_id, sys.intern(author_name), sys.intern(message)) )
+        return len(self.entries) - 1
+
+
+    def channel_of(self, position :int) ->int:
+        """Returns the channel id of the message at the position"""
+        return self.entries[position][0]
+
+
+    def render(self, start :int, end :int) ->str:
+        """Returns the messages [start, end) as 'author: message' lines.
+        Players flushing the same range share the same string."""
+        key = (start, end)
+        text = self.__rendered__.get(key)
+        if text is None:
+            text = "".join(f"{author_name}: {message}\n"
+                           for _, author_name, message in self.entries[start:end])
+            if len(self.__rendered__) >= self.RENDER_CACHE_SIZE:
+                del self.__rendered__[next(iter(self.__rendered__))]
+            self.__rendered__[key] = text
+        return text
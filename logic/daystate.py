@@ -30,15 +30,30 @@ class DayState(GameState):
         if player is None or victim is None:
             return
         player.day_vote = victim
+        game.record_vote(player, victim)
 
         victim = await self.check_current_votes(game)
         if victim is None:
             return
 
-        # We found a victim
+        await self.kill_victim(game, victim)
+
+    async def handle_deadline(self, game :Context) ->None:
+        """Time is up: the player with the most votes is the victim"""
+        victim = game.tally.leader()
+        if victim is None:
+            await game.send_msg("Time is up, but the villagers could not agree on a victim.\n"
+                                "Use **!vote** command to update your decision.")
+            self.start_deadline(game)
+            return
+        await game.send_msg(f"Time is up! {victim.name} got the most votes.")
+        await self.kill_victim(game, victim)
+
+    async def kill_victim(self, game :Context, victim :Player) ->None:
+        """The villagers found a victim"""
         result = f"{victim.name} is killed by the villagers!\n"
         result += f"{victim.name} was a {victim.card.name}."
-        victim.is_dead = True
+        game.kill_player(victim)
         await game.send_msg(result)
 
         if not await game.handle_game_over():
@@ -46,38 +61,23 @@ class DayState(GameState):
 
     async def check_current_votes(self, game :Context) ->Player:
         """Check if the vote is already ended"""
-        votes = "The current votes are:\n"
-        non_votes = "These players still need to vote:\n"
-        nr_players = game.get_alive_players_count()
-        players_voted : dict[Player, int] = {}
-        for player in game.players.values():
-            players_voted[player] = 0
-        for player in game.players.values():
-            if not player.is_dead:
-                if not player.day_vote is None:
-                    players_voted[player.day_vote] = players_voted[player.day_vote]+1
-                    votes += f"- {player.name} votes for {player.day_vote.name}\n"
-                else:
-                    non_votes += f"- {player.name}\n"
-        victim = None
-        for player, v in players_voted.items():
-            if v*2 > nr_players:
-                victim = player
-
+        victim = game.tally.majority()
         if victim is None:
+            (votes, non_votes) = game.tally.status_text()
             await game.send_msg(
                 votes +
                 "Vote is not finished, because the victim must count at least half of the votes.\n"
                 + non_votes +
-                "Use **!vote** command to update your decision."
+                "Use **!vote** command to update your decision.",
+                key="votes"
             )
         return victim
 
 
     async def on_enter(self, game: Context, prev_state) ->None:
-        for player in game.players.values():
-            player.clear_votes()
+        game.start_voting(game.players.values())
         await game.send_msg(
             "It was a long night and the werewolves roamed the streets of the city. "
             "Wake up, everyone, and wait for the things to come."
         )
+        self.start_deadline(game)
@@ -5,6 +5,7 @@ import logging
 from discord import Guild, TextChannel
 
 from logic.gamecontext import GameContext
+from service.channeloutbox import ChannelOutbox
 
 
 # Set up logging
@@ -18,16 +19,66 @@ class DiscordContext(GameContext):
         super().__init__(channel.name)
         self.guild = guild
         self.channel = channel
-        self.werewolves_channel : TextChannel = None
+        self.__werewolves_channel__ : TextChannel = None
+        self.outboxes :dict[int, ChannelOutbox] = {}
 
 
-    async def send_msg(self, msg :str) ->None:
-        """Sends a message in the channel of the game"""
-        await self.channel.send( msg )
+    @property
+    def werewolves_channel(self) ->TextChannel:
+        """The secret channel of the werewolves"""
+        return self.__werewolves_channel__
 
-    async def send_werewolves(self, msg :str) ->None:
-        """Sends a message int the secret channel of the werewolves"""
+    @werewolves_channel.setter
+    def werewolves_channel(self, channel :TextChannel) ->None:
+        old = self.__werewolves_channel__
+        self.__werewolves_channel__ = channel
+        if not self.registry is None:
+            self.registry.werewolves_channel_changed(self,
+                None if old is None else old.id,
+                None if channel is None else channel.id)
+
+
+    def outbox(self, channel :TextChannel) ->ChannelOutbox:
+        """The outbound queue of the channel"""
+        outbox = self.outboxes.get(channel.id)
+        if outbox is None:
+            outbox = self.outboxes[channel.id] = ChannelOutbox(channel)
+        return outbox
+
+
+    async def close(self) ->None:
+        """The channel was deleted, the pending messages are dropped"""
+        await super().close()
+        for outbox in self.outboxes.values():
+            outbox.close()
+        self.outboxes.clear()
+
+
+    async def send_msg(self, msg :str, key :str = None) ->None:
+        """Queues a message to the channel of the game"""
+        self.outbox(self.channel).send(msg, key)
+
+    async def send_werewolves(self, msg :str, key :str = None) ->None:
+        """Queues a message to the secret channel of the werewolves"""
         if not self.werewolves_channel is None:
-            await self.werewolves_channel.send(msg)
+            self.outbox(self.werewolves_channel).send(msg, key)
         else:
             logger.error("No werewolves channel exist! Send '%s' failed!", msg)
+
+
+    async def create_werewolves_channel(self) ->None:
+        """Creates the secret channel of the werewolves (if not existing yet)"""
+        if self.werewolves_channel is None:
+            self.werewolves_channel = await self.guild.create_text_channel(
+                "WerewolvesOnly_" + self.channel.name
+            )
+
+
+    async def delete_werewolves_channel(self) ->None:
+        """Deletes the secret channel of the werewolves (if existing)"""
+        if not self.werewolves_channel is None:
+            outbox = self.outboxes.pop(self.werewolves_channel.id, None)
+            if not outbox is None:
+                outbox.close()
+            await self.werewolves_channel.delete()
+            self.werewolves_channel = None
@@ -1,16 +1,27 @@
 """
 State-Machine implementing the various states in the game play
 """
+import time
+import random
 import logging
 
 from logic.context import Context
+from logic.conversationlog import ConversationLog
+from logic.broadcastbus import BroadcastBus
 from logic.state import State
+from logic.gamestate import GameState
 from logic.readystate import ReadyState
 from logic.nightstate import NightState
 from logic.daystate import DayState
-from model.command import GameCommand
+from logic.gamejournal import command_fields
+from model.command import GameCommand, StartCommand
 from model.player import Player
-from model.card import WerewolfCard, SeerCard
+from model.card import WerewolfCard, SeerCard, VILLAGERS, WEREWOLVES
+from model.votebatcher import VoteBatcher
+from model.aiagentplayer import AIAgentPlayer
+from agents.request_scheduler import shared_request_scheduler
+from service.metrics import metrics
+from service.tracing import span
 
 
 # Set up logging
@@ -18,27 +29,95 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name
 logger = logging.getLogger(__name__)
 
 
+command_seconds = metrics.histogram("werewolves_command_seconds",
+    "Time to handle a game command (including the state changes it caused)")
+state_change_seconds = metrics.histogram("werewolves_state_change_seconds",
+    "Time of the on_leave/on_enter handlers of a state change")
+
+
 class GameContext(Context):
     """The game that holds the state"""
     def __init__(self, name :str) ->None:
         super().__init__(name)
+        self.channel = None     # the channel of the game, set by the subclasses
         self.players: dict[str, Player] = {}
         self.__state__ :State = ReadyState()
+        self.conversation = ConversationLog()
+        self.bus = BroadcastBus(self.conversation)
+        self.vote_batcher = VoteBatcher(name)
+        self.rng = random.Random()      # shuffles the cards, seed it to replay a game
+        self.last_winner :str = None    # the team which won the last game
+
+
+    async def close(self) ->None:
+        """The game is dropped without a word (its channel was deleted): leaves the registry
+        with all its routes, stops the phase deadline and the AI-agent players, removes
+        the players (and so the snapshot) and the werewolves channel"""
+        if not self.registry is None:
+            self.registry.remove_game(self.channel.id)
+        if isinstance(self.__state__, GameState) and not self.__state__.deadline is None:
+            self.__state__.deadline.cancel()
+            self.__state__.deadline = None
+        while len(self.players) > 0:
+            player = self.remove_player(next(iter(self.players)))
+            if isinstance(player, AIAgentPlayer):
+                player.stop()
+        shared_request_scheduler().unregister(self.name)
+        self.bus.close()
+        await self.delete_werewolves_channel()
+        self.changed()
 
 
     ##### State-Handling
     async def handle(self, command :GameCommand) ->None:
         """Handle the provided command, returns a text message to be displaye in the channel"""
-        await self.__state__.handle(self, command)
+        if isinstance(command, StartCommand):
+            if command.seed is None:
+                command.seed = self.rng.getrandbits(32)
+            self.rng.seed(command.seed)
+        if not self.journal is None:
+            self.record(**command_fields(self, command))
+        start = time.perf_counter()
+        with span("GameContext.handle"):
+            await self.__state__.handle(self, command)
+        command_seconds.observe(time.perf_counter() - start, command=type(command).__name__)
+        if self.debug_invariants:
+            self.check_invariants()
+        self.changed()
+
+
+    async def handle_phase_deadline(self) ->None:
+        """The time of the current phase is up (PHASE_TIMEOUT)"""
+        self.record("deadline")
+        await self.__state__.handle_deadline(self)
+        self.changed()
+
+
+    def record(self, event :str, **fields) ->None:
+        """Appends the event to the journal of the game (if journaled)"""
+        if not self.journal is None:
+            self.journal.record(event, **fields)
+
+
+    def changed(self) ->None:
+        """The players, votes or state changed, schedules writing the snapshot"""
+        if not self.snapshots is None:
+            self.snapshots.changed(self)
 
 
     async def __change_state__(self, next_state) ->None:
         """Change the state, will automatically call on_leave/on_enter"""
-        prev_state = self.__state__
-        if not prev_state is None:
-            await prev_state.on_leave( self, next_state )
-        self.__state__ = next_state
-        await self.__state__.on_enter( self, prev_state )
+        start = time.perf_counter()
+        with span(f"change_state:{type(next_state).__name__}"):
+            prev_state = self.__state__
+            if not prev_state is None:
+                await prev_state.on_leave( self, next_state )
+            self.__state__ = next_state
+            await self.__state__.on_enter( self, prev_state )
+        state_change_seconds.observe(time.perf_counter() - start, state=type(next_state).__name__)
+        self.record("state", state=type(next_state).__name__)
+        self.vote_batcher.phase_started(type(next_state).__name__)
+        self.changed()
 
 
     async def switch_to_readystate(self):
@@ -57,16 +136,22 @@ class GameContext(Context):
 
 
     ##### Override UI functions
-    async def send_msg(self, msg :str) ->None:
+    async def send_msg(self, msg :str, key :str = None) ->None:
         """Sends a message in the channel of the game"""        
 
 
     async def handle_game_over(self) ->bool:
         """Check if the game is over, if yes --> handle it"""
+        with span("handle_game_over"):
+            return await self.__handle_game_over__()
+
+    async def __handle_game_over__(self) ->bool:
         nr_werewolves, nr_villagers = self.check_gameover()
         if nr_werewolves == 0:
+            self.last_winner = VILLAGERS
             await self.send_msg("GAME OVER - the villagers won!")
         if nr_villagers == 0:
+            self.last_winner = WEREWOLVES
             await self.send_msg("GAME OVER - the werewolves won!")
 
         if nr_werewolves == 0 or nr_villagers == 0:
@@ -0,0 +1,55 @@
+"""
+Append-only journal of a game: the channel name, every command, AI-agent invite,
+phase deadline and state change is recorded as one compact JSON line, the start together with
+the seed of the card shuffle and the deck. tools/replay_journal.py rebuilds the
+game from its journal on the HeadlessContext, without Discord and LLM.
+"""
+import json
+import time
+import logging
+
+from logic.context import Context
+from model.command import GameCommand, StatusCommand, StartCommand, VoteCommand
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class GameJournal:
+    """Records the events of one game into the journal writer"""
+    def __init__(self, writer, key) ->None:
+        self.writer = writer    # JournalWriter or MemoryJournalWriter
+        self.key = key          # the channel id of the game
+        self.events = 0
+
+    def record(self, event :str, **fields) ->None:
+        """Appends the event (with the wall-clock time in ms)"""
+        entry = {"t": int(time.time() * 1000), "e": event}
+        entry.update(fields)
+        self.writer.append(self.key, json.dumps(entry, separators=(',', ':'), ensure_ascii=False))
+        self.events += 1
+
+
+def command_fields(game :Context, command :GameCommand) ->dict:
+    """The arguments of GameJournal.record for the command"""
+    if isinstance(command, VoteCommand):
+        return {"event": "vote", "voter": command.voter_name, "victim": command.player_name}
+    if isinstance(command, StartCommand):
+        return {"event": "start", "seed": command.seed,
+                "deck": None if game.card_table is None
+                        else game.card_table.get(len(game.players))}
+    if isinstance(command, StatusCommand):
+        werewolves = not command.channel is None and command.channel == game.werewolves_channel
+        return {"event": "status", "channel": "werewolves" if werewolves else "game"}
+    fields = {"event": command.name}
+    if not command.author is None:
+        fields.update({"member": command.author.id, "name": command.author.display_name})
+    return fields
+
+
+def read_journal(path :str) ->list[dict]:
+    """The events of the journal file"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if len(line.strip()) > 0]
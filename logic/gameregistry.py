@@ -0,0 +1,83 @@
+"""
+Routing indexes from Discord ids to the games
+"""
+import logging
+
+from logic.context import Context
+from model.player import Player
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class GameRegistry:
+    """All games of the guild, indexed by channel id, werewolves-channel id and member id.
+    The games report joining and leaving players and their werewolves channel,
+    so every lookup stays O(1) however many games are running."""
+    def __init__(self) ->None:
+        self.__by_channel__ :dict[int, Context] = {}
+        self.__by_werewolves_channel__ :dict[int, Context] = {}
+        self.__by_member__ :dict[int, Context] = {}
+
+
+    def __len__(self) ->int:
+        return len(self.__by_channel__)
+
+    def values(self):
+        """All games"""
+        return self.__by_channel__.values()
+
+
+    ##### Lookups
+    def game_from_channel(self, channel_id :int) ->Context:
+        """Returns the game played in the channel, or None"""
+        return self.__by_channel__.get(channel_id)
+
+    def game_from_werewolves_channel(self, channel_id :int) ->Context:
+        """Returns the game of the werewolves channel, or None"""
+        return self.__by_werewolves_channel__.get(channel_id)
+
+    def game_from_member(self, member_id :int) ->Context:
+        """Returns the game the member is playing, or None"""
+        return self.__by_member__.get(member_id)
+
+
+    ##### Updates
+    def add_game(self, channel_id :int, game :Context) ->None:
+        """A new game is played in the channel"""
+        self.__by_channel__[channel_id] = game
+        game.registry = self
+
+    def remove_game(self, channel_id :int) ->None:
+        """The game of the channel ended for good"""
+        game = self.__by_channel__.pop(channel_id, None)
+        if game is None:
+            return
+        for player in game.players.values():
+            self.player_left(game, player)
+        werewolves_channel = getattr(game, "werewolves_channel", None)
+        if not werewolves_channel is None:
+            self.werewolves_channel_changed(game, werewolves_channel.id, None)
+        game.registry = None
+
+    def player_joined(self, game :Context, player :Player) ->None:
+        """The player joined the game"""
+        member = getattr(player, "member", None)
+        if not member is None:
+            self.__by_member__[member.id] = game
+
+    def player_left(self, game :Context, player :Player) ->None:
+        """The player left the game"""
+        member = getattr(player, "member", None)
+        if not member is None and self.__by_member__.get(member.id) is game:
+            del self.__by_member__[member.id]
+
+    def werewolves_channel_changed(self, game :Context, old_id :int, new_id :int) ->None:
+        """The werewolves channel of the game was created or deleted"""
+        if not old_id is None and self.__by_werewolves_channel__.get(old_id) is game:
+            del self.__by_werewolves_channel__[old_id]
+        if not new_id is None:
+            self.__by_werewolves_channel__[new_id] = game
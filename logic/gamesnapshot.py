@@ -0,0 +1,125 @@
+"""
+Converts a game into plain data and back, to survive restarts of the bot
+"""
+import logging
+
+from logic.gamecontext import GameContext
+from logic.readystate import ReadyState
+from logic.nightstate import NightState
+from logic.daystate import DayState
+from logic.votetally import VoteTally
+from model.player import Player
+from model.humanplayer import HumanPlayer
+from model.aiagentplayer import AIAgentPlayer
+from model.card import CARD_TYPES
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+SNAPSHOT_VERSION = 1
+STATES = {state.__name__: state for state in (ReadyState, NightState, DayState)}
+
+
+
+def snapshot_player(player :Player) ->dict:
+    """The player as plain data, Discord members are kept by id"""
+    data = {
+        "type": type(player).__name__,
+        "name": player.name,
+        "card": None if player.card is None else player.card.name,
+        "is_dead": player.is_dead,
+        "night_vote": None if player.night_vote is None else player.night_vote.name,
+        "day_vote": None if player.day_vote is None else player.day_vote.name,
+        "seer_asked_werewolf": player.seer_asked_werewolf,
+    }
+    member = getattr(player, "member", None)
+    if not member is None:
+        data["member_id"] = member.id
+    agent = getattr(player, "agent", None)
+    if not agent is None:
+        data["agent"] = agent.context.snapshot()
+    return data
+
+
+def snapshot_game(game :GameContext) ->dict:
+    """The game as plain data, or None if there is nothing to keep (no players)"""
+    if len(game.players) == 0:
+        return None
+    werewolves_channel = getattr(game, "werewolves_channel", None)
+    return {
+        "version": SNAPSHOT_VERSION,
+        "name": game.name,
+        "channel_id": game.channel.id,
+        "werewolves_channel_id": None if werewolves_channel is None else werewolves_channel.id,
+        "state": type(game.__state__).__name__,
+        "players": [snapshot_player(player) for player in game.players.values()],
+        "electorate": [voter.name for voter in game.tally.electorate],
+        "votes": [[voter.name, victim.name] for voter, victim in game.tally.votes.items()],
+    }
+
+
+def restore_game(game :GameContext, data :dict, create_player) ->None:
+    """Restores the snapshot into the (new) game without sending any messages.
+    create_player(entry) returns the player of the snapshot entry, or None if it is gone."""
+    if data["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unknown snapshot version {data['version']} of game {data['name']}")
+    for entry in data["players"]:
+        player = create_player(entry)
+        if player is None:
+            logger.warning("Game %s: player %s could not be restored", game.name, entry["name"])
+            continue
+        player.is_dead = entry["is_dead"]
+        player.seer_asked_werewolf = entry["seer_asked_werewolf"]
+        game.add_player(player)
+        if not entry["card"] is None:
+            game.assign_card(player, CARD_TYPES[entry["card"]]())
+    for entry in data["players"]:
+        player = game.players.get(entry["name"])
+        if not player is None:
+            player.night_vote = game.players.get(entry["night_vote"])
+            player.day_vote = game.players.get(entry["day_vote"])
+
+    game.__state__ = STATES[data["state"]]()
+    game.tally = VoteTally(game.players[name] for name in data["electorate"]
+                           if name in game.players)
+    for voter_name, victim_name in data["votes"]:
+        if voter_name in game.players and victim_name in game.players:
+            game.tally.vote(game.players[voter_name], game.players[victim_name])
+    if isinstance(game.__state__, (NightState, DayState)):
+        game.__state__.start_deadline(game)
+
+
+async def restore_snapshots(snapshots :list[dict], game_of, member_of, werewolves_channel_of,
+                            plaier) ->list[AIAgentPlayer]:
+    """Restores the games of the snapshots and starts their AI-agent players, returns them.
+    game_of(data) is the game to restore into (None skips the snapshot),
+    member_of(entry) the guild member of a human player (None if gone),
+    werewolves_channel_of(game, id) the werewolves channel and plaier the bot of the
+    AI-agent players (None drops them)."""
+    ai_players = []
+
+    def create_player(game :GameContext, entry :dict) ->Player:
+        if "member_id" in entry:
+            member = member_of(entry)
+            return None if member is None else HumanPlayer(member)
+        if "agent" in entry and not plaier is None:
+            player = AIAgentPlayer(entry["name"], game, plaier)
+            player.agent.context.restore(entry["agent"])
+            ai_players.append(player)
+            return player
+        return None
+
+    for data in snapshots:
+        game = game_of(data)
+        if game is None:
+            continue
+        restore_game(game, data, lambda entry, game=game: create_player(game, entry))
+        if not data["werewolves_channel_id"] is None:
+            game.werewolves_channel = werewolves_channel_of(game, data["werewolves_channel_id"])
+        game.changed()
+    for player in ai_players:
+        await player.start()
+    return ai_players
@@ -7,6 +7,8 @@ from model.command import QuitCommand, VoteCommand
 from model.player import Player
 from logic.context import Context
 from logic.state import State
+from logic.timerwheel import timer_wheel, Timer
+from service.tracing import span
 
 
 # Set up logging
@@ -14,9 +16,32 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name
 logger = logging.getLogger(__name__)
 
 
-
 class GameState(State):
     """Base state class"""
+    def __init__(self) ->None:
+        self.deadline :Timer = None
+
+
+    def start_deadline(self, game :Context) ->None:
+        """Resolves the phase automatically after PHASE_TIMEOUT seconds (0 disables it)"""
+        if game.phase_timeout > 0:
+            self.deadline = timer_wheel.schedule(game.phase_timeout, self.__on_deadline__, game)
+
+
+    async def __on_deadline__(self, game :Context) ->None:
+        self.deadline = None
+        if game.__state__ is self:
+            await game.handle_phase_deadline()
+
+
+    async def handle_deadline(self, game :Context) ->None:
+        """Called when the phase took longer than PHASE_TIMEOUT"""
+
+
+    async def on_leave(self, game, next_state) ->None:
+        if not self.deadline is None:
+            self.deadline.cancel()
+            self.deadline = None
 
 
     async def send_cmd_not_supported(self, game, cmd) ->None:
@@ -27,23 +52,23 @@ class GameState(State):
     async def handle_quit(self, game :Context, command :QuitCommand) ->None:
         """Handles the quit command during a running game"""
         logger.info("%s quits the game %s through suicide.", command.author, game.name)
-        if command.author.display_name in game.players:
-            del game.players[command.author.display_name]
+        game.remove_player(command.author.display_name)
         await game.send_msg( f"{command.author.display_name} quits the game through suicide." )
         await game.handle_game_over()
 
 
     async def check_vote_valid(self, game :Context, command :VoteCommand) ->(Player, Player):
         """Checks if the vote-command is valid/allowed in the current game state"""
-        # Check if the player is allowed to vote
-        player = game.players[command.voter_name]
-        if player.is_dead:
-            await game.send_msg( "Only alive players are allowed to vote!" )
-            return (None, None)
-        # Check if the victim is existing
-        victim = game.find_player_by_name(command.player_name)
-        if victim is None or victim.is_dead:
-            await game.send_msg(
-                f"{command.player_name} was not found in the list of alive players!" )
-            return (None, None)
-        return (player, victim)
+        with span("check_vote_valid"):
+            # Check if the player is allowed to vote
+            player = game.players[command.voter_name]
+            if player.is_dead:
+                await game.send_msg( "Only alive players are allowed to vote!" )
+                return (None, None)
+            # Check if the victim is existing
+            victim = game.find_player_by_name(command.player_name)
+            if victim is None or victim.is_dead:
+                await game.send_msg(
+                    f"{command.player_name} was not found in the list of alive players!" )
+                return (None, None)
+            return (player, victim)
@@ -0,0 +1,57 @@
+"""
+State-Machine implementation without Discord, the messages are kept in memory
+"""
+import random
+import logging
+
+from logic.gamecontext import GameContext
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class HeadlessChannel:
+    """An in-memory channel, records the messages sent to it"""
+    def __init__(self, name :str, channel_id :int = 0) ->None:
+        self.name = name
+        self.id = channel_id
+        self.messages :list[str] = []
+
+    async def send(self, msg :str) ->None:
+        """Records the message"""
+        self.messages.append(msg)
+
+
+class HeadlessContext(GameContext):
+    """The game that holds the state, played without network (simulations, benchmarks)"""
+    def __init__(self, name :str = "headless", seed :int = None) ->None:
+        super().__init__(name)
+        self.channel = HeadlessChannel(name)
+        self.werewolves_channel :HeadlessChannel = None
+        self.rng = random.Random(seed)
+        self.phase_timeout = 0      # the runner decides the phases, no timers
+
+
+    async def send_msg(self, msg :str, key :str = None) ->None:
+        """Sends a message in the channel of the game"""
+        await self.channel.send(msg)
+
+    async def send_werewolves(self, msg :str, key :str = None) ->None:
+        """Sends a message int the secret channel of the werewolves"""
+        if not self.werewolves_channel is None:
+            await self.werewolves_channel.send(msg)
+        else:
+            logger.error("No werewolves channel exist! Send '%s' failed!", msg)
+
+
+    async def create_werewolves_channel(self) ->None:
+        """Creates the secret channel of the werewolves (if not existing yet)"""
+        if self.werewolves_channel is None:
+            self.werewolves_channel = HeadlessChannel("WerewolvesOnly_" + self.name, 1)
+
+    async def delete_werewolves_channel(self) ->None:
+        """Deletes the secret channel of the werewolves (if existing)"""
+        self.werewolves_channel = None
@@ -41,15 +41,30 @@ class NightState(GameState):
     async def handle_werewolf_vote(self, game :Context, player :Player, victim :Player) ->None:
         """Handles the Werewolves vote process"""
         player.night_vote = victim
+        game.record_vote(player, victim)
 
         # Check if the vote is already ended
         if not await self.check_current_votes(game, victim):
             return
 
-        # We found a victim
+        await self.kill_victim(game, victim)
+
+    async def handle_deadline(self, game :Context) ->None:
+        """Time is up: the player with the most werewolf votes is the victim"""
+        victim = game.tally.leader()
+        if victim is None:
+            await game.send_werewolves("Time is up, but you could not agree on a victim.\n"
+                                       "Use **!vote** command to update your decision.")
+            self.start_deadline(game)
+            return
+        await game.send_werewolves(f"Time is up! {victim.name} got the most votes.")
+        await self.kill_victim(game, victim)
+
+    async def kill_victim(self, game :Context, victim :Player) ->None:
+        """The werewolves found a victim"""
         result = f"{victim.name} is killed by the Werewolves!\n"
         result += f"{victim.name} was a {victim.card.name}."
-        victim.is_dead = True
+        game.kill_player(victim)
         await game.send_msg(result)
 
         if not await game.handle_game_over():
@@ -57,24 +72,17 @@ class NightState(GameState):
 
     async def check_current_votes(self, game :Context, victim :Player) ->bool:
         """Show and check if the vote is already ended"""
-        votes = "The current votes are:\n"
-        non_votes = "These players still need to vote:\n"
-        vote_valid = True
-        for plr in game.players.values():
-            if not plr.is_dead and isinstance(plr.card, WerewolfCard):
-                if not plr.night_vote is None:
-                    votes += f"- {plr.name} votes for {plr.night_vote.name}\n"
-                    if plr.night_vote != victim:
-                        vote_valid = False
-                else:
-                    non_votes += f"- {plr.name}\n"
+        # valid if all votes cast so far are for the victim
+        vote_valid = game.tally.all_votes_for(victim)
         if not vote_valid:
+            (votes, non_votes) = game.tally.status_text()
             await game.send_werewolves(
                 "All Werewolves must agree on one victim.\n"
                 + votes +
                 "Vote is not finished yet.\n"
                 + non_votes +
-                "Use **!vote** command to update your decision."
+                "Use **!vote** command to update your decision.",
+                key="votes"
             )
         return vote_valid
 
@@ -91,9 +99,10 @@ class NightState(GameState):
 
 
     async def on_enter(self, game: Context, prev_state) ->None:
-        for player in game.players.values():
-            player.clear_votes()
+        game.start_voting(player for player in game.players.values()
+                          if isinstance(player.card, WerewolfCard))
         await game.send_msg(
             "It's been a long day and now night is falling. "
             "The villagers are asleep and the werewolves are becoming active."
         )
+        self.start_deadline(game)
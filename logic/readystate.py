@@ -2,10 +2,12 @@
 The ReadyState implementation for the State-Machine in the game play
 """
 import logging
-import random
 
 from logic.context import Context
+from logic.conversationlog import ConversationLog
+from logic.broadcastbus import BroadcastBus
 from logic.gamestate import GameState
+from agents.request_scheduler import shared_request_scheduler
 from model.command import StatusCommand, QuitCommand, JoinCommand, StartCommand
 from model.humanplayer import HumanPlayer
 from model.aiagentplayer import AIAgentPlayer
@@ -34,13 +36,12 @@ class ReadyState(GameState):
     async def handle_join(self, game: Context, command :JoinCommand) ->None:
         # Add an human player
         logger.info("%s joins the game %s", command.author, game.name)
-        game.players[command.get_player_name()] = HumanPlayer(command.author)
+        game.add_player(HumanPlayer(command.author))
         await game.send_msg( f"{command.get_player_name()} joined the game." )
 
     async def handle_quit(self, game: Context, command :QuitCommand) ->None:
         logger.info("%s quits the game %s", command.author, game.name)
-        if command.author.display_name in game.players:
-            del game.players[command.author.display_name]
+        game.remove_player(command.author.display_name)
         await game.send_msg( f"{command.author.display_name} quits the game." )
 
     async def handle_start(self, game: Context, command: StartCommand) ->None:
@@ -50,7 +51,7 @@ class ReadyState(GameState):
             return
 
         # Shuffle and assign cards
-        cards = create_cards(len(game.players))
+        cards = create_cards(len(game.players), game.card_table)
         result = "Game started\nThe following cards are in the game:\n"
         for card in cards:
             result += f"- **{card.name}**: {card.desc}\n"
@@ -59,35 +60,36 @@ class ReadyState(GameState):
         logger.info(result)
         await game.send_msg( result )
 
-        random.shuffle(cards)
+        game.rng.shuffle(cards)
         for player in game.players.values():
             card = cards.pop()
             logger.info( "%s gets card %s", player.name, card )
-            player.card = card
-            await player.send_dm(
-                f"You got the card **{card.name}** in game **{game.name}**.\n"
-                f"{card.desc}")
+            game.assign_card(player, card)
 
         # Tell all the Werewolves who they are
         werewolves = []
         for player in game.players.values():
             if isinstance(player.card, WerewolfCard):
                 werewolves.append(player)
-        if game.werewolves_channel is None:
-            game.werewolves_channel = await game.guild.create_text_channel(
-                "WerewolvesOnly_" + game.channel.name
-            )
+        await game.create_werewolves_channel()
         werewolves_str = "The werewolves team is:\n"
         for werewolf in werewolves:
             werewolves_str += f"- **{werewolf.name}**\n"
         logger.info(werewolves_str)
-        for player in werewolves:
-            await player.send_dm( werewolves_str +
-                (f"The werewolves team is {werewolves_str},\n"
-                f" secretly talk to them in {game.werewolves_channel.name}!\n"
-                "You need to vote for a villager to be eaten.\n"
-                "Tell me your decision using the **!vote** command.")
-            )
+
+        # One direct message per player (card and team), sent to all players at once
+        messages = []
+        for player in game.players.values():
+            msg = f"You got the card **{player.card.name}** in game **{game.name}**.\n" \
+                  f"{player.card.desc}"
+            if player in werewolves:
+                msg += "\n" + werewolves_str + \
+                    (f"The werewolves team is {werewolves_str},\n"
+                    f" secretly talk to them in {game.werewolves_channel.name}!\n"
+                    "You need to vote for a villager to be eaten.\n"
+                    "Tell me your decision using the **!vote** command.")
+            messages.append( (player, msg) )
+        await game.send_dms(messages)
         await game.send_werewolves(
             f"This is the channel for Werewolves in {game.name} only - **PLEASE DON't CHEAT!**\n")
         await game.send_werewolves(
@@ -101,11 +103,13 @@ class ReadyState(GameState):
     async def on_enter(self, game: Context, prev_state) ->None:
         await game.send_msg("This GAME is over!\n\n")
         while len(game.players)>0:
-            _, player = game.players.popitem()
+            player = game.remove_player(next(iter(game.players)))
             if isinstance(player, AIAgentPlayer ):
                 player.stop()
             del player
-        if not game.werewolves_channel is None:
-            await game.werewolves_channel.delete()
-            game.werewolves_channel = None
+        shared_request_scheduler().unregister(game.name)
+        game.bus.close()
+        game.conversation = ConversationLog()
+        game.bus = BroadcastBus(game.conversation)
+        await game.delete_werewolves_channel()
         await self.handle_status(game, StatusCommand(None, None))
@@ -5,6 +5,7 @@ import logging
 
 from model.command import GameCommand
 from model.command import StatusCommand, JoinCommand, QuitCommand, StartCommand, VoteCommand
+from service.tracing import span
 
 
 # Set up logging
@@ -18,18 +19,19 @@ class State:
 
     async def handle(self, game, command :GameCommand) ->None:
         """Forwards the command to the corresponding command-handler"""
-        if isinstance(command, StatusCommand):
-            await self.handle_status(game, command)
-        elif isinstance(command, JoinCommand):
-            await self.handle_join(game, command)
-        elif isinstance(command, QuitCommand):
-            await self.handle_quit(game, command)
-        elif isinstance(command, StartCommand):
-            await self.handle_start(game, command)
-        elif isinstance(command, VoteCommand):
-            await self.handle_vote(game, command)
-        else:
-            raise NotImplementedError
+        with span(f"{type(self).__name__}.handle"):
+            if isinstance(command, StatusCommand):
+                await self.handle_status(game, command)
+            elif isinstance(command, JoinCommand):
+                await self.handle_join(game, command)
+            elif isinstance(command, QuitCommand):
+                await self.handle_quit(game, command)
+            elif isinstance(command, StartCommand):
+                await self.handle_start(game, command)
+            elif isinstance(command, VoteCommand):
+                await self.handle_vote(game, command)
+            else:
+                raise NotImplementedError
 
 
     async def handle_status(self, game, command :StatusCommand) ->None:
@@ -0,0 +1,123 @@
+"""
+One timer wheel for all reminders and phase deadlines of the bot process
+"""
+import time
+import asyncio
+import logging
+
+from service.tasks import TaskSet
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class Timer:
+    """A scheduled callback, returned by TimerWheel.schedule()"""
+    def __init__(self, wheel, callback, args :tuple, interval :float) ->None:
+        self.wheel = wheel
+        self.callback = callback
+        self.args = args
+        self.interval = interval    # seconds between repetitions, None fires once
+        self.rounds = 0             # full turns of the wheel left before firing
+        self.slot = -1
+        self.cancelled = False
+
+    def cancel(self) ->None:
+        """Cancels the timer (and its repetitions), O(1)"""
+        self.cancelled = True
+        self.wheel.remove(self)
+
+
+class TimerWheel:
+    """Hashed timer wheel: scheduling and cancelling are O(1),
+    one task wakes up once per tick while timers are pending."""
+    def __init__(self, tick :float = 1.0, slots :int = 512) ->None:
+        self.tick = tick
+        self.slots :list[dict[int, Timer]] = [{} for _ in range(slots)]
+        self.pending = 0
+        self.__position__ = 0
+        self.__task__ :asyncio.Task = None
+        self.__wakeup__ :asyncio.Event = None
+        self.__tasks__ = TaskSet("TimerWheel")     # the running coroutine callbacks
+
+
+    def __len__(self) ->int:
+        return self.pending
+
+
+    def schedule(self, delay :float, callback, *args) ->Timer:
+        """Calls callback(*args) after delay seconds, coroutines are run as a task"""
+        timer = Timer(self, callback, args, None)
+        self.__insert__(timer, delay)
+        return timer
+
+    def schedule_repeating(self, interval :float, callback, *args) ->Timer:
+        """Calls callback(*args) every interval seconds until the timer is cancelled"""
+        timer = Timer(self, callback, args, interval)
+        self.__insert__(timer, interval)
+        return timer
+
+    def remove(self, timer :Timer) ->None:
+        """Removes the timer from its slot"""
+        if timer.slot >= 0 and not self.slots[timer.slot].pop(id(timer), None) is None:
+            self.pending -= 1
+        timer.slot = -1
+
+
+    def close(self) ->None:
+        """Stops the wheel and cancels the running coroutine callbacks, on shutdown"""
+        if not self.__task__ is None:
+            self.__task__.cancel()
+            self.__task__ = None
+        self.__tasks__.cancel()
+
+
+    def __insert__(self, timer :Timer, delay :float) ->None:
+        ticks = max(1, round(delay / self.tick))
+        timer.rounds = (ticks - 1) // len(self.slots)
+        timer.slot = (self.__position__ + ticks) % len(self.slots)
+        self.slots[timer.slot][id(timer)] = timer
+        self.pending += 1
+        if self.__task__ is None or self.__task__.done():
+            self.__wakeup__ = asyncio.Event()
+            self.__task__ = asyncio.create_task(self.__run__())
+        elif not self.__wakeup__.is_set():
+            self.__wakeup__.set()
+
+
+    async def __run__(self) ->None:
+        next_tick = time.monotonic() + self.tick
+        while True:
+            if self.pending == 0:
+                # idle: no wakeups until the next timer is scheduled
+                self.__wakeup__.clear()
+                await self.__wakeup__.wait()
+                next_tick = time.monotonic() + self.tick
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick += self.tick
+            self.__position__ = (self.__position__ + 1) % len(self.slots)
+            self.__advance__()
+
+    def __advance__(self) ->None:
+        slot = self.slots[self.__position__]
+        expired = [timer for timer in slot.values() if timer.rounds == 0]
+        for timer in slot.values():
+            timer.rounds -= 1
+        for timer in expired:
+            self.remove(timer)
+            if not timer.interval is None:
+                self.__insert__(timer, timer.interval)
+            try:
+                result = timer.callback(*timer.args)
+                if asyncio.iscoroutine(result):
+                    self.__tasks__.spawn(result)
+            except Exception:   # pylint: disable=broad-exception-caught
+                logger.exception("Timer callback %s failed", timer.callback)
+
+
+
+# the timer wheel of the bot process
+timer_wheel = TimerWheel()
@@ -0,0 +1,133 @@
+"""
+Incremental vote counting of a game phase
+"""
+import time
+import random
+import logging
+
+from model.player import Player
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class VoteTally:
+    """The votes of one phase. Casting or changing a vote is O(1),
+    the status text is only rendered when asked for."""
+    def __init__(self, electorate) ->None:
+        self.electorate :list[Player] = list(electorate)
+        self.votes :dict[Player, Player] = {}
+        self.counts :dict[Player, int] = {}
+        # candidates by number of votes, to keep track of the leader
+        self.__by_count__ :dict[int, set[Player]] = {}
+        self.__max_count__ = 0
+        self.__members__ = set(self.electorate)
+
+
+    @property
+    def pending(self) ->list[Player]:
+        """The voters who still need to vote"""
+        return [voter for voter in self.electorate if not voter in self.votes]
+
+
+    def vote(self, voter :Player, candidate :Player) ->None:
+        """Casts or changes the voter's vote"""
+        previous = self.votes.get(voter)
+        if previous is candidate:
+            return
+        if not previous is None:
+            self.__move__(previous, -1)
+        self.votes[voter] = candidate
+        self.__move__(candidate, +1)
+
+
+    def remove_voter(self, voter :Player) ->None:
+        """The voter died or left: the vote and the votes for the voter are dropped"""
+        if voter in self.__members__:
+            self.__members__.discard(voter)
+            self.electorate.remove(voter)
+        previous = self.votes.pop(voter, None)
+        if not previous is None:
+            self.__move__(previous, -1)
+        for other in [other for other, candidate in self.votes.items() if candidate is voter]:
+            del self.votes[other]
+            self.__move__(voter, -1)
+
+
+    def leader(self) ->Player:
+        """The candidate with the most votes, None if there is none or a tie"""
+        if self.__max_count__ == 0 or len(self.__by_count__[self.__max_count__]) != 1:
+            return None
+        return next(iter(self.__by_count__[self.__max_count__]))
+
+
+    def majority(self) ->Player:
+        """The candidate with more than half of the votes of the electorate, or None"""
+        if self.__max_count__ * 2 > len(self.electorate):
+            return self.leader()
+        return None
+
+
+    def unanimous(self) ->Player:
+        """The candidate if all votes cast so far are for the same candidate, or None"""
+        if len(self.counts) == 1:
+            return next(iter(self.counts))
+        return None
+
+    def all_votes_for(self, candidate :Player) ->bool:
+        """True if all votes cast so far are for the candidate (also if none was cast),
+        None as candidate is only valid as long as nobody voted"""
+        return len(self.votes) == 0 or (len(self.counts) == 1 and candidate in self.counts)
+
+
+    def status_text(self) ->tuple[str, str]:
+        """Renders the current votes and the voters who still need to vote"""
+        votes = "The current votes are:\n"
+        non_votes = "These players still need to vote:\n"
+        for voter in self.electorate:
+            candidate = self.votes.get(voter)
+            if not candidate is None:
+                votes += f"- {voter.name} votes for {candidate.name}\n"
+            else:
+                non_votes += f"- {voter.name}\n"
+        return votes, non_votes
+
+
+    def __move__(self, candidate :Player, delta :int) ->None:
+        count = self.counts.get(candidate, 0)
+        if count > 0:
+            self.__by_count__[count].discard(candidate)
+        count += delta
+        if count > 0:
+            self.counts[candidate] = count
+            self.__by_count__.setdefault(count, set()).add(candidate)
+        else:
+            del self.counts[candidate]
+        if count > self.__max_count__:
+            self.__max_count__ = count
+        while self.__max_count__ > 0 and not self.__by_count__.get(self.__max_count__):
+            self.__max_count__ -= 1
+
+
+
+# Usage
+def main(seed :int = 42) ->None:
+    """Benchmarks casting a vote and finding the leader on a large table
+    (tests/test_votetally.py checks the tally against the former logic)"""
+    rng = random.Random(seed)
+    players = [Player(f"Player{nr}") for nr in range(1000)]
+    votes = [(rng.choice(players), rng.choice(players)) for _ in range(1000)]
+    tally = VoteTally(players)
+    start = time.perf_counter()
+    for voter, candidate in votes:
+        tally.vote(voter, candidate)
+        tally.majority()
+    incremental = time.perf_counter() - start
+    print(f"1000 votes on a 1k-player table: VoteTally {incremental*1e6/1000:.2f}us/vote")
+
+
+if __name__ == "__main__":
+    main()
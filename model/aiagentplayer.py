@@ -1,14 +1,23 @@
 """
 Representing a player in a Werewolve game
 """
+import os
+import time
 import asyncio
 import logging
+from dotenv import load_dotenv
 
-from agents.openai_agent import OpenAIAgent
+from agents.agent_factory import create_agent
+from agents.context_window import OTHER_PLAYERS_QUESTION
+from agents.response_cache import shared_response_cache
+from agents.request_scheduler import shared_request_scheduler, VOTE, REPLY, CHATTER
 
 from model.player import Player
 from model.command import VoteCommand
-from logic.context import Context
+from model.card import WEREWOLVES
+from logic.context import Context, team_of
+from logic.timerwheel import timer_wheel, Timer
+from service.metrics import metrics
 
 
 # Set up logging
@@ -16,22 +25,43 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name
 logger = logging.getLogger(__name__)
 
 
+# Load configuration
+load_dotenv()
+
+
+queue_depth = metrics.gauge("werewolves_ai_message_queue_depth",
+    "Messages waiting in the queues of all AI-agent players")
+vote_results = metrics.counter("werewolves_ai_votes_total",
+    "Vote decisions of the AI agents: exact option, resolved by name or invalid")
+
+
 
 class AIAgentPlayer(Player):
     """Representing a AI-agent player"""
     def __init__(self, name :str, game :Context, bot) ->None:
         super().__init__(name)
         self.message_queue = asyncio.Queue()
-        self.agent = OpenAIAgent()
+        self.agent = create_agent(shared_response_cache())
+        self.agent.scheduler = shared_request_scheduler()
+        self.agent.owner = game.name
         self.bot = bot
         self.game = game
+        # post the answers while they are generated (the bot must be able to edit its messages)
+        self.streaming = os.getenv('AI_STREAMING', "0") == "1" \
+            and getattr(bot, "can_edit_messages", True)
+        self.edit_interval = float(os.getenv('AI_STREAM_EDIT_INTERVAL', "1.0"))
         logger.info("Created AIAgentPlayer with name %s", self.name)
 
+        # the current collaboration is the range [start, end) of the game's conversation log
         self.__current_channel_id__ = -1
-        self.__current_messages__ : str = ""
+        self.__current_messages__ : tuple[int, int] = (0, 0)
+        self.__subscription__ = game.bus.subscribe(self.notify_conversation)
+        self.__conversation_notified__ = False
 
         self.__tasks__ = None
+        self.__reminder__ :Timer = None
         self.__stopped__ = False
+        self.__voting__ = False
 
     def __del__(self) ->None:
         self.stop()
@@ -41,13 +71,15 @@ class AIAgentPlayer(Player):
     async def send_dm(self, msg :str) ->None:
         """Sends a direct message to the player"""
         logger.info("Sent DM '%s' to AIPlayer %s", msg, self.name)
-        self.agent.advice( msg, None )
+        # the DMs hold the card and the seer's answers, they must not be cut from the context
+        self.agent.advice( msg, None, pinned=True )
 
     async def __worker_task__(self):
         try:
             while not self.__stopped__:
                 # Get message from the queue and process it
                 (channel_id, author_name, message) = await self.message_queue.get()
+                queue_depth.dec()
                 logger.debug("Worker processing: channel_id=%d %s:%s",
                              channel_id, author_name, message)
 
@@ -55,110 +87,205 @@ class AIAgentPlayer(Player):
                     if message == "!quit":
                         self.__stopped__ = True
                         break
-                    await self.bot.get_channel(channel_id).send(
-                        f"**{self.name}**: {await self.agent.ask_async(message)}")
+                    await self.__answer__(channel_id, message, priority=REPLY)
                 elif author_name == "$$TimerTask$$":
-                    if not self.__current_channel_id__ == -1:
-                        await self.__send___current_messages____()
-                    if not self.is_dead:
-                        if self.game.is_werewolf_vote_needed(self):
-                            await self.__check_werewolf_vote__()
-                        if self.game.is_villager_vote_needed(self):
-                            await self.__check_villager_vote__()
-                        if self.game.is_seer_vote_needed(self):
-                            await self.__check_seer_vote__()
-                else:
-                    if self.__current_channel_id__ == -1:
-                        # It's a new message
-                        self.__current_channel_id__ = channel_id
-                        self.__current_messages__ = f"{author_name}: {message}\n"
-                    elif self.__current_channel_id__ == channel_id:
-                        # It adds to the current collaboration
-                        self.__current_messages__ += f"{author_name}: {message}\n"
-                    else:
-                        # The collaboration moves to a different channel
-                        # --> send current collab to agent now
-                        await self.__send___current_messages____()
-                        self.__current_channel_id__ = channel_id
-                        self.__current_messages__ = f"{author_name}: {message}\n"
+                    await self.__handle_timer__()
+                elif author_name == "$$Conversation$$":
+                    await self.__read_conversation__()
         except asyncio.CancelledError:
             logger.warning("WorkerTask of %s cancelled!", self.name)
 
+    async def __handle_timer__(self) ->None:
+        if not self.__current_channel_id__ == -1:
+            await self.__send___current_messages____()
+        if not self.is_dead:
+            self.game.vote_batcher.submit(self)
+
+    async def decide_votes(self) ->None:
+        """Asks the agent for the vote decisions needed in the current phase"""
+        if self.is_dead or self.__voting__:
+            return
+        self.__voting__ = True
+        try:
+            if self.game.is_werewolf_vote_needed(self):
+                await self.__check_werewolf_vote__()
+            if self.game.is_villager_vote_needed(self):
+                await self.__check_villager_vote__()
+            if self.game.is_seer_vote_needed(self):
+                await self.__check_seer_vote__()
+        finally:
+            self.__voting__ = False
+
+    async def __read_conversation__(self) ->None:
+        """Reads the unread messages of the game's conversation log"""
+        self.__conversation_notified__ = False
+        conversation = self.game.conversation
+        (start, end) = self.__subscription__.fetch()
+        for position in range(start, end):
+            channel_id = conversation.channel_of(position)
+            if self.__current_channel_id__ == -1:
+                # It's a new message
+                self.__current_channel_id__ = channel_id
+                self.__current_messages__ = (position, position+1)
+            elif self.__current_channel_id__ == channel_id:
+                # It adds to the current collaboration
+                self.__current_messages__ = (self.__current_messages__[0], position+1)
+            else:
+                # The collaboration moves to a different channel
+                # --> send current collab to agent now
+                await self.__send___current_messages____()
+                self.__current_channel_id__ = channel_id
+                self.__current_messages__ = (position, position+1)
+
     async def __send___current_messages____(self) ->None:
-        if self.__current_channel_id__ > -1 and len(self.__current_messages__)>0:
-            logger.info("Send to LLM: %s", self.__current_messages__)
+        (start, end) = self.__current_messages__
+        if self.__current_channel_id__ > -1 and end > start:
+            current_messages = self.game.conversation.render(start, end)
+            logger.info("Send to LLM: %s", current_messages)
             self.agent.advice(
-                "What did the other players say lately?",
-                self.__current_messages__
+                OTHER_PLAYERS_QUESTION,
+                current_messages
             )
-            self.__current_messages__ = ""
+            self.__current_messages__ = (end, end)
             prompt = "Take part of the recent conversation or give answer."
-            await self.bot.get_channel(self.__current_channel_id__).send(
-                f"**{self.name}**: {await self.agent.ask_async(prompt)}")
+            await self.__answer__(self.__current_channel_id__, prompt,
+                                  use_cache=False, priority=CHATTER)
             self.__current_channel_id__ = -1
 
+    async def __ask__(self, prompt :str, use_cache :bool = True, priority :int = CHATTER) ->str:
+        """Awaits the agent's answer, returns None if the call timed out or failed"""
+        try:
+            return await self.agent.ask_async(prompt, use_cache=use_cache, priority=priority)
+        except asyncio.TimeoutError:
+            logger.warning("AIAgentPlayer %s: no answer within %ss for '%s'",
+                           self.name, self.agent.timeout, prompt)
+        except self.agent.ERRORS as error:
+            logger.error("AIAgentPlayer %s: agent call failed: %s", self.name, error)
+        return None
+
+    async def __answer__(self, channel_id :int, prompt :str, use_cache :bool = True,
+                         priority :int = CHATTER) ->None:
+        """Asks the agent and posts the answer into the channel"""
+        if not self.streaming:
+            answer = await self.__ask__(prompt, use_cache=use_cache, priority=priority)
+            if not answer is None:
+                await self.bot.get_channel(channel_id).send(f"**{self.name}**: {answer}")
+            return
+
+        # post the first chunk, then edit the message at most every edit_interval seconds
+        channel = self.bot.get_channel(channel_id)
+        started = time.perf_counter()
+        first_visible = 0.0
+        message = None
+        (text, shown, last_edit) = ("", "", 0.0)
+        try:
+            async for chunk in self.agent.ask_stream(prompt, use_cache=use_cache,
+                                                     priority=priority):
+                text += chunk
+                now = time.perf_counter()
+                if message is None:
+                    message = await channel.send(f"**{self.name}**: {text}")
+                    first_visible = time.perf_counter() - started
+                    (shown, last_edit) = (text, now)
+                elif now - last_edit >= self.edit_interval:
+                    await message.edit(content=f"**{self.name}**: {text}")
+                    (shown, last_edit) = (text, now)
+        except asyncio.TimeoutError:
+            logger.warning("AIAgentPlayer %s: answer stalled for %ss for '%s'",
+                           self.name, self.agent.timeout, prompt)
+        except self.agent.ERRORS as error:
+            logger.error("AIAgentPlayer %s: agent call failed: %s", self.name, error)
+        if not message is None and shown != text:
+            await message.edit(content=f"**{self.name}**: {text}")
+        logger.info("AIAgentPlayer %s: first token visible after %.2fs (LLM %.2fs), "
+                    "complete after %.2fs", self.name, first_visible,
+                    self.agent.first_chunk_time, time.perf_counter() - started)
+
     async def __check_werewolf_vote__(self) ->None:
-        vote = await self.agent.ask_async(
+        await self.__vote__(
             "As a werewolf you need to vote for a victim together with the other werewolves."
-            "Decide for a victim and answer this time with just one word - the player name!"
-            )
-        vote = self.__fix_ai_vote__(vote)
-        logger.info("AIAgentPlayer %s (a werewolf) sent the following vote decision:'%s'",
-                    self.name, vote)
-        if vote in self.game.players:
-            await self.game.handle( VoteCommand(self.bot.user, self.name, vote))
+            "Decide for a victim!",
+            [player for player in self.game.players.values()
+             if not player.is_dead and team_of(player) != WEREWOLVES],
+            self.game.is_werewolf_vote_needed, "(a werewolf) ")
 
     async def __check_villager_vote__(self) ->None:
-        vote = await self.agent.ask_async(
+        await self.__vote__(
             "You need to vote for a victim together with the others."
-            "Decide for a victim and answer this time with just one word - the player name!"
-            )
-        vote = self.__fix_ai_vote__(vote)
-        logger.info("AIAgentPlayer %s sent the following vote decision:'%s'",
-                    self.name, vote)
-        if vote in self.game.players:
-            await self.game.handle( VoteCommand(self.bot.user, self.name, vote))
+            "Decide for a victim!",
+            [player for player in self.game.players.values()
+             if not player.is_dead and not player is self],
+            self.game.is_villager_vote_needed, "")
 
     async def __check_seer_vote__(self) ->None:
-        vote = await self.agent.ask_async(
+        await self.__vote__(
             "As the seer you are allowed to ask if one player is a werewolf."
-            "Decide for a player and answer this time with just one word - the player name!"
-            )
-        logger.info("AIAgentPlayer %s (a seer) sent the following vote decision:'%s'",
-                    self.name, vote)
-        vote = self.__fix_ai_vote__(vote)
-        if vote in self.game.players:
-            await self.game.handle( VoteCommand(self.bot.user, self.name, vote))
-
-    def __fix_ai_vote__(self, vote:str) ->str:
-        vote = vote.strip()
-        if vote.endswith('.') or vote.endswith('!'):
-            vote = vote[:-1]
-        return vote
-
-    async def __timer_task__(self):
+            "Decide for a player!",
+            [player for player in self.game.players.values()
+             if not player.is_dead and not player is self],
+            self.game.is_seer_vote_needed, "(a seer) ")
+
+    async def __vote__(self, prompt :str, candidates :list[Player], still_needed,
+                       role :str) ->None:
+        """Asks the agent to choose one of the candidates, votes for the resolved player"""
+        if len(candidates) == 0:
+            return
+        options = [player.name for player in candidates]
+        answer = await self.__choose__(f"{prompt} Choose one of: {', '.join(options)}", options)
+        victim = self.game.resolve_player_name(answer, candidates)
+        vote_results.inc(result="invalid" if victim is None
+                         else "exact" if answer == victim.name else "resolved")
+        logger.info("AIAgentPlayer %s %ssent the following vote decision:'%s' (%s)",
+                    self.name, role, answer, None if victim is None else victim.name)
+        # the phase may have changed while the agent was thinking
+        if not victim is None and still_needed(self):
+            await self.game.handle( VoteCommand(self.bot.user, self.name, victim.name))
+
+    async def __choose__(self, prompt :str, options :list[str]) ->str:
+        """Awaits the agent's choice, returns None if the call timed out or failed"""
         try:
-            while not self.__stopped__:
-                await asyncio.sleep(60)   # produce a reminder every minute
-                await self.message_queue.put( (-1, "$$TimerTask$$", "SendCurrentMessages") )
-        except asyncio.CancelledError:
-            logger.warning("TimerTask cancelled")
+            return await self.agent.ask_choice_async(prompt, options, priority=VOTE)
+        except asyncio.TimeoutError:
+            logger.warning("AIAgentPlayer %s: no choice within %ss for '%s'",
+                           self.name, self.agent.timeout, prompt)
+        except self.agent.ERRORS as error:
+            logger.error("AIAgentPlayer %s: agent call failed: %s", self.name, error)
+        return None
+
+    def __remind__(self) ->None:
+        """Called by the timer wheel every minute"""
+        self.message_queue.put_nowait( (-1, "$$TimerTask$$", "SendCurrentMessages") )
+        queue_depth.inc()
 
 
     async def start(self) ->None:
-        """Start the worker thread"""
+        """Start the worker tasks, returns immediately"""
         self.__stopped__ = False
-        self.__tasks__ = await asyncio.gather(self.__timer_task__(), self.__worker_task__())
+        self.game.vote_batcher.register(self)
+        # produce a reminder every minute
+        self.__reminder__ = timer_wheel.schedule_repeating(60, self.__remind__)
+        self.__tasks__ = [
+            asyncio.create_task(self.__worker_task__())
+        ]
 
 
-    async def stop(self) ->None:
-        """Stop the worker threads"""
+    def stop(self) ->None:
+        """Stop the worker tasks, cancels a pending agent call"""
         self.__stopped__ = True
-        await self.add_message(-1, "ModeratorBot", "!quit")
+        queue_depth.dec(self.message_queue.qsize())
+        while not self.message_queue.empty():
+            self.message_queue.get_nowait()
+        self.game.vote_batcher.unregister(self)
+        self.__subscription__.close()
+        if not self.__reminder__ is None:
+            self.__reminder__.cancel()
+            self.__reminder__ = None
+        if self.__tasks__ is None:
+            return
         for task in self.__tasks__:
-            #if not task.done():
-            #    task.cancel()
-            task.join()
+            if not task.done():
+                task.cancel()
+        self.__tasks__ = None
 
 
     async def init(self) ->None:
@@ -173,7 +300,16 @@ class AIAgentPlayer(Player):
         )
 
 
+    def notify_conversation(self) ->None:
+        """New messages were appended to the game's conversation log"""
+        if not self.__conversation_notified__:
+            self.__conversation_notified__ = True
+            self.message_queue.put_nowait( (-1, "$$Conversation$$", None) )
+            queue_depth.inc()
+
+
     async def add_message(self, channel_id :int, author_name :str, message :str) ->None:
         """Put a message in the queue"""
         logger.info("Inform AI-Player %s about message '%s:%s'", self.name, author_name, message)
         await self.message_queue.put( (channel_id, author_name, message) )
+        queue_depth.inc()
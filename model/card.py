@@ -1,18 +1,33 @@
 """
 Representing the cards in the game
 """
-import dataclasses
+import json
 import random
+import logging
+import functools
+import dataclasses
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# The teams, a player wins or looses together with the team of the card
+VILLAGERS = "villagers"
+WEREWOLVES = "werewolves"
 
 
 @dataclasses.dataclass
 class Card:
     """Base class for all cards"""
-    def __init__(self, name :str, character :int, night_order :int, desc :str):
+    def __init__(self, name :str, character :int, night_order :int, desc :str,
+                 team :str = VILLAGERS):
         self.name = name
         self.character = character
         self.desc = desc
         self.night_order = night_order
+        self.team = team
 
     def __str__(self):
         return f"{self.name}({self.character})"
@@ -23,7 +38,8 @@ class WerewolfCard(Card):
     """Card representing the Werewolf role"""
     def __init__(self) -> None:
         super().__init__("Werewolf", -6, 10,
-            "Choose a victim to devour each night together with the other werewolves.")
+            "Choose a victim to devour each night together with the other werewolves.",
+            WEREWOLVES)
 
 
 @dataclasses.dataclass
@@ -42,8 +58,36 @@ class SeerCard(Card):
             "Choose a player every night and find out whether they are the werewolf or not.")
 
 
-def create_cards( count :int):
-    """Returns a set of cards"""
+# The cards by name, as used in the table of balanced decks
+CARD_TYPES = {"Werewolf": WerewolfCard, "Seer": SeerCard, "Villager": VillagerCard}
+
+
+@functools.lru_cache
+def load_card_table(path :str) ->dict[int, dict[str, int]]:
+    """Loads the decks by player count from the balance analysis (tools/balance_analyzer.py),
+    an empty path or a file that cannot be read returns an empty table (the default decks)"""
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)["table"]
+        return {int(count): entry["deck"] for count, entry in table.items()}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+        # logged once, the result is cached per path
+        logger.error("Card table %s cannot be loaded (%s: %s), using the default decks",
+                     path, type(error).__name__, error)
+        return {}
+
+
+def create_cards( count :int, table :dict[int, dict[str, int]] = None):
+    """Returns a set of cards, the deck from the table if it has a valid one for the count"""
+    deck = None if table is None else table.get(count)
+    if not deck is None:
+        if all(name in CARD_TYPES for name in deck) and sum(deck.values()) == count:
+            return [CARD_TYPES[name]() for name, number in deck.items()
+                    for _ in range(number)]
+        logger.warning("The deck %s of the card table does not fit %d players, "
+                       "using the default deck", deck, count)
     result = []
     sum_character = 0
     if count > 4:
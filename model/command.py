@@ -45,8 +45,9 @@ class QuitCommand(GameCommand):
 @dataclasses.dataclass
 class StartCommand(GameCommand):
     """Handles !start command"""
-    def __init__(self, author :Member) ->None:
+    def __init__(self, author :Member, seed :int = None) ->None:
         super().__init__("start", author)
+        self.seed = seed    # of the card shuffle, drawn by the game if None
 
 
 @dataclasses.dataclass
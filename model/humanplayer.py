@@ -6,6 +6,7 @@ import logging
 from discord import Member
 
 from model.player import Player
+from service.dmdispatcher import dispatcher
 
 
 
@@ -23,6 +24,5 @@ class HumanPlayer(Player):
     async def send_dm(self, msg :str) ->None:
         """Sends a direct message to the player"""
         logger.debug( "Send DM to %s", self.member)
-        await self.member.create_dm()
-        await self.member.dm_channel.send( msg )
+        await dispatcher.send(self.member, msg)
         logger.debug( "Sending DM to %s done", self.member)
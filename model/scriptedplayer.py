@@ -0,0 +1,101 @@
+"""
+Representing a player without Discord member or AI-agent, for simulated games
+"""
+import re
+import random
+import logging
+
+from model.player import Player
+from model.card import WEREWOLVES, SeerCard
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# the answer of the moderator to the seer
+SEER_ANSWER = re.compile(r"^(.+) is a Werewolf!$")
+
+
+
+class ScriptedPlayer(Player):
+    """A player who votes from a script, then by the random or the heuristic policy"""
+    POLICIES = ("random", "heuristic")
+
+    def __init__(self, name :str, rng :random.Random = None, script :list[str] = None,
+                 policy :str = "random") ->None:
+        super().__init__(name)
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown policy {policy}, use one of {self.POLICIES}")
+        self.rng = rng if not rng is None else random.Random()
+        self.script = list(script) if not script is None else []  # names to vote for, in order
+        self.policy = policy
+        self.dms :list[str] = []
+        self.asked :set[str] = set()            # the players the seer already asked about
+        self.known_werewolves :list[str] = []   # the werewolves the seer found, in order
+
+
+    def reset(self) ->None:
+        super().reset()
+        self.asked.clear()
+        self.known_werewolves.clear()
+
+
+    async def send_dm(self, msg :str) ->None:
+        """Sends a direct message to the player"""
+        self.dms.append(msg)
+        match = SEER_ANSWER.match(msg)
+        if not match is None and not match.group(1) in self.known_werewolves:
+            self.known_werewolves.append(match.group(1))
+
+
+    def choose_victim(self, game, night :bool) ->Player:
+        """Returns the player to vote for (or to ask the seer about)"""
+        while len(self.script) > 0:
+            victim = game.find_player_by_name(self.script.pop(0))
+            if not victim is None and not victim.is_dead:
+                return victim
+        if self.policy == "heuristic":
+            return self.heuristic_policy(game, night)
+        return self.random_policy(game, night)
+
+
+    def random_policy(self, game, night :bool) ->Player:
+        """Werewolves follow the pack at night and never vote for each other,
+        everybody else votes for a random alive player"""
+        werewolf = night and not self.card is None and self.card.team == WEREWOLVES
+        if werewolf:
+            leader = game.tally.unanimous()
+            if not leader is None:
+                return leader
+        candidates = [player for player in game.players.values()
+                      if not player.is_dead and not player is self
+                      and not (werewolf and player.card.team == WEREWOLVES)]
+        return self.rng.choice(candidates)
+
+
+    def heuristic_policy(self, game, night :bool) ->Player:
+        """Like the random policy, but the seer asks about everybody once and
+        accuses the werewolves found, the others join the leading candidate
+        at day (werewolves unless it is one of them)"""
+        seer = isinstance(self.card, SeerCard)
+        werewolf = not self.card is None and self.card.team == WEREWOLVES
+        if seer and night:
+            candidates = [player for player in game.players.values() if not player.is_dead
+                          and not player is self and not player.name in self.asked]
+            if len(candidates) > 0:
+                victim = self.rng.choice(candidates)
+                self.asked.add(victim.name)
+                return victim
+        if seer and not night:
+            for name in self.known_werewolves:
+                victim = game.find_player_by_name(name)
+                if not victim is None and not victim.is_dead:
+                    return victim
+        if not night:
+            leader = game.tally.leader()
+            if not leader is None and not leader is self \
+                    and not (werewolf and leader.card.team == WEREWOLVES):
+                return leader
+        return self.random_policy(game, night)
@@ -0,0 +1,90 @@
+"""
+Batches the vote decisions of the AI-agent players of a game
+"""
+import os
+import time
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+from service.metrics import metrics
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+phase_seconds = metrics.histogram("werewolves_phase_seconds",
+    "Duration of the game phases (night, day) until resolved")
+
+
+
+class VoteBatcher:
+    """Gathers the pending vote decisions of a game within a short window
+    and lets the AI-agent players decide concurrently, so a phase needs
+    about one LLM latency instead of one per player."""
+    def __init__(self, name :str, window :float = None) ->None:
+        self.name = name
+        self.window = window if not window is None \
+            else float(os.getenv('VOTE_BATCH_WINDOW', "0.2"))
+        self.players = set()
+        self.phase_latency :float = None   # seconds the last phase needed to resolve
+        self.__pending__ = set()
+        self.__flush_task__ :asyncio.Task = None
+        self.__phase_started__ :float = None
+        self.__phase_name__ = ""
+
+
+    def register(self, player) ->None:
+        """An AI-agent player takes part in the game's vote batches"""
+        self.players.add(player)
+
+    def unregister(self, player) ->None:
+        """The AI-agent player left the game"""
+        self.players.discard(player)
+        self.__pending__.discard(player)
+
+
+    def submit(self, player) ->None:
+        """Queues the player's vote decision into the next batch"""
+        self.__pending__.add(player)
+        if self.__flush_task__ is None or self.__flush_task__.done():
+            self.__flush_task__ = asyncio.create_task(self.__flush__())
+
+
+    def phase_started(self, phase_name :str) ->None:
+        """A new game phase started: reports the latency of the previous one
+        and asks all AI-agent players for their decisions at once"""
+        now = time.perf_counter()
+        if not self.__phase_started__ is None:
+            self.phase_latency = now - self.__phase_started__
+            logger.info("Game %s: %s resolved after %.2fs",
+                        self.name, self.__phase_name__, self.phase_latency)
+            phase_seconds.observe(self.phase_latency, phase=self.__phase_name__)
+        self.__phase_started__ = now
+        self.__phase_name__ = phase_name
+        for player in self.players:
+            self.submit(player)
+
+
+    async def __flush__(self) ->None:
+        # votes submitted while a batch runs (e.g. by a phase change) form the next batch
+        while len(self.__pending__) > 0:
+            await asyncio.sleep(self.window)
+            batch = list(self.__pending__)
+            self.__pending__.clear()
+            logger.debug("Game %s: deciding %d votes concurrently", self.name, len(batch))
+            start = time.perf_counter()
+            results = await asyncio.gather(*(player.decide_votes() for player in batch),
+                                           return_exceptions=True)
+            for player, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error("Game %s: vote decision of %s failed: %s",
+                                 self.name, player.name, result)
+            logger.info("Game %s: batch of %d vote decisions took %.2fs",
+                        self.name, len(batch), time.perf_counter() - start)
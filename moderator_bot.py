@@ -5,18 +5,29 @@ on the configured Discord Guild.
 """
 import os
 import sys
+import time
 import logging
-from datetime import datetime
 from dotenv import load_dotenv
 
 import discord
 from discord.ext import commands
 from discord import TextChannel, Member
 from bot_intents import bot_intents
+from bot_channels import GeneralChannelMixin
 
 from logic.context import Context
 from logic.discordcontext import DiscordContext
+from logic.gameregistry import GameRegistry
+from logic.gamesnapshot import restore_snapshots
+from logic.gamejournal import GameJournal
 from model.command import StatusCommand, JoinCommand, QuitCommand, StartCommand, VoteCommand
+from service.transcriptwriter import TranscriptWriter
+from service.snapshotstore import SnapshotStore
+from service.journalwriter import JournalWriter
+from service.dmdispatcher import dispatcher
+from service.metrics import metrics
+from service.tracing import trace
+from service.channeloutbox import split_message
 
 
 # Set up logging
@@ -26,7 +37,7 @@ logger = logging.getLogger(__name__)
 
 
 
-class ModeratorBot(commands.Bot):
+class ModeratorBot(GeneralChannelMixin, commands.Bot):
     """Discord Bot who will be the moderator and story-teller of the Werewolves games"""
 
     def __init__(self, discord_guild_str :str) ->None:
@@ -34,49 +45,50 @@ class ModeratorBot(commands.Bot):
         super().__init__(command_prefix='!', intents=bot_intents)
         self.discord_guild_str = discord_guild_str
         self.guild = None    # is set in on_ready()
-        self.games :dict[TextChannel, Context] = {}
+        self.games = GameRegistry()
+        self.transcripts = TranscriptWriter('data')
+        self.snapshots = SnapshotStore(os.path.join('data', 'snapshots'))
+        self.journals = JournalWriter(os.path.join('data', 'journals'))
+        self.plaier = None   # the PlaierBot of the AI-agent players, is set in app.py
+        self.gateway = None  # the ShardGateway if the games run in worker processes (app.py)
+        self.__restored__ = False
+        metrics.gauge("werewolves_games_active", "Games with players",
+                      lambda: sum(1 for game in self.games.values() if len(game.players) > 0))
+        metrics.gauge("werewolves_players_active", "Players in all games",
+                      lambda: sum(len(game.players) for game in self.games.values()))
 
 
     #### Helpers
     def game_from_breakout_channel(self, channel :TextChannel) ->Context:
         """Fetches the game of the breakout-channel where the Werewolves secretly communicate."""
-        for game in self.games.values():
-            if game.werewolves_channel == channel:
-                return game
-        return None
+        if not self.gateway is None:
+            return self.gateway.game_from_werewolves_channel(channel.id)
+        return self.games.game_from_werewolves_channel(channel.id)
 
 
     def game_from_channel(self, channel :TextChannel, create = True) ->Context:
         """Fetches the game of the channel, creates a new one if not found."""
-        if not channel in self.games:
-            if not create:
-                return None
+        if not self.gateway is None:
+            return self.gateway.game(channel, create)
+        game = self.games.game_from_channel(channel.id)
+        if game is None and create:
             game = DiscordContext(self.guild, channel)
-            self.games[channel] = game
-            return game
-        return self.games[channel]
+            game.snapshots = self.snapshots
+            game.journal = GameJournal(self.journals, channel.id)
+            game.record("channel", name=channel.name)
+            self.games.add_game(channel.id, game)
+        return game
 
 
-    def game_from_member(self, player_name) ->Context:
+    def game_from_member(self, member :Member) ->Context:
         """Fetches the game where the author is playing."""
-        for game in self.games.values():
-            for name in game.players.keys():
-                if player_name==name:
-                    return game
-        return None
-
-    def general_channel(self) ->TextChannel:
-        """Returns the general channel"""
-        return self.guild.text_channels[0]
-
-    def is_general_channel(self, channel :TextChannel) ->bool:
-        """Checks if the channel is the general-channel (which is not used for games)"""
-        return channel == self.guild.text_channels[0]
-
+        if not self.gateway is None:
+            return self.gateway.game_from_member(member.id)
+        return self.games.game_from_member(member.id)
 
     async def send_to_general(self, msg :str) ->None:
         """Sends a message into the general channel"""
-        general = self.guild.text_channels[0]
+        general = self.general_channel()
         if general and general.permissions_for(self.guild.me).send_messages:
             await general.send(msg)
         else:
@@ -85,10 +97,43 @@ class ModeratorBot(commands.Bot):
 
     async def send_dm_to(self, member :Member, msg :str) ->None:
         """Sends a direct message to a member"""
-        await member.create_dm()
-        await member.dm_channel.send(msg)
+        await dispatcher.send(member, msg)
+
+
+
+    async def restore_games(self) ->None:
+        """Rehydrates the games of the snapshots, binds the members and channels by id"""
+        started = time.perf_counter()
+
+        def game_of(data :dict) ->DiscordContext:
+            channel = self.guild.get_channel(data["channel_id"])
+            if channel is None:
+                logger.warning("Channel of the game %s is gone, snapshot dropped", data["name"])
+                return None
+            return self.game_from_channel(channel)
+
+        ai_players = await restore_snapshots(
+            await self.snapshots.load_all(), game_of,
+            lambda entry: self.guild.get_member(entry["member_id"]),
+            lambda game, channel_id: self.guild.get_channel(channel_id), self.plaier)
+        logger.info("Restored %d games with %d AI-agent players in %.3fs",
+                    len(self.games), len(ai_players), time.perf_counter() - started)
 
 
+    async def close(self) ->None:
+        """Sends the queued messages, drains the transcripts and writes the snapshots
+        and journals before disconnecting"""
+        for game in self.games.values():
+            for outbox in game.outboxes.values():
+                await outbox.flush()
+        await self.transcripts.close()
+        await self.snapshots.close()
+        await self.journals.close()
+        if not self.gateway is None:
+            await self.gateway.close()
+        await metrics.stop_server()
+        await super().close()
+
 
     ###### Discord Event Handlers:
     async def on_ready(self):
@@ -104,11 +149,31 @@ class ModeratorBot(commands.Bot):
         channels = '\n - '.join([str(channel) for channel in self.guild.text_channels])
         logger.info("Guild Channels:\n - %s\n", channels)
 
+        # on_ready is called again after reconnects, the game workers restore their games
+        if not self.__restored__ and self.gateway is None:
+            self.__restored__ = True
+            await self.restore_games()
+        await metrics.start_server()
+
         await self.send_to_general("Hello! "
                                    "I am now online and will moderate the Werewolves games!\n"
                 "Enter !help to get a list of all commands.")
 
 
+    async def on_guild_channel_delete(self, channel):
+        """The game of a deleted channel is dropped"""
+        await super().on_guild_channel_delete(channel)
+        if channel.guild != self.guild:
+            return
+        if not self.gateway is None:
+            self.gateway.remove_game(channel.id)
+            return
+        game = self.games.game_from_channel(channel.id)
+        if not game is None:
+            logger.info("The channel of the game %s was deleted", game.name)
+            await game.close()
+
+
     async def on_member_join(self, member):
         """A member joined the Discord guild"""
         await self.send_dm_to( member,
@@ -133,12 +198,14 @@ async def on_message(message):
     logger.debug("%s: %s=%s", message.channel, message.author, message.content)
 
     # write channel messages to later use to analyze and improve the AI-player bot
-    with open(f'data/{message.channel}.csv', 'a', encoding="utf-8") as f:
-        timestamp_string = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        f.write(f'{timestamp_string};{message.author};{message.content}\n')
+    await bot.transcripts.write(str(message.channel), str(message.author), message.content)
 
     # Without this, commands won't get processed
-    await bot.process_commands(message)
+    if message.content.startswith(bot.command_prefix):
+        with trace(message.content.split(maxsplit=1)[0]):
+            await bot.process_commands(message)
+    else:
+        await bot.process_commands(message)
 
 
 ##### Game Commands: #####
@@ -178,9 +245,9 @@ async def status(ctx):
         pass
     else:
         game = bot.game_from_breakout_channel(ctx.channel)
-        if not game is None:
-            await game.handle( StatusCommand(ctx.author, ctx.channel) )
-        game = bot.game_from_channel(ctx.channel, True)
+        if game is None:
+            # not a werewolves channel, else a bogus game (with journal) would be created for it
+            game = bot.game_from_channel(ctx.channel, True)
         if not game is None:
             await game.handle( StatusCommand(ctx.author, ctx.channel) )
 
@@ -247,7 +314,7 @@ async def vote(ctx, player_name :str):
     if bot.is_general_channel(ctx.channel):
         await ctx.send( "Games can only be player in the other channels!")
     elif isinstance(ctx.channel, discord.DMChannel):
-        game = bot.game_from_member(voter_name)
+        game = bot.game_from_member(ctx.author)
         if not game is None:
             await game.handle( VoteCommand(ctx.author, voter_name, player_name))
     else:
@@ -262,6 +329,18 @@ async def vote(ctx, player_name :str):
                 await game.handle( VoteCommand(ctx.author, voter_name, player_name))
 
 
+@bot.command(name='stats', help='Shows the metrics of the bot (developer only)')
+async def stats(ctx):
+    """Stats command"""
+    if str(ctx.author.id) == os.getenv('DEV_USER_ID'):
+        summary = metrics.summary()
+        for part in split_message(summary if len(summary) > 0 else "No metrics yet."):
+            await ctx.send(part)
+    else:
+        logger.warning("%s wanted to see the metrics!", ctx.author.id)
+        await ctx.send('You do not have permission to see the metrics.')
+
+
 @bot.event
 async def on_command_error(ctx, error):
     """Error Handling"""
@@ -10,8 +10,10 @@ from dotenv import load_dotenv
 import discord
 from discord import TextChannel
 from bot_intents import bot_intents
+from bot_channels import GeneralChannelMixin
 
 from logic.gamecontext import GameContext
+from logic.gameregistry import GameRegistry
 from model.aiagentplayer import AIAgentPlayer
 
 
@@ -22,27 +24,21 @@ logger = logging.getLogger(__name__)
 
 
 
-class PlaierBot(discord.Client):
+class PlaierBot(GeneralChannelMixin, discord.Client):
     """Discord Bot who will be used for the AI-agents (plAIer)"""
 
-    def __init__(self, discord_guild_str :str, games :dict[TextChannel, GameContext]) ->None:
+    def __init__(self, discord_guild_str :str, games :GameRegistry) ->None:
         # Setup discord connection and the bot
         super().__init__(intents=bot_intents)
         self.discord_guild_str = discord_guild_str
         self.guild = None    # is set in on_ready()
         self.games = games
+        self.gateway = None  # the ShardGateway if the games run in worker processes (app.py)
 
 
     def game_from_channel(self, channel :TextChannel) ->GameContext:
         """Fetches the game of the channel"""
-        if not channel in self.games:
-            return None
-        return self.games[channel]
-
-
-    def is_general_channel(self, channel :TextChannel) ->bool:
-        """Checks if the channel is the general-channel (which is not used for games)"""
-        return channel == self.guild.text_channels[0]
+        return self.games.game_from_channel(channel.id)
 
 
     ###### Discord Event Handlers:
@@ -69,6 +65,14 @@ class PlaierBot(discord.Client):
             return
         logger.info("%s: %s=%s", message.channel, message.author, message.content)
 
+        if not self.gateway is None:
+            if message.content.startswith("!invite ") and len(message.content)>9:
+                self.gateway.invite(message.channel, message.content[8:])
+            elif not message.content.startswith("!"):
+                self.gateway.publish(message.channel, message.author.display_name,
+                                     message.content)
+            return
+
         # Send messages also to AI-agent players
         game = self.game_from_channel( message.channel )
         if not game is None:
@@ -77,8 +81,10 @@ class PlaierBot(discord.Client):
                 ai_player_name = message.content[8:]
                 logger.info("AI-Agent %s joins the game %s", ai_player_name, game.name)
                 player = AIAgentPlayer(ai_player_name, game, self)
-                game.players[ai_player_name] = player
+                game.add_player(player)
+                game.record("invite", name=ai_player_name)
                 await player.init()
+                game.changed()
                 await player.add_message(
                     game.channel.id,
                     "ModeratorBot", 
@@ -88,12 +94,10 @@ class PlaierBot(discord.Client):
             elif message.content.startswith("!"):
                 pass
             else:
-                # pass the messages to all players
-                for player in game.players.values():
-                    if isinstance(player, AIAgentPlayer):
-                        await player.add_message(message.channel.id,
-                                                message.author.display_name,
-                                                message.content)
+                # publish the message once per game, the AI-agent players subscribed to it
+                game.bus.publish(message.channel.id,
+                                 message.author.display_name,
+                                 message.content)
 
 
 # Application entry point
@@ -101,5 +105,5 @@ if __name__ == "__main__":
     # Load configuration
     load_dotenv()
 
-    client = PlaierBot(os.getenv('DISCORD_GUILD'), {})
+    client = PlaierBot(os.getenv('DISCORD_GUILD'), GameRegistry())
     client.run(os.getenv('PLAIER_TOKEN'))
@@ -0,0 +1,192 @@
+#!/bin/python
+""" channeloutbox.py
+The outbound queue of a Discord channel: the messages sent within a short
+window are merged into as few Discord messages as possible (max. 2000
+characters each, longer ones are split at line or word boundaries), a
+pending message is replaced by a newer one with the same key (e.g. the
+current votes), and the sends stay within the channel's rate limit.
+"""
+import os
+import time
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+from service.ratelimit import TokenBucket
+from service.metrics import metrics
+from service.tracing import span
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+MAX_MESSAGE_LENGTH = 2000   # the limit of Discord
+
+# 0 turns off the rate limits (benchmarks)
+RATE_LIMIT = os.getenv('OUTBOX_RATE_LIMIT', "1") == "1"
+# all channels of the bot together (Discord allows 50 requests per second)
+global_bucket = TokenBucket(50, 1.0)
+
+send_latency_seconds = metrics.histogram("werewolves_send_latency_seconds",
+    "Time from queueing a message to sending it to Discord")
+discord_messages = metrics.counter("werewolves_discord_messages_total",
+    "Discord messages sent by the outboxes (merged)")
+
+
+
+def split_message(msg :str, limit :int = MAX_MESSAGE_LENGTH) ->list[str]:
+    """Splits the message into parts of at most limit characters,
+    at the last line break, else the last blank, before the limit"""
+    parts = []
+    while len(msg) > limit:
+        cut = msg.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = msg.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        parts.append(msg[:cut])
+        msg = msg[cut:].lstrip("\n ") if cut < len(msg) else ""
+    if len(msg) > 0 or len(parts) == 0:
+        parts.append(msg)
+    return parts
+
+
+class ChannelOutbox:
+    """Coalescing, rate-limited queue of the messages to one channel"""
+    def __init__(self, channel, window :float = None, rate :float = 5, period :float = 5.0) ->None:
+        self.channel = channel
+        self.window = window if not window is None \
+            else float(os.getenv('OUTBOX_WINDOW', "0.1"))
+        self.bucket = TokenBucket(rate, period)     # Discord: 5 messages per 5s and channel
+        self.pending :list[tuple[str, str, float]] = []  # (text, key, enqueued)
+        self.queued = 0         # messages passed to send()
+        self.sent = 0           # Discord messages sent
+        self.replaced = 0       # stale messages dropped for a newer one with the same key
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.max_depth = 0
+        self.__task__ :asyncio.Task = None
+
+
+    def send(self, msg :str, key :str = None) ->None:
+        """Queues the message, a pending message with the same key is dropped"""
+        if not key is None:
+            stale = [entry for entry in self.pending if entry[1] == key]
+            for entry in stale:
+                self.pending.remove(entry)
+            self.replaced += len(stale)
+        self.pending.append( (msg, key, time.monotonic()) )
+        self.queued += 1
+        self.max_depth = max(self.max_depth, len(self.pending))
+        if self.__task__ is None or self.__task__.done():
+            self.__task__ = asyncio.create_task(self.__drain__())
+
+
+    def stats(self) ->dict:
+        """The queue depth and send latency (seconds from send() to Discord)"""
+        return {
+            "depth": len(self.pending),
+            "max_depth": self.max_depth,
+            "queued": self.queued,
+            "sent": self.sent,
+            "replaced": self.replaced,
+            "mean_latency": self.total_latency / max(1, self.queued - self.replaced),
+            "max_latency": self.max_latency,
+        }
+
+
+    async def flush(self) ->None:
+        """Waits until all pending messages are sent"""
+        while not self.__task__ is None and not self.__task__.done():
+            await asyncio.wait([self.__task__])
+
+    def close(self) ->None:
+        """Drops the pending messages (the channel is gone)"""
+        if not self.__task__ is None:
+            self.__task__.cancel()
+            self.__task__ = None
+        self.pending.clear()
+
+
+    def __next_message__(self) ->tuple[str, list[float]]:
+        """Takes the pending messages fitting into one Discord message"""
+        (text, _, enqueued) = self.pending.pop(0)
+        if len(text) > MAX_MESSAGE_LENGTH:
+            first = split_message(text)[0]
+            # the rest is sent next, in front of the other pending messages
+            self.pending.insert(0, (text[len(first):].lstrip("\n "), None, enqueued))
+            return (first, [])
+        enqueued_list = [] if enqueued is None else [enqueued]
+        while len(self.pending) > 0 \
+                and len(text) + 1 + len(self.pending[0][0]) <= MAX_MESSAGE_LENGTH:
+            (next_text, _, next_enqueued) = self.pending.pop(0)
+            text += "\n" + next_text
+            if not next_enqueued is None:
+                enqueued_list.append(next_enqueued)
+        return (text, enqueued_list)
+
+
+    async def __drain__(self) ->None:
+        while len(self.pending) > 0:
+            # collect the burst, then wait for the rate limit
+            await asyncio.sleep(self.window)
+            if RATE_LIMIT:
+                await self.bucket.acquire()
+                await global_bucket.acquire()
+            if len(self.pending) == 0:
+                break
+            (text, enqueued_list) = self.__next_message__()
+            try:
+                with span("discord.send"):
+                    await self.channel.send(text)
+            except Exception:   # pylint: disable=broad-exception-caught
+                logger.exception("Sending to channel %s failed", self.channel)
+            self.sent += 1
+            discord_messages.inc()
+            now = time.monotonic()
+            for enqueued in enqueued_list:
+                self.total_latency += now - enqueued
+                self.max_latency = max(self.max_latency, now - enqueued)
+                send_latency_seconds.observe(now - enqueued, kind="channel")
+            logger.debug("Outbox %s: sent %d messages in one, %d pending",
+                         self.channel, len(enqueued_list), len(self.pending))
+
+
+
+# Usage
+class PrintChannel:
+    """Records the messages instead of sending them"""
+    def __init__(self) ->None:
+        self.messages = []
+
+    async def send(self, msg :str) ->None:
+        """Records the message"""
+        self.messages.append(msg)
+
+
+async def main() ->None:
+    """A game start and a burst of votes: Discord messages with and without the outbox"""
+    channel = PrintChannel()
+    outbox = ChannelOutbox(channel, window=0.05)
+    bursts = ["Game started\nThe following cards are in the game:\n" + "- **Villager**\n" * 8,
+              "This is the channel for Werewolves only!", "The werewolves team is: ..."]
+    for msg in bursts:
+        outbox.send(msg)
+    for nr in range(20):
+        outbox.send(f"The current votes are:\n- Player{nr} votes for Player0\n", key="votes")
+    outbox.send("x" * 4500)
+    await outbox.flush()
+    if any(len(msg) > MAX_MESSAGE_LENGTH for msg in channel.messages):
+        raise AssertionError("Message longer than the limit")
+    print(f"{outbox.queued} messages sent as {len(channel.messages)} Discord messages, "
+          f"stats: {outbox.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+#!/bin/python
+""" dmdispatcher.py
+Sends the direct messages of the bot: the DM channel of a member is opened
+once and cached by member id (instead of create_dm() before every message),
+and at most `concurrency` messages are in flight at the same time, so a fan-out
+to all players of a game takes about one round trip.
+"""
+import time
+import asyncio
+import logging
+
+import discord
+
+from service.metrics import metrics
+from service.tracing import span
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+send_latency_seconds = metrics.histogram("werewolves_send_latency_seconds",
+    "Time from queueing a message to sending it to Discord")
+
+
+
+class DMDispatcher:
+    """Cached DM channels and bounded concurrent sending of direct messages"""
+    def __init__(self, concurrency :int = 10) ->None:
+        self.sent = 0
+        self.failed = 0
+        self.__channels__ :dict[int, object] = {}
+        self.__semaphore__ = asyncio.Semaphore(concurrency)
+
+
+    async def channel(self, member) ->object:
+        """The DM channel of the member, opened on the first message"""
+        channel = self.__channels__.get(member.id)
+        if channel is None:
+            channel = member.dm_channel
+            if channel is None:
+                channel = await member.create_dm()
+            self.__channels__[member.id] = channel
+        return channel
+
+
+    async def send(self, member, msg :str) ->None:
+        """Sends the direct message, raises discord.HTTPException if the member's DMs are closed"""
+        start = time.perf_counter()
+        async with self.__semaphore__:
+            try:
+                with span("discord.send_dm"):
+                    await (await self.channel(member)).send(msg)
+                self.sent += 1
+                send_latency_seconds.observe(time.perf_counter() - start, kind="dm")
+            except discord.HTTPException:
+                # the channel may be stale, open it again with the next message
+                self.__channels__.pop(member.id, None)
+                self.failed += 1
+                raise
+
+
+
+dispatcher = DMDispatcher()     # shared by all games of the bot
+
+
+
+# Usage
+class SlowDMChannel:
+    """A DM channel with the latency of the Discord REST API"""
+    def __init__(self, closed :bool) ->None:
+        self.closed = closed
+
+    async def send(self, msg :str) ->None:   # pylint: disable=unused-argument
+        """Waits one round trip"""
+        await asyncio.sleep(0.05)
+        if self.closed:
+            raise discord.Forbidden(SlowResponse(), "Cannot send messages to this user")
+
+
+class SlowResponse:
+    """The parts of a HTTP response discord.Forbidden reads"""
+    status = 403
+    reason = "Forbidden"
+
+
+class SlowMember:
+    """A member whose DM channel needs one round trip to open"""
+    def __init__(self, member_id :int, closed :bool = False) ->None:
+        self.id = member_id
+        self.dm_channel = None
+        self.closed = closed
+
+    async def create_dm(self) ->SlowDMChannel:
+        """Opens the DM channel"""
+        await asyncio.sleep(0.05)
+        return SlowDMChannel(self.closed)
+
+
+async def main(count :int = 12) ->None:
+    """Card reveals to count players: one after the other vs. the dispatcher"""
+    members = [SlowMember(nr, closed=nr == 3) for nr in range(count)]
+
+    start = time.perf_counter()
+    for member in members:
+        try:
+            await (await member.create_dm()).send("You got the card ...")
+            await (await member.create_dm()).send("The werewolves team is ...")
+        except discord.Forbidden:
+            pass
+    serial = time.perf_counter() - start
+
+    dms = DMDispatcher()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(dms.send(member, "You got the card ...\n"
+                                              "The werewolves team is ...")
+                                     for member in members), return_exceptions=True)
+    concurrent = time.perf_counter() - start
+    failed = [member.id for member, result in zip(members, results)
+              if isinstance(result, Exception)]
+    print(f"{count} players: serial {serial*1000:.0f}ms, dispatcher {concurrent*1000:.0f}ms, "
+          f"failed: {failed}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
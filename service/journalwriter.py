@@ -0,0 +1,76 @@
+#!/bin/python
+""" journalwriter.py
+Appends the journal lines of the games to data/journals/<channel id>.jsonl in
+the background: the lines are buffered in memory and appended by an executor
+thread shortly after, the event loop never waits for the disk.
+"""
+import os
+import asyncio
+import logging
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class JournalWriter:
+    """Buffered asynchronous appender of the game journals"""
+    def __init__(self, directory :str = os.path.join("data", "journals"),
+                 delay :float = 0.5) ->None:
+        self.directory = directory
+        self.delay = delay      # seconds to collect lines before writing
+        self.written = 0
+        self.__pending__ :dict[str, list[str]] = {}
+        self.__task__ :asyncio.Task = None
+
+
+    def path(self, key) ->str:
+        """The journal file of the game"""
+        return os.path.join(self.directory, f"{key}.jsonl")
+
+
+    def append(self, key, line :str) ->None:
+        """Buffers the line for the journal of the game"""
+        self.__pending__.setdefault(str(key), []).append(line)
+        if self.__task__ is None or self.__task__.done():
+            self.__task__ = asyncio.create_task(self.__flush_loop__())
+
+
+    async def close(self) ->None:
+        """Writes the pending lines (call on shutdown)"""
+        if not self.__task__ is None:
+            await self.__task__
+            self.__task__ = None
+        await self.__flush__()
+
+
+    async def __flush_loop__(self) ->None:
+        while len(self.__pending__) > 0:
+            await asyncio.sleep(self.delay)
+            await self.__flush__()
+
+    async def __flush__(self) ->None:
+        batch = self.__pending__
+        self.__pending__ = {}
+        if len(batch) > 0:
+            await asyncio.get_running_loop().run_in_executor(None, self.__write_batch__, batch)
+            self.written += sum(len(lines) for lines in batch.values())
+
+    def __write_batch__(self, batch :dict[str, list[str]]) ->None:
+        """Runs in an executor thread"""
+        os.makedirs(self.directory, exist_ok=True)
+        for key, lines in batch.items():
+            with open(self.path(key), "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+
+class MemoryJournalWriter:
+    """Keeps the journal lines in memory (replays, tests)"""
+    def __init__(self) ->None:
+        self.lines :dict[str, list[str]] = {}
+
+    def append(self, key, line :str) ->None:
+        """Keeps the line"""
+        self.lines.setdefault(str(key), []).append(line)
@@ -0,0 +1,249 @@
+#!/bin/python
+""" metrics.py
+Counters, gauges and histograms the components report into, exposed in the
+Prometheus text format on a local HTTP endpoint (METRICS_PORT, 0 disables it)
+and summarized by the !stats command of the ModeratorBot.
+The metrics are kept per process (the game workers of the sharded mode keep their own).
+"""
+import os
+import time
+import bisect
+import asyncio
+import logging
+import contextlib
+from dotenv import load_dotenv
+
+from aiohttp import web
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+# upper bounds in seconds, from a state change to an LLM call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+
+def labels_text(key :tuple) ->str:
+    """The labels in the Prometheus format, e.g. {command="VoteCommand"}"""
+    parts = [f'{name}="{value}"' for name, value in key]
+    return "{" + ",".join(parts) + "}" if len(parts) > 0 else ""
+
+
+class Counter:
+    """A value which only grows, e.g. the tokens used"""
+    kind = "counter"
+
+    def __init__(self, name :str, description :str) ->None:
+        self.name = name
+        self.description = description
+        self.values :dict[tuple, float] = {}
+
+    def inc(self, amount :float = 1, **labels) ->None:
+        """Adds the amount"""
+        key = tuple(labels.items())
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) ->list[tuple[str, tuple, float]]:
+        """(suffix, labels, value) of the exposition"""
+        return [("", key, value) for key, value in self.values.items()]
+
+    def summary(self) ->list[str]:
+        """One line per labels, for !stats"""
+        return [f"{self.name}{labels_text(key)} {value:g}" for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """A value which goes up and down, e.g. a queue depth"""
+    kind = "gauge"
+
+    def __init__(self, name :str, description :str, function = None) ->None:
+        super().__init__(name, description)
+        self.function = function    # computes the value when read
+
+    def set(self, value :float, **labels) ->None:
+        """Sets the value"""
+        self.values[tuple(labels.items())] = value
+
+    def dec(self, amount :float = 1, **labels) ->None:
+        """Subtracts the amount"""
+        self.inc(-amount, **labels)
+
+    def samples(self) ->list[tuple[str, tuple, float]]:
+        if not self.function is None:
+            self.values[()] = self.function()
+        return super().samples()
+
+    def summary(self) ->list[str]:
+        self.samples()
+        return super().summary()
+
+
+class Histogram:
+    """The distribution of a value, e.g. a latency, counted in buckets"""
+    kind = "histogram"
+
+    def __init__(self, name :str, description :str, buckets :tuple = DEFAULT_BUCKETS) ->None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # per labels: [the count per bucket (the last one is +Inf), sum]
+        self.values :dict[tuple, list] = {}
+
+    def observe(self, value :float, **labels) ->None:
+        """Counts the value (pass the labels always in the same order)"""
+        key = tuple(labels.items())
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observes the seconds spent in the with-block (also across awaits)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, key :tuple, q :float) ->float:
+        """The upper bound of the bucket holding the quantile q"""
+        counts = self.values[key][0]
+        rank = q * sum(counts)
+        total = 0
+        for index, count in enumerate(counts):
+            total += count
+            if total >= rank and count > 0:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return 0.0
+
+    def samples(self) ->list[tuple[str, tuple, float]]:
+        """(suffix, labels, value) of the exposition, the buckets are cumulative"""
+        result = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                result.append(("_bucket", key + (("le", f"{bound}"),), cumulative))
+            result.append(("_sum", key, total))
+            result.append(("_count", key, cumulative))
+        return result
+
+    def summary(self) ->list[str]:
+        """Count, mean and p95 per labels, for !stats"""
+        result = []
+        for key, (counts, total) in self.values.items():
+            count = sum(counts)
+            result.append(f"{self.name}{labels_text(key)} n={count} "
+                          f"mean={total / max(1, count):.3f}s p95<={self.quantile(key, 0.95):g}s")
+        return result
+
+
+class MetricsRegistry:
+    """All metrics of the process"""
+    def __init__(self) ->None:
+        self.metrics :dict[str, object] = {}
+        self.__runner__ :web.AppRunner = None
+
+
+    def counter(self, name :str, description :str) ->Counter:
+        """The counter of the name, created on the first call"""
+        return self.__metric__(Counter, name, description)
+
+    def gauge(self, name :str, description :str, function = None) ->Gauge:
+        """The gauge of the name, created on the first call;
+        a function computes the value whenever the metrics are read"""
+        gauge = self.__metric__(Gauge, name, description)
+        if not function is None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name :str, description :str,
+                  buckets :tuple = DEFAULT_BUCKETS) ->Histogram:
+        """The histogram of the name, created on the first call"""
+        return self.__metric__(Histogram, name, description, buckets)
+
+    def __metric__(self, kind, name :str, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = kind(name, *args)
+        return metric
+
+
+    def render(self) ->str:
+        """All metrics in the Prometheus text format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, key, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels_text(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) ->str:
+        """The metrics in short, for the !stats command"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.summary())
+        return "\n".join(lines)
+
+
+    async def start_server(self, port :int = None, host :str = "127.0.0.1") ->None:
+        """Serves GET /metrics on the port (METRICS_PORT), 0 does not serve"""
+        if port is None:
+            port = int(os.getenv('METRICS_PORT', "0"))
+        if port == 0 or not self.__runner__ is None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.__handle__)
+        self.__runner__ = web.AppRunner(app)
+        await self.__runner__.setup()
+        await web.TCPSite(self.__runner__, host, port).start()
+        logger.info("Metrics served on http://%s:%d/metrics", host, port)
+
+    async def stop_server(self) ->None:
+        """Stops serving"""
+        if not self.__runner__ is None:
+            await self.__runner__.cleanup()
+            self.__runner__ = None
+
+    async def __handle__(self, _request :web.Request) ->web.Response:
+        return web.Response(text=self.render(), content_type="text/plain")
+
+
+
+metrics = MetricsRegistry()     # shared by all components of the process
+
+
+
+# Usage
+async def main() ->None:
+    """Reports some values and reads them from the endpoint"""
+    # pylint: disable=import-outside-toplevel
+    import aiohttp
+    commands = metrics.histogram("werewolves_command_seconds", "Time to handle a game command")
+    for value in (0.002, 0.004, 0.03, 0.2):
+        commands.observe(value, command="VoteCommand")
+    with commands.time(command="StartCommand"):
+        await asyncio.sleep(0.01)
+    metrics.counter("werewolves_llm_tokens_total", "Tokens used").inc(120, kind="prompt")
+    metrics.gauge("werewolves_games_active", "Running games", lambda: 3)
+
+    await metrics.start_server(9108)
+    async with aiohttp.ClientSession() as session:
+        async with session.get("http://127.0.0.1:9108/metrics") as response:
+            print(await response.text())
+    await metrics.stop_server()
+    print(metrics.summary())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""
+Token buckets to stay within the rate limits of Discord and the LLM APIs
+"""
+import time
+import asyncio
+import logging
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class TokenBucket:
+    """Allows `rate` tokens per `period` seconds, bursts up to `capacity` tokens"""
+    def __init__(self, rate :float, period :float = 1.0, capacity :float = None) ->None:
+        self.rate = rate / period   # tokens per second
+        self.capacity = capacity if not capacity is None else rate
+        self.tokens = self.capacity
+        self.waited = 0.0           # total seconds callers waited for tokens
+        self.__updated__ = time.monotonic()
+
+
+    def __refill__(self) ->None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.__updated__) * self.rate)
+        self.__updated__ = now
+
+
+    def delay(self, amount :float = 1) ->float:
+        """Seconds until the amount of tokens is available (0 if it is now)"""
+        self.__refill__()
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+
+    def take(self, amount :float = 1) ->bool:
+        """Takes the tokens if available now"""
+        if self.delay(amount) > 0:
+            return False
+        self.tokens -= amount
+        return True
+
+
+    async def acquire(self, amount :float = 1) ->float:
+        """Waits until the tokens are available and takes them, returns the seconds waited"""
+        waited = 0.0
+        delay = self.delay(amount)
+        while delay > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = self.delay(amount)
+        # an amount above the capacity is allowed once the bucket is full
+        self.tokens -= amount
+        self.waited += waited
+        return waited
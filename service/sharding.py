@@ -0,0 +1,672 @@
+#!/bin/python
+""" sharding.py
+Runs the games in N worker processes: the gateway process keeps the Discord
+connections and routes every command and message, by consistent hashing of
+the game's channel id, to the worker owning the game. The workers play the
+games with the unchanged DiscordContext, bound to remote stand-ins of the
+guild, channels and members, which send their output back to the gateway.
+
+The IPC protocol are lists of tuples over one multiprocessing queue per
+worker (inbound) and one shared queue (outbound), messages produced within
+one event loop iteration are sent as one batch:
+
+gateway -> worker               worker -> gateway
+("command", channel_id, name, command)   ("send", channel_id, text, as_plaier)
+("message", channel_id, author, text)    ("dm", member_id, text)
+("invite", channel_id, name, ai_name)    ("create_channel", worker_id, request_id, name)
+("channel_created", request_id, id)      ("delete_channel", channel_id)
+("request_failed", request_id, error)    ("route", kind, id, game_channel_id or None)
+("remove_game", channel_id)              ("stopped", worker_id)
+("stop",)
+"""
+import os
+import time
+import bisect
+import asyncio
+import hashlib
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from dotenv import load_dotenv
+
+from logic.context import Context
+from logic.discordcontext import DiscordContext
+from logic.gameregistry import GameRegistry
+from logic.gamesnapshot import restore_snapshots
+from logic.gamejournal import GameJournal
+from logic.timerwheel import timer_wheel
+from model.command import GameCommand, StatusCommand, JoinCommand, QuitCommand, \
+    StartCommand, VoteCommand
+from model.player import Player
+from model.aiagentplayer import AIAgentPlayer
+from service.snapshotstore import SnapshotStore
+from service.journalwriter import JournalWriter
+from service.dmdispatcher import dispatcher
+from service.tasks import TaskSet
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+REQUEST_TIMEOUT = 30.0  # seconds a worker waits for the answer of the gateway
+
+
+
+class GatewayRequestError(Exception):
+    """The gateway could not execute the request of a worker"""
+
+
+def hash_of(key :str) ->int:
+    """A stable 64 bit hash (the builtin hash() differs between processes)"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of the channel ids onto the workers"""
+    def __init__(self, nodes, replicas :int = 64) ->None:
+        points = sorted((hash_of(f"{node}:{nr}"), node) for node in nodes for nr in range(replicas))
+        self.__hashes__ = [point[0] for point in points]
+        self.__nodes__ = [point[1] for point in points]
+        self.__owners__ :dict = {}     # the ring does not change, every command asks again
+
+    def node_for(self, key) ->int:
+        """The node owning the key"""
+        node = self.__owners__.get(key)
+        if node is None:
+            index = bisect.bisect(self.__hashes__, hash_of(str(key))) % len(self.__hashes__)
+            node = self.__owners__[key] = self.__nodes__[index]
+        return node
+
+
+##### Worker process
+class RemoteChannel:
+    """A text channel of the gateway, as seen by a worker"""
+    def __init__(self, worker, channel_id :int, name :str, as_plaier :bool = False) ->None:
+        self.worker = worker
+        self.id = channel_id
+        self.name = name
+        self.as_plaier = as_plaier  # sent by the PlaierBot instead of the ModeratorBot
+
+    def __eq__(self, other) ->bool:
+        return isinstance(other, RemoteChannel) and other.id == self.id
+
+    def __hash__(self) ->int:
+        return hash(self.id)
+
+    async def send(self, msg :str) ->None:
+        """Sends the message to the channel"""
+        self.worker.post("send", self.id, msg, self.as_plaier)
+
+    async def delete(self) ->None:
+        """Deletes the channel"""
+        self.worker.post("delete_channel", self.id)
+
+
+class RemoteDMChannel:
+    """The direct-message channel of a member, as seen by a worker"""
+    def __init__(self, worker, member_id :int) ->None:
+        self.worker = worker
+        self.member_id = member_id
+
+    async def send(self, msg :str) ->None:
+        """Sends the direct message"""
+        self.worker.post("dm", self.member_id, msg)
+
+
+class RemoteMember:
+    """A guild member, as seen by a worker"""
+    def __init__(self, worker, member_id :int, display_name :str) ->None:
+        self.id = member_id
+        self.display_name = display_name
+        self.dm_channel = RemoteDMChannel(worker, member_id)
+
+    def __str__(self) ->str:
+        return self.display_name
+
+    async def create_dm(self) ->None:
+        """The DM channel exists already"""
+
+
+class RemoteGuild:
+    """The guild, as seen by a worker: creating a channel asks the gateway"""
+    def __init__(self, worker) ->None:
+        self.worker = worker
+
+    async def create_text_channel(self, name :str) ->RemoteChannel:
+        """Creates the channel, waits for its id"""
+        channel_id = await self.worker.request("create_channel", name)
+        return RemoteChannel(self.worker, channel_id, name)
+
+
+class RemoteBot:
+    """The PlaierBot, as seen by the AI-agent players of a worker"""
+    def __init__(self, worker) ->None:
+        self.worker = worker
+        self.user = None
+        self.can_edit_messages = False  # the AI-agent players post their answers complete
+
+    def get_channel(self, channel_id :int) ->RemoteChannel:
+        """The channel to send the AI-agent's messages to"""
+        return RemoteChannel(self.worker, channel_id, "", as_plaier=True)
+
+
+class ShardRegistry(GameRegistry):
+    """The games of a worker, reports the member and werewolves-channel routes to the gateway"""
+    def __init__(self, worker) ->None:
+        super().__init__()
+        self.worker = worker
+
+    def player_joined(self, game :Context, player :Player) ->None:
+        super().player_joined(game, player)
+        member = getattr(player, "member", None)
+        if not member is None:
+            self.worker.post("route", "member", member.id, game.channel.id)
+
+    def player_left(self, game :Context, player :Player) ->None:
+        super().player_left(game, player)
+        member = getattr(player, "member", None)
+        if not member is None:
+            self.worker.post("route", "member", member.id, None)
+
+    def werewolves_channel_changed(self, game :Context, old_id :int, new_id :int) ->None:
+        super().werewolves_channel_changed(game, old_id, new_id)
+        if not old_id is None:
+            self.worker.post("route", "werewolves", old_id, None)
+        if not new_id is None:
+            self.worker.post("route", "werewolves", new_id, game.channel.id)
+
+
+def decode_command(worker, channel_id :int, encoded :tuple) ->GameCommand:
+    """Rebuilds the command of encode_command()"""
+    (name, author, *args) = encoded
+    member = None if author is None else RemoteMember(worker, author[0], author[1])
+    if name == "status":
+        return StatusCommand(member, None if args[0] is None
+                             else RemoteChannel(worker, args[0], "", False))
+    if name == "join":
+        return JoinCommand(member, args[0])
+    if name == "quit":
+        return QuitCommand(member)
+    if name == "start":
+        return StartCommand(member)
+    if name == "vote":
+        return VoteCommand(member, args[0], args[1])
+    raise ValueError(f"Unknown command {name} for channel {channel_id}")
+
+
+class ShardWorker:
+    """A worker process owning the games of its part of the hash ring"""
+    def __init__(self, worker_id :int, nr_workers :int, inbox, outbox,
+                 snapshot_directory :str = None, journal_directory :str = None) ->None:
+        self.worker_id = worker_id
+        self.ring = HashRing(range(nr_workers))
+        self.inbox = inbox
+        self.outbox = outbox
+        self.snapshot_directory = snapshot_directory
+        self.games = ShardRegistry(self)
+        self.guild = RemoteGuild(self)
+        self.plaier = RemoteBot(self)
+        self.snapshots :SnapshotStore = None
+        # each game is journaled by its worker only, None: no journals
+        self.journals = None if journal_directory is None else JournalWriter(journal_directory)
+        self.__loop__ :asyncio.AbstractEventLoop = None
+        self.__outgoing__ :list[tuple] = []
+        self.__requests__ :dict[int, asyncio.Future] = {}
+        self.__stopped__ :asyncio.Event = None
+        self.__tasks__ = TaskSet(f"GameWorker{worker_id}")  # the commands and invites
+
+
+    def run(self) ->None:
+        """The entry of the worker process"""
+        asyncio.run(self.__main__())
+
+
+    def post(self, *message) ->None:
+        """Sends the message to the gateway with the next batch"""
+        if len(self.__outgoing__) == 0:
+            self.__loop__.call_soon(self.__flush__)
+        self.__outgoing__.append(message)
+
+    async def request(self, kind :str, *args, timeout :float = REQUEST_TIMEOUT):
+        """Sends a request to the gateway and waits for its answer;
+        raises GatewayRequestError if it failed, asyncio.TimeoutError without an answer"""
+        request_id = len(self.__requests__) + 1
+        while request_id in self.__requests__:
+            request_id += 1
+        future = self.__loop__.create_future()
+        self.__requests__[request_id] = future
+        self.post(kind, self.worker_id, request_id, *args)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            del self.__requests__[request_id]
+
+
+    def game(self, channel_id :int, name :str) ->DiscordContext:
+        """The game of the channel, a new one if not existing yet"""
+        game = self.games.game_from_channel(channel_id)
+        if game is None:
+            game = DiscordContext(self.guild, RemoteChannel(self, channel_id, name))
+            game.snapshots = self.snapshots
+            if not self.journals is None:
+                game.journal = GameJournal(self.journals, channel_id)
+            game.record("channel", name=name)
+            self.games.add_game(channel_id, game)
+            self.post("route", "game", channel_id, channel_id)
+        return game
+
+
+    async def __main__(self) ->None:
+        self.__loop__ = asyncio.get_running_loop()
+        self.__stopped__ = asyncio.Event()
+        if not self.snapshot_directory is None:
+            self.snapshots = SnapshotStore(self.snapshot_directory)
+            await self.__restore__()
+        threading.Thread(target=self.__read_inbox__, daemon=True).start()
+        await self.__stopped__.wait()
+        for game in self.games.values():
+            for player in list(game.players.values()):
+                if isinstance(player, AIAgentPlayer):
+                    player.stop()
+        timer_wheel.close()
+        self.__tasks__.cancel()
+        if not self.snapshots is None:
+            await self.snapshots.close()
+        if not self.journals is None:
+            await self.journals.close()
+        self.post("stopped", self.worker_id)
+        self.__flush__()
+
+    def __read_inbox__(self) ->None:
+        """Runs in a thread, hands the batches over to the event loop"""
+        while True:
+            batch = self.inbox.get()
+            self.__loop__.call_soon_threadsafe(self.__receive__, batch)
+            if ("stop",) in batch:
+                break
+
+    def __flush__(self) ->None:
+        if len(self.__outgoing__) > 0:
+            self.outbox.put(self.__outgoing__)
+            self.__outgoing__ = []
+
+    def __receive__(self, batch :list[tuple]) ->None:
+        for message in batch:
+            kind = message[0]
+            if kind == "command":
+                (_, channel_id, name, encoded) = message
+                game = self.game(channel_id, name)
+                self.__tasks__.spawn(game.handle(decode_command(self, channel_id, encoded)))
+            elif kind == "message":
+                (_, channel_id, author_name, text) = message
+                game = self.games.game_from_channel(channel_id)
+                if not game is None:
+                    game.bus.publish(channel_id, author_name, text)
+            elif kind == "invite":
+                (_, channel_id, name, ai_player_name) = message
+                self.__tasks__.spawn(self.__invite__(self.game(channel_id, name), ai_player_name))
+            elif kind == "remove_game":
+                game = self.games.game_from_channel(message[1])
+                if not game is None:
+                    self.__tasks__.spawn(game.close())
+            elif kind == "channel_created":
+                future = self.__requests__.get(message[1])
+                if not future is None and not future.done():
+                    future.set_result(message[2])
+            elif kind == "request_failed":
+                future = self.__requests__.get(message[1])
+                if not future is None and not future.done():
+                    future.set_exception(GatewayRequestError(message[2]))
+            elif kind == "stop":
+                self.__stopped__.set()
+
+
+    async def __invite__(self, game :DiscordContext, ai_player_name :str) ->None:
+        logger.info("AI-Agent %s joins the game %s", ai_player_name, game.name)
+        player = AIAgentPlayer(ai_player_name, game, self.plaier)
+        game.add_player(player)
+        game.record("invite", name=ai_player_name)
+        await player.init()
+        game.changed()
+        await player.add_message(game.channel.id, "ModeratorBot",
+                                 "Introduce yourself to the other players.")
+        await player.start()
+
+
+    async def __restore__(self) ->None:
+        """Restores the snapshots of the games this worker owns"""
+        await restore_snapshots(
+            await self.snapshots.load_all(),
+            lambda data: None if self.ring.node_for(data["channel_id"]) != self.worker_id
+                         else self.game(data["channel_id"], data["name"]),
+            lambda entry: RemoteMember(self, entry["member_id"], entry["name"]),
+            lambda game, channel_id: RemoteChannel(self, channel_id,
+                                                   "WerewolvesOnly_" + game.name),
+            self.plaier)
+        logger.info("Worker %d restored %d games", self.worker_id, len(self.games))
+
+
+def worker_main(worker_id :int, nr_workers :int, inbox, outbox, snapshot_directory :str,
+                journal_directory :str, disabled_log_level :int) ->None:
+    """The entry of a worker process, logs like the gateway"""
+    logging.disable(disabled_log_level)
+    ShardWorker(worker_id, nr_workers, inbox, outbox, snapshot_directory,
+                journal_directory).run()
+
+
+##### Gateway process
+def encode_command(command :GameCommand) ->tuple:
+    """The command as plain data, Discord objects are sent by id"""
+    author = None if command.author is None \
+        else (command.author.id, command.author.display_name)
+    if isinstance(command, StatusCommand):
+        return ("status", author, None if command.channel is None else command.channel.id)
+    if isinstance(command, JoinCommand):
+        return ("join", author, command.ai_player_name)
+    if isinstance(command, VoteCommand):
+        return ("vote", author, command.voter_name, command.player_name)
+    return (command.name, author)
+
+
+class RemoteGame:
+    """Stands in for a game of a worker in the gateway, forwards the commands"""
+    def __init__(self, gateway, channel_id :int, name :str) ->None:
+        self.gateway = gateway
+        self.channel_id = channel_id
+        self.name = name
+
+    async def handle(self, command :GameCommand) ->None:
+        """Forwards the command to the worker owning the game"""
+        self.gateway.route(self.channel_id, ("command", self.channel_id, self.name,
+                                             encode_command(command)))
+
+
+class BotTransport:
+    """Executes the workers' output on the Discord bots of the gateway"""
+    def __init__(self, moderator, plaier) ->None:
+        self.moderator = moderator
+        self.plaier = plaier
+
+    async def send(self, channel_id :int, text :str, as_plaier :bool) ->None:
+        """Sends the text to the channel"""
+        client = self.plaier if as_plaier and not self.plaier is None else self.moderator
+        await client.get_channel(channel_id).send(text)
+
+    async def send_dm(self, member_id :int, text :str) ->None:
+        """Sends the direct message to the member"""
+        await dispatcher.send(self.moderator.guild.get_member(member_id), text)
+
+    async def create_channel(self, name :str) ->int:
+        """Creates the text channel, returns its id"""
+        return (await self.moderator.guild.create_text_channel(name)).id
+
+    async def delete_channel(self, channel_id :int) ->None:
+        """Deletes the text channel"""
+        await self.moderator.get_channel(channel_id).delete()
+
+
+class ShardGateway:
+    """Routes the commands and messages to the worker processes
+    and executes their output in order per channel"""
+    def __init__(self, nr_workers :int, transport,
+                 snapshot_directory :str = os.path.join("data", "snapshots"),
+                 journal_directory :str = os.path.join("data", "journals")) ->None:
+        self.nr_workers = nr_workers
+        self.transport = transport
+        self.snapshot_directory = snapshot_directory    # None: the games are not persisted
+        self.journal_directory = journal_directory
+        self.ring = HashRing(range(nr_workers))
+        self.processed = 0      # messages received from the workers
+        self.__context__ = multiprocessing.get_context("spawn")
+        self.__inboxes__ = []
+        self.__outbox__ = None
+        self.__processes__ = []
+        self.__loop__ :asyncio.AbstractEventLoop = None
+        self.__incoming__ :dict[int, list[tuple]] = {}
+        # the pending output per channel or member, sent in order by one task each
+        self.__chains__ :dict[tuple, tuple[deque, asyncio.Task]] = {}
+        self.__routes__ :dict[str, dict[int, int]] = {"game": {}, "member": {}, "werewolves": {}}
+        self.__stopped__ = 0
+        self.__all_stopped__ :asyncio.Event = None
+        self.__tasks__ = TaskSet("ShardGateway")    # the channel creations and the chains
+
+
+    def start(self) ->None:
+        """Starts the worker processes"""
+        self.__loop__ = asyncio.get_running_loop()
+        self.__all_stopped__ = asyncio.Event()
+        self.__outbox__ = self.__context__.Queue()
+        for worker_id in range(self.nr_workers):
+            inbox = self.__context__.Queue()
+            process = self.__context__.Process(
+                target=worker_main, name=f"GameWorker{worker_id}", daemon=True,
+                args=(worker_id, self.nr_workers, inbox, self.__outbox__,
+                      self.snapshot_directory, self.journal_directory,
+                      logging.root.manager.disable))
+            process.start()
+            self.__inboxes__.append(inbox)
+            self.__processes__.append(process)
+        threading.Thread(target=self.__read_outbox__, daemon=True).start()
+        logger.info("Started %d game workers", self.nr_workers)
+
+
+    async def close(self) ->None:
+        """Stops the workers after they wrote their snapshots"""
+        for worker_id in range(self.nr_workers):
+            self.__post__(worker_id, ("stop",))
+        await self.__all_stopped__.wait()
+        for (_, task) in list(self.__chains__.values()):
+            await task
+        for process in self.__processes__:
+            await self.__loop__.run_in_executor(None, process.join)
+
+
+    ##### Lookups, like the GameRegistry
+    def game(self, channel, create :bool = True) ->RemoteGame:
+        """The game of the channel (created in its worker with the first command), or None"""
+        if not channel.id in self.__routes__["game"]:
+            if not create:
+                return None
+            self.__routes__["game"][channel.id] = channel.id
+        return RemoteGame(self, channel.id, channel.name)
+
+    def game_from_werewolves_channel(self, channel_id :int) ->RemoteGame:
+        """The game of the werewolves channel, or None"""
+        return self.__remote_game__(self.__routes__["werewolves"].get(channel_id))
+
+    def game_from_member(self, member_id :int) ->RemoteGame:
+        """The game the member is playing, or None"""
+        return self.__remote_game__(self.__routes__["member"].get(member_id))
+
+    def __remote_game__(self, channel_id :int) ->RemoteGame:
+        if channel_id is None:
+            return None
+        return RemoteGame(self, channel_id, "")
+
+
+    ##### Inbound
+    def route(self, channel_id :int, message :tuple) ->None:
+        """Sends the message to the worker owning the game of the channel"""
+        self.__post__(self.ring.node_for(channel_id), message)
+
+    def publish(self, channel, author_name :str, text :str) ->None:
+        """A channel message for the AI-agent players of the game"""
+        if channel.id in self.__routes__["game"]:
+            self.route(channel.id, ("message", channel.id, author_name, text))
+
+    def invite(self, channel, ai_player_name :str) ->None:
+        """Adds an AI-agent player to the game of the channel"""
+        self.__routes__["game"][channel.id] = channel.id
+        self.route(channel.id, ("invite", channel.id, channel.name, ai_player_name))
+
+    def remove_game(self, channel_id :int) ->None:
+        """The channel of the game was deleted, its worker drops the game"""
+        if not self.__routes__["game"].pop(channel_id, None) is None:
+            self.route(channel_id, ("remove_game", channel_id))
+
+    def __post__(self, worker_id :int, message :tuple) ->None:
+        batch = self.__incoming__.get(worker_id)
+        if batch is None:
+            batch = self.__incoming__[worker_id] = []
+            self.__loop__.call_soon(self.__flush__, worker_id)
+        batch.append(message)
+
+    def __flush__(self, worker_id :int) ->None:
+        self.__inboxes__[worker_id].put(self.__incoming__.pop(worker_id))
+
+
+    ##### Outbound
+    def __read_outbox__(self) ->None:
+        """Runs in a thread, hands the batches over to the event loop"""
+        stopped = 0
+        while stopped < self.nr_workers:
+            batch = self.__outbox__.get()
+            stopped += sum(1 for message in batch if message[0] == "stopped")
+            self.__loop__.call_soon_threadsafe(self.__receive__, batch)
+
+    def __receive__(self, batch :list[tuple]) ->None:
+        for message in batch:
+            self.processed += 1
+            kind = message[0]
+            if kind == "send":
+                (_, channel_id, text, as_plaier) = message
+                self.__in_order__(("channel", channel_id),
+                                  self.transport.send(channel_id, text, as_plaier))
+            elif kind == "dm":
+                (_, member_id, text) = message
+                self.__in_order__(("member", member_id), self.transport.send_dm(member_id, text))
+            elif kind == "create_channel":
+                (_, worker_id, request_id, name) = message
+                self.__tasks__.spawn(self.__create_channel__(worker_id, request_id, name))
+            elif kind == "delete_channel":
+                self.__in_order__(("channel", message[1]),
+                                  self.transport.delete_channel(message[1]))
+            elif kind == "route":
+                (_, route, key, channel_id) = message
+                if channel_id is None:
+                    self.__routes__[route].pop(key, None)
+                else:
+                    self.__routes__[route][key] = channel_id
+            elif kind == "stopped":
+                self.__stopped__ += 1
+                if self.__stopped__ == self.nr_workers:
+                    self.__all_stopped__.set()
+
+    def __in_order__(self, key :tuple, coroutine) ->None:
+        """Runs the coroutine after the previous ones with the same key"""
+        chain = self.__chains__.get(key)
+        if chain is None:
+            queue = deque()
+            chain = self.__chains__[key] = (queue, self.__tasks__.spawn(self.__drain__(key, queue)))
+        chain[0].append(coroutine)
+
+    async def __drain__(self, key :tuple, queue :deque) ->None:
+        """Sends the output of the key one after the other, until none is pending"""
+        while len(queue) > 0:
+            try:
+                await queue[0]
+            except Exception:   # pylint: disable=broad-exception-caught
+                logger.exception("Sending the output of a game worker failed")
+            queue.popleft()
+        del self.__chains__[key]
+
+    async def __create_channel__(self, worker_id :int, request_id :int, name :str) ->None:
+        try:
+            channel_id = await self.transport.create_channel(name)
+        except Exception as error:   # pylint: disable=broad-exception-caught
+            logger.exception("Creating the channel %s for worker %d failed", name, worker_id)
+            self.__post__(worker_id,
+                          ("request_failed", request_id, f"{type(error).__name__}: {error}"))
+            return
+        self.__post__(worker_id, ("channel_created", request_id, channel_id))
+
+
+
+# Usage
+class CountingTransport:
+    """Benchmark transport: counts the sends, creates fake channel ids"""
+    # pylint: disable=unused-argument
+    def __init__(self) ->None:
+        self.sends = 0
+        self.done :asyncio.Event = None
+        self.expected = 0
+        self.__next_channel_id__ = 10**9
+
+    async def send(self, channel_id :int, text :str, as_plaier :bool) ->None:
+        """Counts the answers to the join and status commands (the outbox merges them)"""
+        self.sends += text.count("joined the game.") + text.count("No game is running yet")
+        if self.sends >= self.expected:
+            self.done.set()
+
+    async def send_dm(self, member_id :int, text :str) ->None:
+        """DMs are not counted"""
+
+    async def create_channel(self, name :str) ->int:
+        """Returns a new channel id"""
+        self.__next_channel_id__ += 1
+        return self.__next_channel_id__
+
+    async def delete_channel(self, channel_id :int) ->None:
+        """Nothing to delete"""
+
+
+class BenchObject:
+    """A channel or member of the benchmark"""
+    def __init__(self, object_id :int, name :str) ->None:
+        self.id = object_id
+        self.name = name
+        self.display_name = name
+
+
+async def measure(nr_workers :int, nr_games :int, nr_commands :int) ->float:
+    """Sends join and status commands to nr_games games, returns the commands per second"""
+    transport = CountingTransport()
+    transport.done = asyncio.Event()
+    gateway = ShardGateway(nr_workers, transport, snapshot_directory=None, journal_directory=None)
+    gateway.start()
+    channels = [BenchObject(nr, f"game{nr}") for nr in range(nr_games)]
+    # one join per game creates the games in the workers (and warms them up)
+    transport.expected = nr_games
+    for nr, channel in enumerate(channels):
+        await gateway.game(channel).handle(JoinCommand(BenchObject(nr, f"Member{nr}")))
+    await transport.done.wait()
+
+    transport.done.clear()
+    transport.expected = nr_games + nr_commands
+    start = time.perf_counter()
+    for nr in range(nr_commands):
+        channel = channels[nr % nr_games]
+        await gateway.game(channel).handle(StatusCommand(None, channel))
+        if nr % 500 == 0:
+            await asyncio.sleep(0)  # let the gateway flush and receive
+    await transport.done.wait()
+    duration = time.perf_counter() - start
+    await gateway.close()
+    return nr_commands / duration
+
+
+async def main(options) ->None:
+    """Commands per second by the number of workers"""
+    logging.disable(logging.INFO)
+    # the workers' throughput, not Discord's rate limits (inherited by the worker processes)
+    os.environ["OUTBOX_RATE_LIMIT"] = "0"
+    os.environ["OUTBOX_WINDOW"] = "0"
+    for nr_workers in options.workers:
+        throughput = await measure(nr_workers, options.games, options.commands)
+        print(f"{nr_workers} workers: {throughput:8.0f} commands/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the sharded game workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--commands", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
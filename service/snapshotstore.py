@@ -0,0 +1,152 @@
+#!/bin/python
+""" snapshotstore.py
+Keeps the running games across restarts of the bot: a game that changed is
+marked dirty, and shortly after its snapshot is written to
+data/snapshots/<channel id>.json by an executor thread (write to a temporary
+file, then rename, so a crash never leaves half a snapshot). Only the games
+that changed are written; a game without players removes its file.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import tempfile
+
+from logic.gamesnapshot import snapshot_game, restore_game
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class SnapshotStore:
+    """Incremental background writer and loader of the game snapshots"""
+    def __init__(self, directory :str = os.path.join("data", "snapshots"),
+                 delay :float = 0.2) ->None:
+        self.directory = directory
+        self.delay = delay      # seconds to collect changes before writing
+        self.written = 0
+        self.__dirty__ :dict[int, object] = {}
+        self.__task__ :asyncio.Task = None
+
+
+    def changed(self, game) ->None:
+        """The game changed, its snapshot is written soon"""
+        self.__dirty__[game.channel.id] = game
+        if self.__task__ is None or self.__task__.done():
+            self.__task__ = asyncio.create_task(self.__flush_loop__())
+
+
+    async def close(self) ->None:
+        """Writes the pending snapshots (call on shutdown)"""
+        if not self.__task__ is None:
+            await self.__task__
+            self.__task__ = None
+        await self.__flush__()
+
+
+    async def load_all(self) ->list[dict]:
+        """Reads all snapshots"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.__read_all__)
+
+
+    async def __flush_loop__(self) ->None:
+        while len(self.__dirty__) > 0:
+            await asyncio.sleep(self.delay)
+            await self.__flush__()
+
+    async def __flush__(self) ->None:
+        # the snapshots are taken on the event loop, only the files are written in the executor
+        batch = {channel_id: snapshot_game(game) for channel_id, game in self.__dirty__.items()}
+        self.__dirty__.clear()
+        if len(batch) > 0:
+            await asyncio.get_running_loop().run_in_executor(None, self.__write_batch__, batch)
+            self.written += len(batch)
+
+
+    def __path__(self, channel_id :int) ->str:
+        return os.path.join(self.directory, f"{channel_id}.json")
+
+    def __write_batch__(self, batch :dict[int, dict]) ->None:
+        """Runs in an executor thread"""
+        os.makedirs(self.directory, exist_ok=True)
+        for channel_id, data in batch.items():
+            path = self.__path__(channel_id)
+            if data is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+
+    def __read_all__(self) ->list[dict]:
+        """Runs in an executor thread"""
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError) as error:
+                logger.error("Snapshot %s is unreadable: %s", filename, error)
+        return result
+
+
+
+# Usage
+async def main(count :int = 500) ->None:
+    """Benchmark: snapshots and restores count running games"""
+    # pylint: disable=import-outside-toplevel
+    from logic.headlesscontext import HeadlessContext
+    from model.scriptedplayer import ScriptedPlayer
+    from model.command import StartCommand
+    logging.disable(logging.INFO)
+
+    games = []
+    for nr in range(count):
+        game = HeadlessContext(f"game{nr}", nr)
+        game.channel.id = 1000 + nr
+        for player_nr in range(8):
+            game.add_player(ScriptedPlayer(f"Player{player_nr}", game.rng))
+        await game.handle(StartCommand(None))
+        games.append(game)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SnapshotStore(directory)
+        start = time.perf_counter()
+        for game in games:
+            game.snapshots = store
+            game.changed()
+        await store.close()
+        written = time.perf_counter() - start
+
+        start = time.perf_counter()
+        restored = []
+        for data in await SnapshotStore(directory).load_all():
+            game = HeadlessContext(data["name"])
+            restore_game(game, data, lambda entry: ScriptedPlayer(entry["name"]))
+            if not data["werewolves_channel_id"] is None:
+                await game.create_werewolves_channel()
+            restored.append(game)
+        duration = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(directory, name))
+                   for name in os.listdir(directory))
+
+    by_name = {game.name: game for game in restored}
+    for game in games:
+        if snapshot_game(game) != snapshot_game(by_name[game.name]) | \
+                {"channel_id": game.channel.id}:
+            raise AssertionError(f"Game {game.name} was not restored correctly")
+    print(f"{count} games: written in {written*1000:.0f}ms ({size/count:.0f} bytes each), "
+          f"restored in {duration*1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
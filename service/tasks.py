@@ -0,0 +1,62 @@
+#!/bin/python
+""" tasks.py
+Background tasks which nobody awaits: the event loop keeps only a weak
+reference to a task, so they are kept in a set until done, and their
+exceptions are logged instead of being lost.
+"""
+import asyncio
+import logging
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class TaskSet:
+    """The running background tasks of a component"""
+    def __init__(self, name :str) ->None:
+        self.name = name    # of the component, for the log
+        self.__tasks__ :set[asyncio.Task] = set()
+
+    def __len__(self) ->int:
+        return len(self.__tasks__)
+
+
+    def spawn(self, coroutine) ->asyncio.Task:
+        """Runs the coroutine as a task, keeps it until it is done"""
+        task = asyncio.create_task(coroutine)
+        self.__tasks__.add(task)
+        task.add_done_callback(self.__done__)
+        return task
+
+    def cancel(self) ->None:
+        """Cancels the running tasks"""
+        for task in list(self.__tasks__):
+            task.cancel()
+
+
+    def __done__(self, task :asyncio.Task) ->None:
+        self.__tasks__.discard(task)
+        if not task.cancelled() and not task.exception() is None:
+            logger.error("%s: task %s failed", self.name, task.get_coro().__qualname__,
+                         exc_info=task.exception())
+
+
+
+# Usage
+async def main() ->None:
+    """A failing task is logged, not lost"""
+    async def fail() ->None:
+        raise ValueError("phase deadline failed")
+    tasks = TaskSet("demo")
+    tasks.spawn(fail())
+    tasks.spawn(asyncio.sleep(0.01))
+    print(f"{len(tasks)} tasks running")
+    await asyncio.sleep(0.02)
+    print(f"{len(tasks)} tasks running")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,220 @@
+#!/bin/python
+""" tracing.py
+Span-style tracing of the command hot path: a Discord message starts a trace
+with a new command id, and the stages it passes (GameContext.handle, the state
+dispatch, the vote checks, the tally, the state changes, the sends and the LLM
+calls) record their spans into it. The command id travels in a context
+variable, so the tasks started for the command (DMs, vote decisions) report
+into the same trace.
+
+TRACING=0 (default) turns the spans into a shared no-op object,
+TRACING=1 logs every trace as an indented tree and reports the span
+durations to the metrics, TRACING=profile additionally samples the stack of
+the event loop while a command is handled and writes its folded stacks to
+data/profiles/ (render with flamegraph.pl or https://www.speedscope.app).
+"""
+import os
+import re
+import sys
+import time
+import logging
+import itertools
+import threading
+import contextvars
+from dotenv import load_dotenv
+
+from service.metrics import metrics
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Load configuration
+load_dotenv()
+
+
+MODE = os.getenv('TRACING', "0")
+ENABLED = MODE in ("1", "profile")
+PROFILE_DIRECTORY = os.path.join("data", "profiles")
+SAMPLE_INTERVAL = float(os.getenv('TRACING_SAMPLE_INTERVAL', "0.001"))
+
+span_seconds = metrics.histogram("werewolves_span_seconds",
+    "Duration of the traced stages of the commands")
+
+__trace__ :contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+__depth__ :contextvars.ContextVar = contextvars.ContextVar("trace_depth", default=0)
+__command_ids__ = itertools.count(1)
+
+
+
+class NoSpan:
+    """The span while tracing is off, does nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) ->None:
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+class Trace:
+    """The spans of one command"""
+    def __init__(self, name :str) ->None:
+        self.command_id = next(__command_ids__)
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans :list[tuple[int, str, float, float]] = []  # (depth, name, start, duration)
+        self.stacks :dict[str, int] = {}    # folded stack -> samples
+        self.finished = False
+
+    def text(self) ->str:
+        """The spans as an indented tree"""
+        lines = [f"command {self.command_id} {self.name}:"]
+        for (depth, name, start, duration) in sorted(self.spans, key=lambda span: span[2]):
+            lines.append(f"{'  ' * depth}{name} {duration*1000:.2f}ms "
+                         f"(+{(start - self.start)*1000:.2f}ms)")
+        return "\n".join(lines)
+
+
+class Span:
+    """Records the duration of a stage into the current trace"""
+    def __init__(self, current :Trace, name :str, root :bool = False) ->None:
+        self.trace = current
+        self.name = name
+        self.root = root
+        self.start = 0.0
+        self.__tokens__ = None
+
+    def __enter__(self):
+        depth = __depth__.get()
+        self.__tokens__ = (__trace__.set(self.trace) if self.root else None,
+                           __depth__.set(depth + 1), depth)
+        if self.root:
+            sampler.begin(self.trace)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_) ->None:
+        duration = time.perf_counter() - self.start
+        (trace_token, depth_token, depth) = self.__tokens__
+        __depth__.reset(depth_token)
+        span_seconds.observe(duration, span=self.name)
+        if self.trace.finished:
+            # a task of the command outlived it, e.g. an LLM call
+            logger.info("command %d %s: late span %s %.2fms",
+                        self.trace.command_id, self.trace.name, self.name, duration*1000)
+            return
+        self.trace.spans.append( (depth, self.name, self.start, duration) )
+        if self.root:
+            __trace__.reset(trace_token)
+            self.trace.finished = True
+            sampler.end(self.trace)
+            logger.info("%s", self.trace.text())
+
+
+def trace(name :str):
+    """Starts the trace of a command (a span if a trace is running already)"""
+    if not ENABLED:
+        return NO_SPAN
+    current = __trace__.get()
+    if current is None:
+        return Span(Trace(name), name, root=True)
+    return Span(current, name)
+
+
+def span(name :str):
+    """A stage of the current command, does nothing without a trace"""
+    if not ENABLED:
+        return NO_SPAN
+    current = __trace__.get()
+    if current is None:
+        return NO_SPAN
+    return Span(current, name)
+
+
+def command_id() ->int:
+    """The id of the command being handled, None without a trace"""
+    current = __trace__.get()
+    return None if current is None else current.command_id
+
+
+
+class Sampler:
+    """Samples the stack of the event loop thread while commands are traced (TRACING=profile)"""
+    def __init__(self, interval :float = SAMPLE_INTERVAL) ->None:
+        self.interval = interval
+        self.active :list[Trace] = []
+        self.__thread_id__ :int = None
+        self.__thread__ :threading.Thread = None
+        self.__lock__ = threading.Lock()
+
+    def begin(self, current :Trace) ->None:
+        """The trace started, sample until it ends"""
+        if MODE != "profile":
+            return
+        with self.__lock__:
+            self.active.append(current)
+        if self.__thread__ is None:
+            self.__thread_id__ = threading.get_ident()
+            self.__thread__ = threading.Thread(target=self.__run__, daemon=True,
+                                               name="TracingSampler")
+            self.__thread__.start()
+
+    def end(self, current :Trace) ->None:
+        """The trace ended, writes its folded stacks"""
+        if MODE != "profile":
+            return
+        with self.__lock__:
+            self.active.remove(current)
+        if len(current.stacks) > 0:
+            os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+            name = re.sub(r"\W", "", current.name)   # the command as typed by the user
+            path = os.path.join(PROFILE_DIRECTORY, f"command_{current.command_id}_{name}.folded")
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in current.stacks.items():
+                    f.write(f"{stack} {count}\n")
+
+    def __run__(self) ->None:
+        while True:
+            time.sleep(self.interval)
+            with self.__lock__:
+                if len(self.active) == 0:
+                    continue
+                frame = sys._current_frames().get(self.__thread_id__)  # pylint: disable=protected-access
+                if frame is None:
+                    continue
+                names = []
+                while not frame is None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                                 f":{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack = ";".join(reversed(names))
+                # concurrent commands share the samples of the loop
+                for current in self.active:
+                    current.stacks[stack] = current.stacks.get(stack, 0) + 1
+
+
+sampler = Sampler()
+
+
+
+# Usage
+if __name__ == "__main__":
+    # pylint: disable=import-outside-toplevel
+    import timeit
+    ENABLED = False
+    per_call = timeit.timeit("with span('x'): pass", number=10**6, globals=globals())
+    print(f"span() disabled: {per_call:.3f}us")
+    ENABLED = True
+    with trace("!vote"):
+        with span("GameContext.handle"):
+            with span("VoteTally.vote"):
+                time.sleep(0.001)
+            time.sleep(0.002)
+    with trace("!vote"):
+        print(f"span() enabled: {timeit.timeit(lambda: span('x'), number=10**5)*10:.3f}us")
@@ -0,0 +1,176 @@
+#!/bin/python
+""" transcriptwriter.py
+Writes the channel transcripts (data/<channel>.csv) in the background:
+the messages are buffered in memory and flushed periodically, or when the
+buffer fills up, by an executor thread. Every channel keeps one open file,
+which is rotated daily or when it gets too large; closed segments are gzipped.
+"""
+import os
+import re
+import csv
+import gzip
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from datetime import datetime
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+
+class ChannelFile:
+    """The open transcript file of one channel"""
+    def __init__(self, path :str, day :str) ->None:
+        self.path = path
+        # the day of the data: of the first row of a file left from before, else of the new row
+        self.day = day
+        if os.path.exists(path):
+            with open(path, 'r', encoding="utf-8") as f:
+                first = f.read(10)
+            if re.fullmatch(r"\d{4}-\d{2}-\d{2}", first):
+                self.day = first
+        self.file = open(path, 'a', encoding="utf-8", newline='')  # pylint: disable=consider-using-with
+        self.writer = csv.writer(self.file, delimiter=';')
+        self.size = self.file.tell()
+
+    def close(self) ->None:
+        """Closes the file"""
+        self.file.close()
+
+
+class TranscriptWriter:
+    """Buffered asynchronous writer of the channel transcripts"""
+    def __init__(self, directory :str = "data", flush_interval :float = 1.0,
+                 flush_size :int = 500, buffer_size :int = 10000,
+                 max_bytes :int = 10*1024*1024) ->None:
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.__buffer__ :asyncio.Queue = asyncio.Queue(buffer_size)
+        self.__files__ :dict[str, ChannelFile] = {}
+        self.__flush_now__ = asyncio.Event()
+        self.__task__ :asyncio.Task = None
+        self.__closing__ = False
+
+
+    async def write(self, channel :str, author :str, content :str) ->None:
+        """Buffers a message, waits only if the buffer is full"""
+        if self.__task__ is None:
+            self.__task__ = asyncio.create_task(self.__flush_loop__())
+        timestamp_string = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        await self.__buffer__.put( (channel, timestamp_string, author, content) )
+        if self.__buffer__.qsize() >= self.flush_size:
+            self.__flush_now__.set()
+
+
+    async def close(self) ->None:
+        """Drains the buffer and closes all files (call on shutdown)"""
+        self.__closing__ = True
+        if not self.__task__ is None:
+            self.__flush_now__.set()
+            await self.__task__
+            self.__task__ = None
+        await self.__flush__()
+        for channel_file in self.__files__.values():
+            channel_file.close()
+        self.__files__.clear()
+        logger.info("TranscriptWriter closed after %d messages", self.written)
+
+
+    async def __flush_loop__(self) ->None:
+        while not self.__closing__:
+            try:
+                await asyncio.wait_for(self.__flush_now__.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.__flush_now__.clear()
+            await self.__flush__()
+
+    async def __flush__(self) ->None:
+        batch = []
+        while not self.__buffer__.empty():
+            batch.append(self.__buffer__.get_nowait())
+        if len(batch) > 0:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.__write_batch__,
+                                                                 batch)
+                self.written += len(batch)
+            except Exception:   # pylint: disable=broad-exception-caught
+                # e.g. disk full: the batch is lost, but the loop must go on draining the
+                # buffer, otherwise write() blocks the bot once the buffer is full
+                logger.exception("Writing %d transcript messages failed", len(batch))
+
+
+    def __write_batch__(self, batch :list[tuple[str, str, str, str]]) ->None:
+        """Runs in an executor thread"""
+        touched = set()
+        for (channel, timestamp_string, author, content) in batch:
+            channel_file = self.__file_of__(channel, timestamp_string[:10])
+            channel_file.writer.writerow( (timestamp_string, author, content) )
+            channel_file.size += len(timestamp_string) + len(author) + len(content) + 3
+            touched.add(channel_file)
+        for channel_file in touched:
+            channel_file.file.flush()
+
+    def __file_of__(self, channel :str, day :str) ->ChannelFile:
+        channel_file = self.__files__.get(channel)
+        if channel_file is None:
+            channel_file = ChannelFile(os.path.join(self.directory, f"{channel}.csv"), day)
+            self.__files__[channel] = channel_file
+        if channel_file.day != day or channel_file.size >= self.max_bytes:
+            # dropped first, a failed rotation must not leave the closed file in use
+            del self.__files__[channel]
+            self.__rotate__(channel_file)
+            channel_file = ChannelFile(os.path.join(self.directory, f"{channel}.csv"), day)
+            self.__files__[channel] = channel_file
+        return channel_file
+
+    def __rotate__(self, channel_file :ChannelFile) ->None:
+        """Closes the segment and compresses it to <channel>.<day>.<n>.csv.gz"""
+        channel_file.close()
+        base = channel_file.path[:-len(".csv")]
+        number = 0
+        while os.path.exists(f"{base}.{channel_file.day}.{number}.csv.gz"):
+            number += 1
+        with open(channel_file.path, 'rb') as source, \
+                gzip.open(f"{base}.{channel_file.day}.{number}.csv.gz", 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(channel_file.path)
+        logger.info("Rotated transcript %s", channel_file.path)
+
+
+
+# Usage
+async def main(count :int = 100000) ->None:
+    """Benchmark: messages per second, compared with opening the file per message"""
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        for nr in range(count // 10):
+            with open(os.path.join(directory, f"legacy{nr % 4}.csv"), 'a',
+                      encoding="utf-8") as f:
+                f.write(f"2024-01-01 00:00:00;Player{nr % 8};Message number {nr}\n")
+        legacy = (count // 10) / (time.perf_counter() - start)
+
+        writer = TranscriptWriter(directory)
+        start = time.perf_counter()
+        loop_time = 0.0     # time the event loop spent in write()
+        for nr in range(count):
+            before = time.perf_counter()
+            await writer.write(f"channel{nr % 4}", f"Player{nr % 8}", f"Message; number {nr}")
+            loop_time += time.perf_counter() - before
+        await writer.close()
+        buffered = count / (time.perf_counter() - start)
+    print(f"open/append per message: {legacy:10.0f} messages/s (all on the event loop)")
+    print(f"TranscriptWriter:        {buffered:10.0f} messages/s sustained, "
+          f"{loop_time/count*1e6:.1f}us per message on the event loop")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
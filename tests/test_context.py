@@ -0,0 +1,47 @@
+""" test_context.py
+The name indexes of the Context, names only differing in case are different players
+"""
+from logic.context import Context
+from model.player import Player
+
+
+def create_game(*names :str) ->Context:
+    """A game with the players of the names"""
+    game = Context("test")
+    for name in names:
+        game.add_player(Player(name))
+    return game
+
+
+def test_find_player_by_name():
+    """Exact names, ignoring case and blanks, unknown names"""
+    game = create_game("Alice", "Bob")
+    assert game.find_player_by_name("Alice").name == "Alice"
+    assert game.find_player_by_name(" bob ").name == "Bob"
+    assert game.find_player_by_name("Carol") is None
+    game.check_invariants()
+
+
+def test_names_differing_in_case_are_kept_apart():
+    """Alice and alice are two players, ALICE is ambiguous until one of them left"""
+    game = create_game("Alice", "alice", "Bob")
+    assert len(game.players) == 3
+    assert game.find_player_by_name("Alice").name == "Alice"
+    assert game.find_player_by_name("alice").name == "alice"
+    assert game.find_player_by_name("ALICE") is None     # ambiguous
+    game.check_invariants()
+
+    game.remove_player("Alice")
+    assert game.find_player_by_name("ALICE").name == "alice"
+    game.check_invariants()
+
+
+def test_resolve_player_name():
+    """Free-text answers of the agents: markup, punctuation, typos, ambiguity"""
+    game = create_game("Alice", "alice", "Bob the Baker")
+    assert game.resolve_player_name("I vote for **Bob the Baker**.").name == "Bob the Baker"
+    assert game.resolve_player_name("bob-the-baker").name == "Bob the Baker"
+    assert game.resolve_player_name("Bob the Bakr").name == "Bob the Baker"
+    assert game.resolve_player_name("alice").name == "alice"
+    assert game.resolve_player_name("ALICE!") is None    # ambiguous
+    assert game.resolve_player_name("Carol") is None
@@ -0,0 +1,31 @@
+""" test_gameregistry.py
+The game of a deleted channel is closed and leaves the registry with all its routes
+"""
+import asyncio
+from types import SimpleNamespace
+
+from logic.gameregistry import GameRegistry
+from logic.headlesscontext import HeadlessContext
+from model.player import Player
+
+
+def test_close_removes_the_game():
+    """Players, members and the werewolves channel are gone after close()"""
+    registry = GameRegistry()
+    game = HeadlessContext("test")
+    registry.add_game(game.channel.id, game)
+    for nr in range(3):
+        player = Player(f"Player{nr}")
+        player.member = SimpleNamespace(id=100 + nr)
+        game.add_player(player)
+    asyncio.run(game.create_werewolves_channel())
+    registry.werewolves_channel_changed(game, None, game.werewolves_channel.id)
+    assert registry.game_from_member(101) is game
+
+    asyncio.run(game.close())
+    assert len(game.players) == 0
+    assert game.werewolves_channel is None
+    assert game.registry is None
+    assert registry.game_from_channel(game.channel.id) is None
+    assert registry.game_from_member(101) is None
+    assert registry.game_from_werewolves_channel(1) is None
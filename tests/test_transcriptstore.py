@@ -0,0 +1,71 @@
+""" test_transcriptstore.py
+Reading the transcripts: the raw lines of the former bot and the quoted rows
+of the TranscriptWriter, also mixed in one file
+"""
+import csv
+import gzip
+
+from tools.transcriptstore import read_rows, Timestamps
+
+
+# written by the former bot: f.write(f'{timestamp_string};{message.author};{message.content}\n')
+LEGACY = (
+    "2024-01-31 20:14:00;Alice;Hello; I am Alice\n"
+    "2024-01-31 20:15:00;ModeratorBot;The current votes are:\n"
+    "- Alice votes for Bob\n"
+    "These players still need to vote:\n"
+    "- Carol\n"
+    "2024-01-31 20:15:30;Bob;\"quoted\" start; x\n"
+    "2024-01-31 20:16:00;Bot;Rules:\n"
+    "note; a; b\n"
+    "2024-01-31 20:17:00;Carol;\n"
+)
+
+LEGACY_ROWS = [
+    ("2024-01-31 20:14:00", "Alice", "Hello; I am Alice"),
+    ("2024-01-31 20:15:00", "ModeratorBot",
+     "The current votes are:\n- Alice votes for Bob\nThese players still need to vote:\n- Carol"),
+    ("2024-01-31 20:15:30", "Bob", "\"quoted\" start; x"),
+    ("2024-01-31 20:16:00", "Bot", "Rules:\nnote; a; b"),
+    ("2024-01-31 20:17:00", "Carol", ""),
+]
+
+WRITER_ROWS = [
+    ("2024-02-01 10:00:00", "Alice", "I vote for \"Bob\"; really"),
+    ("2024-02-01 10:00:01", "ModeratorBot", "The current votes are:\n- Alice votes for Bob"),
+    ("2024-02-01 10:00:02", "Bob", "plain"),
+]
+
+
+def write_rows(f, rows :list[tuple[str, str, str]]) ->None:
+    """Writes the rows like the TranscriptWriter"""
+    writer = csv.writer(f, delimiter=";")
+    for row in rows:
+        writer.writerow(row)
+
+
+def test_legacy_transcript(tmp_path):
+    """Multi-line messages, quotes and ; in the content, continuation lines with two ;"""
+    path = tmp_path / "werewolves-1.csv"
+    path.write_text(LEGACY, encoding="utf-8")
+    rows = list(read_rows([str(path)], 7))
+    assert [(timestamp, author, content) for (timestamp, _, author, content) in rows] \
+        == LEGACY_ROWS
+    assert all(channel_id == 7 for (_, channel_id, _, _) in rows)
+    timestamps = Timestamps()
+    for (timestamp, _, _, _) in rows:
+        timestamps.seconds(timestamp)
+
+
+def test_writer_rows_appended_to_legacy_transcript(tmp_path):
+    """The TranscriptWriter appends its quoted rows to the file of the former bot"""
+    path = tmp_path / "werewolves-1.csv"
+    path.write_text(LEGACY, encoding="utf-8")
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        write_rows(f, WRITER_ROWS)
+    segment = tmp_path / "werewolves-1.2024-01-30.0.csv.gz"
+    with gzip.open(segment, "wt", encoding="utf-8", newline="") as f:
+        write_rows(f, WRITER_ROWS[:1])
+    rows = [(timestamp, author, content)
+            for (timestamp, _, author, content) in read_rows([str(segment), str(path)], 0)]
+    assert rows == WRITER_ROWS[:1] + LEGACY_ROWS + WRITER_ROWS
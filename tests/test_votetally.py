@@ -0,0 +1,72 @@
+""" test_votetally.py
+The incremental VoteTally against the former majority/unanimous logic
+"""
+import random
+
+from logic.votetally import VoteTally
+from model.player import Player
+
+
+def legacy_day_victim(players :list[Player]) ->Player:
+    """The former DayState.check_current_votes, rebuilding the counts on every vote"""
+    nr_players = len(players)
+    players_voted = {player: 0 for player in players}
+    for player in players:
+        if not player.day_vote is None:
+            players_voted[player.day_vote] += 1
+    victim = None
+    for player, count in players_voted.items():
+        if count*2 > nr_players:
+            victim = player
+    return victim
+
+
+def legacy_night_valid(werewolves :list[Player], victim :Player) ->bool:
+    """The former NightState.check_current_votes: all cast votes are for the victim"""
+    return all(werewolf.night_vote is None or werewolf.night_vote is victim
+               for werewolf in werewolves)
+
+
+def test_tally_agrees_with_former_logic():
+    """Random votes on random tables, after each vote"""
+    rng = random.Random(42)
+    for _ in range(2000):
+        players = [Player(f"Player{nr}") for nr in range(rng.randint(1, 12))]
+        tally = VoteTally(players)
+        for _ in range(rng.randint(1, 30)):
+            voter, candidate = rng.choice(players), rng.choice(players)
+            voter.day_vote = candidate
+            voter.night_vote = candidate
+            tally.vote(voter, candidate)
+            assert tally.majority() is legacy_day_victim(players)
+            assert (tally.unanimous() is candidate) == legacy_night_valid(players, candidate)
+            assert tally.all_votes_for(candidate) == legacy_night_valid(players, candidate)
+            # the victim is None for the !status in the werewolves channel
+            assert tally.all_votes_for(None) == legacy_night_valid(players, None)
+
+
+def test_split_werewolves_are_no_valid_vote():
+    """Two werewolves voting for different victims, asked by !status (victim None)"""
+    players = [Player(f"Player{nr}") for nr in range(5)]
+    tally = VoteTally(players[:2])
+    assert tally.all_votes_for(None)
+    tally.vote(players[0], players[3])
+    assert tally.all_votes_for(players[3])
+    assert not tally.all_votes_for(None)
+    tally.vote(players[1], players[4])
+    assert tally.unanimous() is None
+    assert not tally.all_votes_for(None)
+    assert not tally.all_votes_for(players[3])
+
+
+def test_majority_needs_more_than_half():
+    """A tie or a half is no majority, a changed vote counts"""
+    players = [Player(f"Player{nr}") for nr in range(4)]
+    tally = VoteTally(players)
+    tally.vote(players[0], players[3])
+    tally.vote(players[1], players[3])
+    assert tally.majority() is None
+    tally.vote(players[2], players[3])
+    assert tally.majority() is players[3]
+    tally.vote(players[2], players[0])
+    assert tally.majority() is None
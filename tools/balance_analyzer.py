@@ -0,0 +1,133 @@
+#!/bin/python
+""" balance_analyzer.py
+Monte-Carlo analysis of the deck compositions: simulates games for every
+composition (werewolves, seer, villagers) and player count on all cores,
+reports the villagers' win rate with its Wilson confidence interval, and
+writes the table of the most balanced decks, which create_cards loads when
+CARD_TABLE points to it.
+
+The games are split into chunks; every chunk derives its seed from the root
+seed, the composition and the chunk number, so the results do not depend on
+the number of processes or the order the chunks are finished in.
+
+Usage: python -m tools.balance_analyzer --min-players 4 --max-players 12 --games 100000
+"""
+import os
+import json
+import math
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from tools.simulate_games import play_game
+from model.card import VILLAGERS
+from model.scriptedplayer import ScriptedPlayer
+
+
+def compositions(nr_players :int) ->list[dict[str, int]]:
+    """All decks with at least one werewolf and more villagers than werewolves"""
+    result = []
+    for werewolves in range(1, (nr_players + 1) // 2):
+        for seer in (0, 1):
+            villagers = nr_players - werewolves - seer
+            if villagers >= 0:
+                result.append({"Werewolf": werewolves, "Seer": seer, "Villager": villagers})
+    return result
+
+
+def chunk_seed(root_seed :int, deck :dict[str, int], chunk :int) ->int:
+    """The seed of a chunk, independent of the worker which simulates it"""
+    key = f"{root_seed}:{deck['Werewolf']}:{deck['Seer']}:{deck['Villager']}:{chunk}"
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:6], "big")
+
+
+def simulate_chunk(deck :dict[str, int], seed :int, games :int, policy :str) ->int:
+    """Runs in a worker process: plays the games, returns the villagers' wins"""
+    nr_players = sum(deck.values())
+    table = {nr_players: deck}
+
+    async def play() ->int:
+        wins = 0
+        for nr in range(games):
+            game = await play_game(seed + nr, nr_players, policy=policy, card_table=table)
+            wins += game.last_winner == VILLAGERS
+        return wins
+    return asyncio.run(play())
+
+
+def wilson_interval(wins :int, games :int, z :float = 1.96) ->tuple[float, float]:
+    """The Wilson score interval of the win rate (95% by default)"""
+    if games == 0:
+        return (0.0, 1.0)
+    rate = wins / games
+    denominator = 1 + z*z / games
+    center = (rate + z*z / (2*games)) / denominator
+    margin = z * math.sqrt(rate*(1-rate)/games + z*z/(4*games*games)) / denominator
+    return (max(0.0, center - margin), min(1.0, center + margin))
+
+
+def init_worker() ->None:
+    """The game engine logs every card and phase on INFO"""
+    logging.disable(logging.INFO)
+
+
+def analyze(options) ->dict[str, dict]:
+    """Simulates all compositions, returns the balanced-deck table by player count"""
+    chunks = max(1, math.ceil(options.games / options.chunk_size))
+    table = {}
+    with ProcessPoolExecutor(options.workers, initializer=init_worker) as pool:
+        for nr_players in range(options.min_players, options.max_players + 1):
+            decks = compositions(nr_players)
+            futures = [[pool.submit(simulate_chunk, deck, chunk_seed(options.seed, deck, chunk),
+                                    min(options.chunk_size,
+                                        options.games - chunk * options.chunk_size),
+                                    options.policy)
+                        for chunk in range(chunks)]
+                       for deck in decks]
+            results = []
+            for deck, deck_futures in zip(decks, futures):
+                wins = sum(future.result() for future in deck_futures)
+                low, high = wilson_interval(wins, options.games)
+                results.append({"deck": deck, "games": options.games,
+                                "villager_win_rate": wins / options.games,
+                                "confidence_interval": [low, high]})
+                print(f"{nr_players:3} players, {deck['Werewolf']} werewolves, "
+                      f"{deck['Seer']} seer, {deck['Villager']:2} villagers: "
+                      f"villagers win {wins/options.games:6.1%} [{low:6.1%}, {high:6.1%}]")
+            table[str(nr_players)] = min(results,
+                                         key=lambda result: abs(result["villager_win_rate"]-0.5))
+    return table
+
+
+def main(options) ->None:
+    """Runs the analysis and writes the table"""
+    start = time.perf_counter()
+    table = analyze(options)
+    duration = time.perf_counter() - start
+    total = options.games * sum(len(compositions(nr_players)) for nr_players
+                                in range(options.min_players, options.max_players + 1))
+    print(f"{total} games on {options.workers} processes in {duration:.1f}s "
+          f"= {total/duration:.0f} games/s")
+    for nr_players, entry in table.items():
+        print(f"balanced deck for {nr_players:>2} players: {entry['deck']} "
+              f"(villagers win {entry['villager_win_rate']:.1%})")
+    os.makedirs(os.path.dirname(options.output) or ".", exist_ok=True)
+    with open(options.output, "w", encoding="utf-8") as f:
+        json.dump({"policy": options.policy, "seed": options.seed, "table": table}, f, indent=2)
+    print(f"Wrote {options.output}, use it with CARD_TABLE={options.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte-Carlo balance analysis of the decks")
+    parser.add_argument("--min-players", type=int, default=4)
+    parser.add_argument("--max-players", type=int, default=12)
+    parser.add_argument("--games", type=int, default=10000, help="games per composition")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--policy", choices=ScriptedPlayer.POLICIES, default="heuristic")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="data/balanced_decks.json")
+    main(parser.parse_args())
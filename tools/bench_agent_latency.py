@@ -0,0 +1,74 @@
+#!/bin/python
+""" bench_agent_latency.py
+Compares the latency of OpenAIAgent.ask_async (native asyncio client)
+with the former thread-per-call plus 1-second polling implementation,
+both against the local StubServer.
+
+Usage: python -m tools.bench_agent_latency --calls 10 --latency 0.2
+"""
+import os
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+
+from agents.openai_agent import OpenAIAgent
+from agents.stub_server import StubServer
+
+
+async def legacy_ask_async(agent :OpenAIAgent, prompt :str) ->str:
+    """The former ask_async: runs the sync call in a thread and polls every second"""
+    agent.result = None
+    thread = threading.Thread(target=agent.ask, args=(prompt,))
+    thread.start()
+    while thread.is_alive() and agent.result is None:
+        await asyncio.sleep(1)
+    return agent.result
+
+
+async def measure(name :str, ask, agent :OpenAIAgent, calls :int, parallel :int) ->None:
+    """Runs `calls` prompts (`parallel` at a time) and prints the latency statistics"""
+    latencies = []
+
+    async def one_call(nr :int) ->None:
+        start = time.perf_counter()
+        await ask(agent, f"Prompt number {nr}")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for offset in range(0, calls, parallel):
+        await asyncio.gather(*(one_call(nr) for nr in range(offset, min(calls, offset+parallel))))
+    total = time.perf_counter() - start
+    print(f"{name:>12}: calls={len(latencies)} total={total:.2f}s "
+          f"mean={statistics.mean(latencies)*1000:.0f}ms "
+          f"median={statistics.median(latencies)*1000:.0f}ms "
+          f"max={max(latencies)*1000:.0f}ms threads={threading.active_count()}")
+
+
+async def main(calls :int, latency :float, parallel :int) ->None:
+    """Async main function"""
+    server = StubServer(latency=latency)
+    server.start()
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    try:
+        agent = OpenAIAgent(base_url=server.base_url)
+        agent.system("You are a benchmark.")
+        await measure("thread+poll", legacy_ask_async, agent, calls, 1)
+        await measure("asyncio", OpenAIAgent.ask_async, agent, calls, 1)
+        if parallel > 1:
+            await measure(f"asyncio x{parallel}", OpenAIAgent.ask_async, agent, calls, parallel)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="simulated server latency in seconds")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="additionally run the asyncio path with n concurrent calls")
+    options = parser.parse_args()
+    asyncio.run(main(options.calls, options.latency, options.parallel))
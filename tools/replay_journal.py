@@ -0,0 +1,149 @@
+#!/bin/python
+""" replay_journal.py
+Rebuilds a game from its journal (data/journals/<channel id>.jsonl) on the
+HeadlessContext - no Discord, no LLM, no timers - and checks that the replay
+produces the same events. Used to reproduce bugs of the production games and,
+with --repeat, as a realistic workload for engine benchmarks.
+
+Usage: python -m tools.replay_journal data/journals/1234567890.jsonl --repeat 100
+       python -m tools.replay_journal --demo 200
+"""
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+from logic.gamejournal import GameJournal, read_journal
+from logic.headlesscontext import HeadlessContext, HeadlessChannel
+from model.command import StatusCommand, JoinCommand, QuitCommand, StartCommand, VoteCommand
+from model.scriptedplayer import ScriptedPlayer
+from service.journalwriter import MemoryJournalWriter
+from tools.simulate_games import play_game
+
+
+class ReplayMember:
+    """A guild member of a replayed game, the DMs are kept in memory"""
+    def __init__(self, member_id :int, display_name :str) ->None:
+        self.id = member_id
+        self.display_name = display_name
+        self.dm_channel = HeadlessChannel(display_name, member_id)
+
+    def __str__(self) ->str:
+        return self.display_name
+
+
+async def replay_journal(events :list[dict], game :HeadlessContext = None) ->HeadlessContext:
+    """Plays the events of the journal on a HeadlessContext, returns the game"""
+    if game is None:
+        game = HeadlessContext("replay")
+    members :dict[int, ReplayMember] = {}
+
+    def member(event :dict) ->ReplayMember:
+        if not event["member"] in members:
+            members[event["member"]] = ReplayMember(event["member"], event["name"])
+        return members[event["member"]]
+
+    for event in events:
+        kind = event["e"]
+        if kind == "join":
+            await game.handle(JoinCommand(member(event)))
+        elif kind == "invite":
+            # the votes of the AI-agent player are in the journal
+            game.add_player(ScriptedPlayer(event["name"]))
+            game.record("invite", name=event["name"])
+        elif kind == "quit":
+            await game.handle(QuitCommand(member(event)))
+        elif kind == "start":
+            if not event["deck"] is None:
+                game.card_table = {len(game.players): event["deck"]}
+            await game.handle(StartCommand(None, event["seed"]))
+        elif kind == "vote":
+            await game.handle(VoteCommand(None, event["voter"], event["victim"]))
+        elif kind == "status":
+            channel = game.werewolves_channel if event["channel"] == "werewolves" \
+                else game.channel
+            await game.handle(StatusCommand(None, channel))
+        elif kind == "deadline":
+            await game.handle_phase_deadline()
+        elif kind == "channel":
+            game.record("channel", name=event["name"])
+        elif kind != "state":
+            logging.warning("Unknown journal event %s", kind)
+    return game
+
+
+def replay_differences(events :list[dict], replayed :list[dict]) ->list[str]:
+    """Compares the journal with the journal of its replay (without the times)"""
+    def strip(entries :list[dict]) ->list[dict]:
+        return [{key: value for key, value in entry.items() if key != "t"} for entry in entries]
+    (original, replay) = (strip(events), strip(replayed))
+    differences = []
+    for nr, (left, right) in enumerate(zip(original, replay)):
+        if left != right:
+            differences.append(f"event {nr}: journal {left} != replay {right}")
+    if len(original) != len(replay):
+        differences.append(f"{len(original)} events in the journal, {len(replay)} replayed")
+    return differences
+
+
+async def replay_checked(events :list[dict]) ->tuple[HeadlessContext, list[str]]:
+    """Replays the events, returns the game and the differences of its journal"""
+    writer = MemoryJournalWriter()
+    game = HeadlessContext("replay")
+    game.journal = GameJournal(writer, "replay")
+    await replay_journal(events, game)
+    return (game, replay_differences(events, [
+        json.loads(line) for line in writer.lines.get("replay", [])]))
+
+
+async def demo(count :int) ->None:
+    """Journals simulated games and replays them"""
+    failed = 0
+    for seed in range(count):
+        writer = MemoryJournalWriter()
+        original = await play_game(seed, journal=GameJournal(writer, seed))
+        events = [json.loads(line) for line in writer.lines[str(seed)]]
+        (game, differences) = await replay_checked(events)
+        # the simulation ends stalemates without a message of the engine
+        if len(differences) > 0 or game.channel.messages != \
+                original.channel.messages[:len(game.channel.messages)]:
+            failed += 1
+            print(f"game {seed}: {differences[:3]}")
+    print(f"{count} simulated games replayed, {failed} differ")
+
+
+async def main() ->None:
+    """Replays the journal, --repeat times"""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("journal", nargs="?", help="the journal file of the game")
+    parser.add_argument("--repeat", type=int, default=1, help="replays for a benchmark")
+    parser.add_argument("--demo", type=int, default=0,
+                        help="journal and replay this number of simulated games")
+    options = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if options.demo > 0:
+        await demo(options.demo)
+        return
+    if options.journal is None:
+        parser.error("the journal file is missing")
+
+    events = read_journal(options.journal)
+    (game, differences) = await replay_checked(events)
+    for difference in differences:
+        print(difference)
+    start = time.perf_counter()
+    for _ in range(options.repeat):
+        await replay_journal(events)
+    duration = time.perf_counter() - start
+    real = (events[-1]["t"] - events[0]["t"]) / 1000 if len(events) > 0 else 0.0
+    print(f"{len(events)} events ({real:.0f}s played), replayed {options.repeat}x in "
+          f"{duration*1000:.0f}ms = {options.repeat*len(events)/max(duration, 1e-9):.0f} events/s, "
+          f"{'identical' if len(differences) == 0 else 'DIFFERENT'}; "
+          f"state {type(game.__state__).__name__}, last winner {game.last_winner}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+#!/bin/python
+""" simulate_games.py
+Plays complete games on the HeadlessContext with ScriptedPlayers in a tight
+loop - no Discord, no LLM, no timers. Used to benchmark the game engine and,
+with a fixed seed, as a regression check: the same seed must always produce
+the same transcript.
+
+Usage: python -m tools.simulate_games --games 10000 --players 8 --seed 1
+"""
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+
+from logic.headlesscontext import HeadlessContext
+from logic.nightstate import NightState
+from model.command import StartCommand, VoteCommand
+from model.scriptedplayer import ScriptedPlayer
+from model.card import VILLAGERS, WEREWOLVES
+
+
+async def play_round(game :HeadlessContext) ->None:
+    """Every player who may vote in the current phase votes (again),
+    if the phase is not resolved then, it is decided like at its deadline"""
+    state = game.__state__
+    night = isinstance(state, NightState)
+    for player in list(game.players.values()):
+        if not game.__state__ is state:
+            return
+        if player.is_dead:
+            continue
+        if not night or game.is_seer_vote_needed(player) \
+                or game.is_werewolf_vote_needed(player):
+            victim = player.choose_victim(game, night)
+            await game.handle(VoteCommand(None, player.name, victim.name))
+    if game.__state__ is state:
+        await game.handle_phase_deadline()
+    if game.__state__ is state and not night:
+        nr_werewolves, nr_villagers = game.check_gameover()
+        if nr_werewolves >= nr_villagers:
+            # the werewolves can block every lynch, the moderator has no rule for it
+            game.last_winner = WEREWOLVES
+            await game.send_msg("STALEMATE - the werewolves can no longer be voted out.")
+
+
+async def play_game(seed :int, nr_players :int = 8, max_rounds :int = 1000,
+                    scripts :dict[str, list[str]] = None, policy :str = "random",
+                    card_table :dict[int, dict[str, int]] = None,
+                    journal = None) ->HeadlessContext:
+    """Plays one game to its end, returns the game (see game.last_winner)"""
+    game = HeadlessContext(f"game{seed}", seed)
+    game.journal = journal
+    if not card_table is None:
+        game.card_table = card_table
+    for nr in range(nr_players):
+        name = f"Player{nr}"
+        game.add_player(ScriptedPlayer(name, game.rng,
+                                       None if scripts is None else scripts.get(name), policy))
+        game.record("invite", name=name)
+    await game.handle(StartCommand(None))
+    rounds = 0
+    while game.last_winner is None:
+        rounds += 1
+        if rounds > max_rounds:
+            raise RuntimeError(f"Game {game.name} did not end after {max_rounds} rounds")
+        await play_round(game)
+    return game
+
+
+def transcript_hash(game :HeadlessContext) ->str:
+    """The digest of all messages in the game's channel"""
+    return hashlib.sha256("\n".join(game.channel.messages).encode("utf-8")).hexdigest()
+
+
+async def run_games(count :int, nr_players :int, seed :int, policy :str = "random",
+                    card_table :dict[int, dict[str, int]] = None) ->dict[str, int]:
+    """Plays count games with the seeds seed, seed+1, ..., returns the wins per team"""
+    wins = {VILLAGERS: 0, WEREWOLVES: 0}
+    for nr in range(count):
+        game = await play_game(seed + nr, nr_players, policy=policy, card_table=card_table)
+        wins[game.last_winner] += 1
+    return wins
+
+
+async def main(options) ->None:
+    """Benchmark and regression check"""
+    first = transcript_hash(await play_game(options.seed, options.players, policy=options.policy))
+    again = transcript_hash(await play_game(options.seed, options.players, policy=options.policy))
+    if first != again:
+        raise AssertionError(f"Seed {options.seed} produced different transcripts")
+    print(f"Seed {options.seed} is reproducible, transcript {first[:16]}")
+
+    start = time.perf_counter()
+    wins = await run_games(options.games, options.players, options.seed, options.policy)
+    duration = time.perf_counter() - start
+    print(f"{options.games} games with {options.players} players in {duration:.2f}s "
+          f"= {options.games/duration:.0f} games/s")
+    print(f"villagers won {wins[VILLAGERS]}, werewolves won {wins[WEREWOLVES]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays simulated games without network")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--policy", choices=ScriptedPlayer.POLICIES, default="random")
+    # the engine logs every card and phase on INFO
+    logging.disable(logging.INFO)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,484 @@
+#!/bin/python
+""" transcriptstore.py
+Turns the channel transcripts (data/<channel>.csv and the rotated
+<channel>.<day>.<n>.csv.gz segments) into a columnar store and queries it.
+
+The store (data/store/) keeps one binary file per column, read memory-mapped:
+    time.col        int64, seconds since the epoch
+    author.col      uint32, index into the interned authors
+    channel.col     uint32, index into the interned channels
+    phase.col       uint8, index into the phases (ready, night, day, ...)
+    offset.col      uint64, start of the content in content.bin (one more than rows)
+    content.bin     the UTF-8 contents, back to back
+and meta.json with the string tables and the game index. The rows are ordered
+by game (the game channel plus its WerewolvesOnly_ channel) and by time
+within the game, so a game is a range of rows and a time filter a bisection.
+The phase is taken from the state changes in the game journals
+(data/journals/), "unknown" for messages without a journal.
+
+The ingestion streams every game through a merge of its channel files, only the
+string tables are kept in memory, so the size of the history does not matter.
+
+Usage: python -m tools.transcriptstore ingest
+       python -m tools.transcriptstore games
+       python -m tools.transcriptstore query --game werewolves-1 --channel werewolves
+       python -m tools.transcriptstore bench --messages 1000000
+"""
+import io
+import os
+import re
+import csv
+import sys
+import glob
+import gzip
+import json
+import mmap
+import time
+import array
+import bisect
+import heapq
+import shutil
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+
+from logic.gamejournal import read_journal
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+VERSION = 1
+WEREWOLVES_PREFIX = "WerewolvesOnly_"
+COLUMNS = {"time": "q", "author": "I", "channel": "I", "phase": "B", "offset": "Q"}
+CHUNK_ROWS = 65536      # rows buffered per column before they are appended to the file
+ROW_START = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2};")
+# the usual row of the TranscriptWriter: only the content needed quotes
+QUOTED_CONTENT_ROW = re.compile(
+    r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2});([^;"\r\n]*);"([^"]*(?:""[^"]*)*)"')
+NEEDS_QUOTES = re.compile(r'[;"\r\n]')
+SEGMENT = re.compile(r"^(?P<channel>.+)\.(?P<day>\d{4}-\d{2}-\d{2})\.(?P<number>\d+)\.csv\.gz$")
+
+
+
+def transcript_files(source :str) ->dict[str, list[str]]:
+    """The transcript files per channel, oldest segment first, the open file last"""
+    segments :dict[str, list[tuple]] = {}
+    for path in glob.glob(os.path.join(source, "*.csv.gz")):
+        match = SEGMENT.match(os.path.basename(path))
+        if not match is None:
+            segments.setdefault(match["channel"], []).append(
+                (match["day"], int(match["number"]), path))
+    for path in glob.glob(os.path.join(source, "*.csv")):
+        segments.setdefault(os.path.basename(path)[:-len(".csv")], []).append(
+            ("9999-99-99", 0, path))
+    return {channel: [path for (_, _, path) in sorted(files)]
+            for channel, files in segments.items()}
+
+
+def game_of_channel(channel :str) ->str:
+    """The game channel of the werewolves channel, the channel itself otherwise"""
+    return channel[len(WEREWOLVES_PREFIX):] if channel.startswith(WEREWOLVES_PREFIX) else channel
+
+
+def read_rows(paths :list[str], channel_id :int):
+    """Yields (timestamp string, channel id, author, content) of the channel files"""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", newline="") as f:
+            row = None
+            for line in f:
+                # a row starts with its timestamp, the other lines continue its content
+                if ROW_START.match(line) is None:
+                    if not row is None:
+                        row += line
+                    continue
+                if not row is None:
+                    yield parse_row(row, channel_id)
+                row = line
+            if not row is None:
+                yield parse_row(row, channel_id)
+
+
+def parse_row(row :str, channel_id :int) ->tuple[str, int, str, str]:
+    """(timestamp string, channel id, author, content) of a transcript row, either written
+    raw by the former bot (neither ; nor quotes escaped) or quoted by the TranscriptWriter"""
+    row = row[:-2] if row.endswith("\r\n") else row[:-1] if row.endswith("\n") else row
+    if '"' in row:
+        # only taken as quoted if the TranscriptWriter would have written it like that
+        match = QUOTED_CONTENT_ROW.fullmatch(row)
+        if not match is None:
+            content = match[3].replace('""', '"')
+            if not NEEDS_QUOTES.search(content) is None:
+                return (match[1], channel_id, match[2], content)
+        fields = next(csv.reader(io.StringIO(row, newline=""), delimiter=";"), [])
+        if len(fields) == 3:
+            quoted = io.StringIO()
+            csv.writer(quoted, delimiter=";").writerow(fields)
+            if quoted.getvalue() == row + "\r\n":
+                return (fields[0], channel_id, fields[1], fields[2])
+    (timestamp_string, author, content) = (row.split(";", 2) + ["", ""])[:3]
+    return (timestamp_string, channel_id, author, content)
+
+
+def journal_phases(directory :str) ->dict[str, list[tuple[float, str]]]:
+    """The state changes (seconds, phase) per game channel name of the journals"""
+    phases :dict[str, list[tuple[float, str]]] = {}
+    for path in glob.glob(os.path.join(directory, "*.jsonl")):
+        changes = []
+        name = None
+        for event in read_journal(path):
+            if event["e"] == "channel":
+                name = event["name"]
+            elif event["e"] == "state" and not name is None:
+                changes.append( (event["t"] / 1000, name, event["state"]) )
+        for (seconds, channel, state) in changes:
+            phase = state[:-len("State")].lower() if state.endswith("State") else state.lower()
+            phases.setdefault(channel, []).append( (seconds, phase) )
+    for changes in phases.values():
+        changes.sort()
+    return phases
+
+
+class Interned:
+    """A string table: every distinct string is stored once and referenced by its index"""
+    def __init__(self, strings :list[str] = None) ->None:
+        self.strings :list[str] = [] if strings is None else strings
+        self.__ids__ = {string: nr for nr, string in enumerate(self.strings)}
+
+    def id(self, string :str) ->int:
+        """The index of the string, added if new"""
+        nr = self.__ids__.get(string)
+        if nr is None:
+            nr = self.__ids__[string] = len(self.strings)
+            self.strings.append(string)
+        return nr
+
+
+class Timestamps:
+    """Converts the local times of the transcripts into seconds, the days are cached"""
+    def __init__(self) ->None:
+        self.__days__ :dict[str, int] = {}
+
+    def seconds(self, text :str) ->int:
+        """'2024-01-31 20:15:00' in seconds since the epoch"""
+        day = self.__days__.get(text[:10])
+        if day is None:
+            day = self.__days__[text[:10]] = int(time.mktime(time.strptime(text[:10], "%Y-%m-%d")))
+        return day + int(text[11:13])*3600 + int(text[14:16])*60 + int(text[17:19])
+
+
+
+class ColumnWriter:
+    """Appends the rows to the column files, interns the strings"""
+    def __init__(self, directory :str) ->None:
+        self.directory = directory
+        self.rows = 0
+        self.authors = Interned()
+        self.channels = Interned()
+        self.phases = Interned(["unknown"])
+        self.timestamps = Timestamps()
+        self.__columns__ = {name: array.array(code) for name, code in COLUMNS.items()}
+        self.__files__ = {name: open(os.path.join(directory, f"{name}.col"), "wb")  # pylint: disable=consider-using-with
+                          for name in COLUMNS}
+        self.__content__ = open(os.path.join(directory, "content.bin"), "wb")  # pylint: disable=consider-using-with
+        self.__position__ = 0
+        self.__columns__["offset"].append(0)
+
+    def append(self, seconds :int, author :int, channel :int, phase :int, content :str) ->None:
+        """Adds a row"""
+        data = content.encode("utf-8")
+        self.__content__.write(data)
+        self.__position__ += len(data)
+        columns = self.__columns__
+        columns["time"].append(seconds)
+        columns["author"].append(author)
+        columns["channel"].append(channel)
+        columns["phase"].append(phase)
+        columns["offset"].append(self.__position__)
+        self.rows += 1
+        if len(columns["time"]) >= CHUNK_ROWS:
+            self.flush()
+
+    def append_game(self, rows, changes :list[tuple[float, str]]) ->list[int]:
+        """Adds the time-ordered rows of a game with the phases of its state changes,
+        returns its index entry [first row, end row, start, end] (None without rows)"""
+        first = self.rows
+        (next_change, phase) = (0, 0)
+        (start, end) = (None, None)
+        for (text, channel_id, author, content) in rows:
+            seconds = self.timestamps.seconds(text)
+            # the journal times are exact, the transcript times are rounded down to the second
+            while next_change < len(changes) and int(changes[next_change][0]) <= seconds:
+                phase = self.phases.id(changes[next_change][1])
+                next_change += 1
+            self.append(seconds, self.authors.id(author), channel_id, phase, content)
+            start = seconds if start is None else start
+            end = seconds
+        return None if self.rows == first else [first, self.rows, start, end]
+
+    def flush(self) ->None:
+        """Appends the buffered values to the files"""
+        for name, values in self.__columns__.items():
+            values.tofile(self.__files__[name])
+            del values[:]
+
+    def close(self) ->None:
+        """Flushes and closes the files"""
+        self.flush()
+        for f in self.__files__.values():
+            f.close()
+        self.__content__.close()
+
+
+def ingest(source :str = "data", target :str = os.path.join("data", "store"),
+           journals :str = os.path.join("data", "journals")) ->int:
+    """Builds the store from all transcripts, returns the number of rows"""
+    building = target + ".building"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    channels = transcript_files(source)
+    phases = journal_phases(journals)
+    games :dict[str, list[str]] = {}
+    for channel in channels:
+        games.setdefault(game_of_channel(channel), []).append(channel)
+
+    writer = ColumnWriter(building)
+    index = {}
+    for game in sorted(games):
+        streams = [read_rows(channels[channel], writer.channels.id(channel))
+                   for channel in sorted(games[game])]
+        entry = writer.append_game(heapq.merge(*streams, key=lambda row: row[0]),
+                                   phases.get(game, []))
+        if not entry is None:
+            index[game] = entry
+    writer.close()
+
+    meta = {"version": VERSION, "byteorder": sys.byteorder, "rows": writer.rows,
+            "authors": writer.authors.strings, "channels": writer.channels.strings,
+            "phases": writer.phases.strings, "games": index}
+    with open(os.path.join(building, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(building, target)
+    return writer.rows
+
+
+
+class TranscriptStore:
+    """Memory-mapped reader of the columnar transcripts"""
+    def __init__(self, directory :str = os.path.join("data", "store")) ->None:
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["version"] != VERSION or meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"The store {directory} was built by another version or machine")
+        self.rows :int = meta["rows"]
+        self.authors :list[str] = meta["authors"]
+        self.channels :list[str] = meta["channels"]
+        self.phases :list[str] = meta["phases"]
+        self.games :dict[str, list[int]] = meta["games"]  # game -> [first row, end row, start, end]
+        self.__maps__ :list[mmap.mmap] = []
+        self.__views__ :list[memoryview] = []
+        self.times = self.__map__("time.col", COLUMNS["time"])
+        self.author_ids = self.__map__("author.col", COLUMNS["author"])
+        self.channel_ids = self.__map__("channel.col", COLUMNS["channel"])
+        self.phase_ids = self.__map__("phase.col", COLUMNS["phase"])
+        self.offsets = self.__map__("offset.col", COLUMNS["offset"])
+        self.content = self.__map__("content.bin", "B")
+
+
+    def __map__(self, name :str, typecode :str) ->memoryview:
+        with open(os.path.join(self.directory, name), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                view = memoryview(b"").cast(typecode)
+            else:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.__maps__.append(mapped)
+                view = memoryview(mapped).cast(typecode)
+        self.__views__.append(view)
+        return view
+
+    def close(self) ->None:
+        """Unmaps the columns"""
+        for view in self.__views__:
+            view.release()
+        for mapped in self.__maps__:
+            mapped.close()
+        self.__views__.clear()
+        self.__maps__.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) ->None:
+        self.close()
+
+
+    def channel_filter(self, channel :str) ->set[int]:
+        """The ids of the channels: 'werewolves', 'game' or a channel name"""
+        if channel == "werewolves":
+            return {nr for nr, name in enumerate(self.channels)
+                    if name.startswith(WEREWOLVES_PREFIX)}
+        if channel == "game":
+            return {nr for nr, name in enumerate(self.channels)
+                    if not name.startswith(WEREWOLVES_PREFIX)}
+        return {nr for nr, name in enumerate(self.channels) if name == channel}
+
+
+    def query(self, game :str = None, channel :str = None, author :str = None,
+              phase :str = None, since :int = None, until :int = None):
+        """Yields (seconds, channel, author, phase, content) of the matching rows;
+        only the rows of the game and time range are read"""
+        ranges = [self.games[game]] if not game is None and game in self.games else \
+                 [] if not game is None else self.games.values()
+        channels = None if channel is None else self.channel_filter(channel)
+        author_id = None if author is None else \
+                    self.authors.index(author) if author in self.authors else -1
+        phase_id = None if phase is None else \
+                   self.phases.index(phase) if phase in self.phases else -1
+        for (first, end, _, _) in ranges:
+            if not since is None:
+                first = bisect.bisect_left(self.times, since, first, end)
+            if not until is None:
+                end = bisect.bisect_right(self.times, until, first, end)
+            for row in range(first, end):
+                if not channels is None and not self.channel_ids[row] in channels:
+                    continue
+                if not author_id is None and self.author_ids[row] != author_id:
+                    continue
+                if not phase_id is None and self.phase_ids[row] != phase_id:
+                    continue
+                yield (self.times[row], self.channels[self.channel_ids[row]],
+                       self.authors[self.author_ids[row]], self.phases[self.phase_ids[row]],
+                       bytes(self.content[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8"))
+
+
+
+def parse_time(text :str) ->int:
+    """'2024-01-31' or '2024-01-31 20:15' in seconds since the epoch"""
+    return int(datetime.fromisoformat(text).timestamp())
+
+
+def print_rows(rows, limit :int) ->int:
+    """Prints the rows like the transcripts, returns their number"""
+    writer = csv.writer(sys.stdout, delimiter=";")
+    count = 0
+    for (seconds, channel, author, phase, content) in rows:
+        if count == limit:
+            break
+        writer.writerow( (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seconds)),
+                          channel, author, phase, content) )
+        count += 1
+    return count
+
+
+def write_transcripts(directory :str, messages :int, day :int, nr_games :int = 100) ->None:
+    """Synthetic transcripts: 10 messages per second, every 5th to a werewolves channel"""
+    files = {}
+    for nr in range(messages):
+        game = nr % nr_games
+        channel = f"{WEREWOLVES_PREFIX}game{game}" if nr % 5 == 0 else f"game{game}"
+        if not channel in files:
+            f = open(os.path.join(directory, f"{channel}.csv"), "w",  # pylint: disable=consider-using-with
+                     encoding="utf-8", newline="")
+            files[channel] = (f, csv.writer(f, delimiter=";"))
+        files[channel][1].writerow(
+            (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(day + nr // 10)),
+             f"Player{nr % 8}", f"Message; number {nr}"))
+    for (f, _) in files.values():
+        f.close()
+
+
+def scan_csv(directory :str, since :int, until :int) ->int:
+    """The number of messages in the time range, read from all CSVs"""
+    count = 0
+    timestamps = Timestamps()
+    for path in glob.glob(os.path.join(directory, "*.csv")):
+        for row in read_rows([path], 0):
+            count += 1 if since <= timestamps.seconds(row[0]) <= until else 0
+    return count
+
+
+def bench(messages :int) ->None:
+    """Writes synthetic transcripts, compares a query of the store with scanning the CSVs"""
+    with tempfile.TemporaryDirectory() as directory:
+        day = int(time.mktime(time.strptime("2024-01-01", "%Y-%m-%d")))
+        write_transcripts(directory, messages, day)
+        size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(directory, "*.csv")))
+        start = time.perf_counter()
+        count = ingest(directory, os.path.join(directory, "store"), os.path.join(directory, "-"))
+        duration = time.perf_counter() - start
+        print(f"ingested {count} messages ({size/1e6:.1f}MB) in {duration:.2f}s "
+              f"= {count/duration:.0f} messages/s")
+
+        # the CSVs: the channel file of the game, all files for a time range
+        start = time.perf_counter()
+        count = sum(1 for _ in read_rows(
+            [os.path.join(directory, f"{WEREWOLVES_PREFIX}game10.csv")], 0))
+        print(f"werewolves messages of game10: CSV {(time.perf_counter() - start)*1000:.1f}ms "
+              f"({count})")
+        start = time.perf_counter()
+        count = scan_csv(directory, day + 3600, day + 7200)
+        print(f"messages of one hour in all games: CSV {(time.perf_counter() - start)*1000:.0f}ms "
+              f"({count})")
+
+        start = time.perf_counter()
+        with TranscriptStore(os.path.join(directory, "store")) as store:
+            count = sum(1 for _ in store.query(game="game10", channel="werewolves"))
+            print(f"werewolves messages of game10: store incl. open "
+                  f"{(time.perf_counter() - start)*1000:.1f}ms ({count})")
+            start = time.perf_counter()
+            count = sum(1 for _ in store.query(since=day + 3600, until=day + 7200))
+            print(f"messages of one hour in all games: store "
+                  f"{(time.perf_counter() - start)*1000:.1f}ms ({count})")
+
+
+def main() ->None:
+    """The ingest, games, query and bench commands"""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=os.path.join("data", "store"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("ingest", help="(re)builds the store from the transcripts")
+    command.add_argument("--source", default="data")
+    command.add_argument("--journals", default=os.path.join("data", "journals"))
+    commands.add_parser("games", help="lists the games with their messages")
+    command = commands.add_parser("query", help="prints the matching messages")
+    command.add_argument("--game", help="the name of the game channel")
+    command.add_argument("--channel", help="werewolves, game or a channel name")
+    command.add_argument("--author")
+    command.add_argument("--phase", help="ready, night, day or unknown")
+    command.add_argument("--since", help="e.g. 2024-01-31 or '2024-01-31 20:15'")
+    command.add_argument("--until")
+    command.add_argument("--limit", type=int, default=-1)
+    command = commands.add_parser("bench", help="benchmark with synthetic transcripts")
+    command.add_argument("--messages", type=int, default=1000000)
+    options = parser.parse_args()
+
+    if options.command == "ingest":
+        start = time.perf_counter()
+        rows = ingest(options.source, options.store, options.journals)
+        print(f"{rows} messages ingested into {options.store} "
+              f"in {time.perf_counter() - start:.2f}s")
+    elif options.command == "games":
+        with TranscriptStore(options.store) as store:
+            for game, (first, end, start, last) in store.games.items():
+                print(f"{game}: {end - first} messages, "
+                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(start))} - "
+                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(last))}")
+    elif options.command == "query":
+        with TranscriptStore(options.store) as store:
+            print_rows(store.query(options.game, options.channel, options.author, options.phase,
+                                   None if options.since is None else parse_time(options.since),
+                                   None if options.until is None else parse_time(options.until)),
+                       options.limit)
+    else:
+        bench(options.messages)
+
+
+if __name__ == "__main__":
+    main()